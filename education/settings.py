@@ -52,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'teacher.roles.RolesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -69,6 +70,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'teacher.caching.cache_versions',
             ],
         },
     },
@@ -134,6 +136,26 @@ STATIC_ROOT = BASE_DIR/'static'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# How MediaView sends files: None streams them from Django, 'x-accel-redirect' (nginx) or
+# 'x-sendfile' (Apache, lighttpd) let the front proxy send them after the permission check.
+# For nginx, MEDIA_ACCEL_PREFIX must be an internal location aliased to MEDIA_ROOT.
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Chunked lesson file uploads, see teacher/uploads.py. The parts are kept outside MEDIA_ROOT
+# so MediaView never serves a half uploaded file.
+LESSON_UPLOAD_DIR = BASE_DIR/'uploads'
+LESSON_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+LESSON_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+# Slow side effects (thumbnails, file deletion, abandoned uploads) run in `manage.py worker`,
+# see teacher/tasks.py. True runs them in the web process after the commit, for development.
+TASKS_EAGER = DEBUG
+
+# Fills the add professor form with Faker values on every visit, ?demo=1 does it for one page.
+# Faker is only imported when a form is prefilled.
+DEMO_PREFILL = False
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -141,8 +163,57 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = "teacher.Teacher"
 
+# ModelBackend reading the permission set from the cached roles, see teacher/roles.py
+AUTHENTICATION_BACKENDS = ['teacher.roles.CachedPermissionBackend']
+
 REST_FRAMEWORK = {
-#     'PAGE_SIZE': 2,
+    'PAGE_SIZE': 100,
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
 }
 
+# PAGE_SIZE is only read by the pagination classes set on each viewset
+SILENCED_SYSTEM_CHECKS = ['rest_framework.W001']
+
+
+# Default and maximum number of rows on the paginated HTML list pages (?size=)
+LIST_PAGE_SIZE = 20
+LIST_MAX_PAGE_SIZE = 100
+
+# Cached pages, template fragments and roles, keys carry the versions of the models they render
+# and the versions are bumped by the signals in teacher/signals.py.
+# Every process serving the site must share the cache, a version bumped in a process-local cache
+# leaves the other processes serving stale pages and permissions until the entries expire.
+# By default the entries are files under CACHE_DIR, shared by the processes of one machine without
+# another service and kept out of the SQLite database, whose single write lock the requests need.
+# REDIS_URL switches to Redis, which needs the redis package and serves several machines.
+# CACHE_TABLE switches to the database cache, create its table with `python manage.py createcachetable`.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+elif os.environ.get('CACHE_TABLE'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': os.environ['CACHE_TABLE'],
+            'OPTIONS': {
+                'MAX_ENTRIES': 5000,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', BASE_DIR/'cache'),
+            'OPTIONS': {
+                'MAX_ENTRIES': 5000,
+            },
+        }
+    }
+
+# Seconds a cached page or fragment is kept, versioning already keeps them fresh
+PAGE_CACHE_TIMEOUT = 600
@@ -0,0 +1,52 @@
+// Loads the choices of select[data-autocomplete] on demand, see teacher/autocomplete.py.
+// The page only renders the selected options, the others come from the autocomplete view
+// while the user types into the search input placed above the select.
+(function () {
+    function setUp(select) {
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control mb-1';
+        input.placeholder = 'Type to search';
+        input.setAttribute('autocomplete', 'off');
+        select.parentNode.insertBefore(input, select);
+
+        let timer = null;
+        let loaded = false;
+
+        async function load() {
+            const url = select.dataset.autocomplete + '?q=' + encodeURIComponent(input.value.trim());
+            const res = await fetch(url, {headers: {'Accept': 'application/json'}});
+            if (!res.ok) {
+                return;
+            }
+            const data = await res.json();
+            Array.from(select.options).forEach(function (option) {
+                if (!option.selected && option.value !== '') {
+                    option.remove();
+                }
+            });
+            const present = new Set(Array.from(select.options).map(function (option) { return option.value; }));
+            data.results.forEach(function (result) {
+                if (!present.has(String(result.id))) {
+                    select.add(new Option(result.text, result.id));
+                }
+            });
+            loaded = true;
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(load, 250);
+        });
+        // The first choices are shown as soon as the field is used
+        [input, select].forEach(function (element) {
+            element.addEventListener('focus', function () {
+                if (!loaded) {
+                    load();
+                }
+            });
+        });
+    }
+
+    document.querySelectorAll('select[data-autocomplete]').forEach(setUp);
+})();
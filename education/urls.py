@@ -15,24 +15,27 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
 from django.conf import settings
+from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 
 from .views import LogOut, Login
 from .views import AddManagerViewset
 from rest_framework.authtoken.views import obtain_auth_token
 
 from .views import home
+from teacher.views import AutocompleteView, MediaView, SearchView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("", home, name="home"),
+    path("search/", SearchView.as_view(), name="search"),
+    path("autocomplete/<str:source>/", AutocompleteView.as_view(), name="autocomplete"),
     path("register/", AddManagerViewset.as_view(), name="register"),
     path('education/', include('teacher.urls')),
     path("login/", Login.as_view(), name="login"),
     path('logout/', LogOut.as_view(), name="logout"),
     path('api/v1/', include('teacher.router')),
     path('auth/', obtain_auth_token, name="get_token"),
-]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path(f'{settings.MEDIA_URL.strip("/")}/<path:path>', MediaView.as_view(), name='media'),
+]
@@ -7,6 +7,7 @@ from django.template.response import TemplateResponse
 from django.contrib.auth import authenticate, login, logout
 
 from education.forms import AddManagerForm
+from teacher.caching import cached
 from teacher.models import Group, GroupSpec, Student
 
 
@@ -21,15 +22,16 @@ def home(request):
     Returns:
     HttpResponse: A response object that renders the home page with recent students, total students, and courses.
     """
-    query_set = Student.objects.all()
-    new_students = query_set.order_by('-created_at')[:7]
-    total_students = query_set.count()
-    courses = GroupSpec.objects.all()
-    context = {
-        "new_students": new_students,
-        "total_students": total_students,
-        "courses": courses,
-    }
+    def load():
+        query_set = Student.objects.all()
+        return {
+            "new_students": list(query_set.for_list().order_by('-created_at')[:7]),
+            "total_students": query_set.count(),
+            "courses": list(GroupSpec.objects.all()),
+        }
+
+    # The numbers are cached until a student, course, department or teacher changes
+    context = cached('home', ('students', 'groups', 'departments', 'teachers'), load)
     # time.sleep(50)
     return render(request, "home.html", context)
 
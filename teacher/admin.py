@@ -1,26 +1,65 @@
 from django import forms
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.contrib.auth.hashers import make_password
+from django.utils import timezone
 from django.utils.html import format_html
 
-from teacher.models import Group, GroupLikes, GroupSpec, Lesson, LessonFiles, ReadMore, Score_Attendance, Skill, Student, Teacher
+from teacher.models import Group, GroupLikes, GroupSpec, Lesson, LessonFiles, ReadMore, Score_Attendance, Skill, Student, Task, Teacher
+from teacher.gradebook import refresh_lessons
+from teacher.importing import StudentImporter, read_rows
+from teacher.services import recount_group_likes
 
 class StudentForm(forms.ModelForm):
     class Meta:
         model = Student
         fields = "__all__"
 
-        widgets = {
-            "group": forms.CheckboxSelectMultiple
-        }
-
 
 class StudentAdmin(admin.ModelAdmin):
     form = StudentForm
+    # Groups are searched on demand instead of listing every one of them as checkboxes
+    autocomplete_fields = ['group']
     list_display = ['id', 'first_name', 'last_name', 'email', 'phone', 'gender', 'created_at']
     ordering = ("id", "first_name", "last_name")
     sortable_by = ("gender",)
     list_display_links = ['id', 'first_name', 'last_name', 'email']
+    change_list_template = 'admin/teacher/student/change_list.html'
+
+    def get_urls(self):
+        urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='teacher_student_import'),
+        ]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        """
+        Imports students from an uploaded CSV or XLSX file.
+
+        The rejected rows are returned as a CSV error report, otherwise it redirects back to the changelist.
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        context = dict(self.admin_site.each_context(request), opts=self.model._meta, title='Import students')
+        if request.method == 'POST' and request.FILES.get('file'):
+            upload = request.FILES['file']
+            try:
+                importer = StudentImporter().run(read_rows(upload, upload.name))
+            except ValueError as error:
+                self.message_user(request, str(error), messages.ERROR)
+                return TemplateResponse(request, 'admin/teacher/student/import.html', context)
+            self.message_user(request, f'Imported {importer.created} students, {len(importer.errors)} rows rejected')
+            if importer.errors:
+                response = HttpResponse(content_type='text/csv')
+                response['Content-Disposition'] = 'attachment; filename="student-import-errors.csv"'
+                importer.write_errors(response)
+                return response
+            return redirect('admin:teacher_student_changelist')
+        return TemplateResponse(request, 'admin/teacher/student/import.html', context)
 
 
 class TeacherForm(forms.ModelForm):
@@ -28,13 +67,11 @@ class TeacherForm(forms.ModelForm):
         model = Teacher
         fields = "__all__"
 
-        widgets = {
-            'skills': forms.CheckboxSelectMultiple
-        }
-
 
 class TeacherAdmin(admin.ModelAdmin):
     form = TeacherForm
+    autocomplete_fields = ['skills']
+    search_fields = ['^first_name', '^last_name', '^email']
     list_display = ["id", "first_name", "last_name", 'email', 'phone']
     list_display_links = ("id", "first_name", "last_name")
 
@@ -50,19 +87,37 @@ class TeacherAdmin(admin.ModelAdmin):
 
 
 class LessonFilesAdmin(admin.ModelAdmin):
-    list_display = ["id", "file", "lesson"]
+    list_display = ["id", "name", "file", "lesson"]
+    readonly_fields = ["name"]
 
 
 class Score_AttendanceAdmin(admin.ModelAdmin):
     list_display = ['id', 'student', 'lesson', 'mark', 'is_present']
 
+    # Marks edited here bypass the attendance sheet, so refresh the gradebook statistics
+    def save_model(self, request, obj, form, change):
+        old_lesson_id = Score_Attendance.objects.filter(id=obj.id).values_list('lesson_id', flat=True).first() if change else None
+        super().save_model(request, obj, form, change)
+        refresh_lessons({old_lesson_id, obj.lesson_id} - {None})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_lessons([obj.lesson_id])
+
+    def delete_queryset(self, request, queryset):
+        lesson_ids = set(queryset.values_list('lesson_id', flat=True))
+        super().delete_queryset(request, queryset)
+        refresh_lessons(lesson_ids - {None})
+
 
 class DeparmentAdmin(admin.ModelAdmin):
     list_display = ['id', 'name',"description"]
 
 
 class GroupAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name', 'course_code', 'f_description', 'start_from', 'duration', 'formatted_price', 'teacher', 'max_student', 'contact_number', 'lang', 'group_photo']
+    list_display = ['id', 'name', 'course_code', 'f_description', 'start_from', 'duration', 'formatted_price', 'teacher', 'max_student', 'contact_number', 'lang', 'group_photo', 'like_count']
+    autocomplete_fields = ['teacher']
+    search_fields = ['^name__name', '^course_code']
     
     def formatted_price(self, obj):
         color = "red" if obj.price > 1800000 else "green"
@@ -72,6 +127,10 @@ class GroupAdmin(admin.ModelAdmin):
         return f'{obj.description[:50]}...'
 
 
+class SkillAdmin(admin.ModelAdmin):
+    search_fields = ['^name']
+
+
 class ReadMoreAdmin(admin.ModelAdmin):
     list_display = ['language', ]
     
@@ -82,6 +141,35 @@ class GroupLikesAdmin(admin.ModelAdmin):
     def f_group(self, obj):
         return f'{obj.group.name} {obj.group.get_lang_display()}'
 
+    # Likes edited here bypass toggle_group_like, so keep Group.like_count in sync
+    def save_model(self, request, obj, form, change):
+        old_group_id = GroupLikes.objects.filter(id=obj.id).values_list('group_id', flat=True).first() if change else None
+        super().save_model(request, obj, form, change)
+        recount_group_likes({old_group_id, obj.group_id} - {None})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        recount_group_likes([obj.group_id])
+
+    def delete_queryset(self, request, queryset):
+        group_ids = set(queryset.values_list('group_id', flat=True))
+        super().delete_queryset(request, queryset)
+        recount_group_likes(group_ids - {None})
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'updated_at']
+    list_filter = ['status', 'name']
+    readonly_fields = ['last_error']
+    actions = ['retry']
+
+    @admin.action(description='Retry the selected tasks now')
+    def retry(self, request, queryset):
+        # A key that is pending again already runs anyway
+        pending_keys = Task.objects.filter(status=Task.PENDING, key__isnull=False).values('key')
+        count = queryset.filter(status=Task.FAILED).exclude(key__in=pending_keys).update(status=Task.PENDING, attempts=0, run_at=timezone.now())
+        self.message_user(request, f'{count} tasks queued again', messages.SUCCESS)
+
 
 # Register your models here.
 admin.site.register(Teacher, TeacherAdmin)
@@ -89,8 +177,9 @@ admin.site.register(Group, GroupAdmin)
 admin.site.register(Student, StudentAdmin)
 admin.site.register(Lesson)
 admin.site.register(Score_Attendance, Score_AttendanceAdmin)
-admin.site.register(Skill)
+admin.site.register(Skill, SkillAdmin)
 admin.site.register(GroupLikes, GroupLikesAdmin)
 admin.site.register(LessonFiles, LessonFilesAdmin)
 admin.site.register(GroupSpec,DeparmentAdmin)
 admin.site.register(ReadMore, ReadMoreAdmin)
+admin.site.register(Task, TaskAdmin)
@@ -1,25 +1,49 @@
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import DjangoModelPermissions, IsAuthenticated
 
 from rest_framework.response import Response
 
-from teacher.models import Teacher
-from teacher.serializer import ProfessorSer
+from teacher.caching import bump, invalidate_model
+from teacher.gradebook import rebuild_gradebook, refresh_lessons
+from teacher.models import Group, Lesson, LessonFiles, Score_Attendance, Student, Teacher
+from teacher.pagination import CreatedCursorPagination, IdCursorPagination, LessonCursorPagination
+from teacher.search import KINDS, index_model, matching, search
+from teacher.serializer import GroupSer, LessonFilesSer, LessonSer, PreloadedPrimaryKeyRelatedField, ProfessorSer, ScoreAttendanceSer, StudentsSer
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    ?search= through the full-text index of teacher/search.py, every word matches as a prefix.
+
+    The viewset names its documents with search_kind. Without the index (not SQLite) the
+    usual LIKE search over search_fields is used.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        subquery = matching(view.search_kind, request.query_params.get(self.search_param, ''))
+        if subquery is None:
+            return super().filter_queryset(request, queryset, view)
+        return queryset.filter(id__in=subquery)
 
 
 class ProfessorsAPIView(APIView):
     def get(self, request, *args,):
-        print(request.query_params)
-        print(request.data)
-        data = Teacher.objects.all()
-        print(data)
-        ser = ProfessorSer(data, many=True)
-        return Response(ser.data)
+        paginator = CreatedCursorPagination()
+        queryset = Teacher.objects.all()
+        only = ProfessorSer.only_fields(request, *paginator.ordering_fields)
+        if only:
+            queryset = queryset.only(*only)
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        ser = ProfessorSer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(ser.data)
     
     def post(self, request):
         ser = ProfessorSer(data=request.data)
@@ -42,6 +66,21 @@ class ProfessorsAPIView(APIView):
         return Response(ser.errors)
     
 
+class SearchAPIView(APIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Ranked full-text search over every kind, ?q=, optional ?kind= and ?limit= (at most 100)."""
+        kind = request.query_params.get('kind')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            raise ValidationError({'limit': 'Expected an integer'})
+        results = search(request.user, request.query_params.get('q', ''), kinds=[kind] if kind in KINDS else None, limit=limit)
+        return Response({'results': results})
+
+
 class ProfessorAPIView(APIView):
     def get(self, request, pk) -> Response:
         teacher = Teacher.objects.get(pk=pk)
@@ -52,8 +91,299 @@ class ProfessorAPIView(APIView):
 class ProfessorViewset(ModelViewSet):
     queryset = Teacher.objects.all()
     serializer_class = ProfessorSer
-    pagination_class = PageNumberPagination
+    pagination_class = CreatedCursorPagination
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, OrderingFilter]
     search_fields = ["first_name", 'last_name']
+    search_kind = 'professor'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        only = self.serializer_class.only_fields(self.request, *self.pagination_class.ordering_fields)
+        if only:
+            queryset = queryset.only(*only)
+        return queryset
+
+
+class BulkMixin:
+    """
+    Adds POST and PATCH on <prefix>/bulk/ to a ModelViewSet.
+
+    POST takes a list of new objects and inserts them with one bulk_create,
+    PATCH takes a list of partial objects with their id and writes them with one bulk_update.
+    Many-to-many values are written straight to the through table. The whole list is validated
+    first and saved in one transaction, so either every row is saved or none.
+    """
+    bulk_max_size = 1000
+
+    def get_bulk_data(self, request):
+        data = request.data
+        if not isinstance(data, list):
+            raise ValidationError({'detail': 'Expected a list of objects'})
+        if len(data) > self.bulk_max_size:
+            raise ValidationError({'detail': f'At most {self.bulk_max_size} objects per request'})
+        return data
+
+    def split_many_to_many(self, values):
+        """Pops the many-to-many values out of validated data, returns {field name: list of objects}."""
+        many_to_many = {field.name for field in self.queryset.model._meta.many_to_many}
+        return {name: values.pop(name) for name in list(values) if name in many_to_many}
+
+    def set_many_to_many(self, instances, relations, replace=False):
+        """
+        Writes the many-to-many values of every instance with one insert per field.
+
+        replace drops the current values first, only those the user sees: a teacher sending
+        the groups of a student keeps the student in the groups of other teachers.
+        """
+        for name in {name for related in relations for name in related}:
+            field = self.queryset.model._meta.get_field(name)
+            through = field.remote_field.through
+            source = field.m2m_field_name()
+            target = field.m2m_reverse_field_name()
+            changed = [instance for instance, related in zip(instances, relations) if name in related]
+            old = {instance.pk: set() for instance in changed}
+            if replace:
+                stale = through.objects.filter(**{f'{source}__in': changed})
+                targets = field.related_model._default_manager.all()
+                if hasattr(targets, 'visible_to'):
+                    stale = stale.filter(**{f'{target}__in': targets.visible_to(self.request.user).values('pk')})
+                for source_id, target_id in stale.values_list(f'{source}_id', f'{target}_id'):
+                    old[source_id].add(target_id)
+                stale.delete()
+            for instance in changed:
+                # Drop the stale prefetched values so the response shows the new ones
+                getattr(instance, '_prefetched_objects_cache', {}).pop(name, None)
+            through.objects.bulk_create((
+                through(**{f'{source}_id': instance.pk, f'{target}_id': obj.pk})
+                for instance, related in zip(instances, relations) if name in related
+                for obj in related[name]
+            ), ignore_conflicts=True)
+            # Only the targets an instance gained or lost, a value sent again changed nothing
+            touched = set()
+            for instance, related in zip(instances, relations):
+                if name in related:
+                    touched |= old[instance.pk] ^ {obj.pk for obj in related[name]}
+            if touched:
+                self.many_to_many_changed(field, touched)
+
+    def many_to_many_changed(self, field, target_ids):
+        """
+        Called by set_many_to_many after it wrote a field, the through table sends no m2m_changed.
+
+        :param field: ManyToManyField
+        :param target_ids: set of ids of the related objects added to or removed from some instance
+        """
+
+    def preload_related(self, data):
+        """
+        Loads the objects the rows point to with one query per relation, {model: {pk: object}}.
+
+        The rows are validated one serializer each, without this every foreign key and
+        many-to-many id would cost a query per row.
+        """
+        related = {}
+        for name, field in self.get_serializer().fields.items():
+            relation = getattr(field, 'child_relation', field)
+            if field.read_only or not isinstance(relation, PreloadedPrimaryKeyRelatedField):
+                continue
+            ids = set()
+            for item in data:
+                value = item.get(name) if isinstance(item, dict) else None
+                for pk in value if isinstance(value, list) else [value]:
+                    if isinstance(pk, int) and not isinstance(pk, bool) or isinstance(pk, str) and pk.isdigit():
+                        ids.add(int(pk))
+            queryset = relation.get_queryset()
+            related.setdefault(queryset.model, {}).update(queryset.in_bulk(ids) if ids else {})
+        return related
+
+    def get_bulk_serializer(self, *args, related, **kwargs):
+        return self.get_serializer(*args, context={**self.get_serializer_context(), 'related': related}, **kwargs)
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request):
+        data = self.get_bulk_data(request)
+        if request.method == 'POST':
+            response = self.bulk_create(data)
+        else:
+            response = self.bulk_update(data)
+        # bulk_create and bulk_update send no signals
+        invalidate_model(self.queryset.model)
+        index_model(self.queryset.model, [item['id'] for item in response.data])
+        return response
+
+    def bulk_create(self, data):
+        serializer = self.get_bulk_serializer(data=data, many=True, related=self.preload_related(data))
+        serializer.is_valid(raise_exception=True)
+        model = self.queryset.model
+        rows = [dict(values) for values in serializer.validated_data]
+        relations = [self.split_many_to_many(values) for values in rows]
+        try:
+            with transaction.atomic():
+                instances = model.objects.bulk_create(model(**values) for values in rows)
+                self.set_many_to_many(instances, relations)
+        except IntegrityError as error:
+            raise ValidationError({'detail': str(error)})
+        return Response(self.get_serializer(instances, many=True).data, status=status.HTTP_201_CREATED)
+
+    def get_bulk_ids(self, data):
+        try:
+            return [int(item['id']) for item in data]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({'detail': 'Every object needs an integer id'})
+
+    def bulk_update(self, data):
+        ids = self.get_bulk_ids(data)
+        duplicates = sorted({pk for pk in ids if ids.count(pk) > 1})
+        if duplicates:
+            raise ValidationError({'detail': f'Objects {duplicates} are given more than once'})
+        model = self.queryset.model
+        with transaction.atomic():
+            # The unique together validators read the current foreign keys of every instance
+            foreign_keys = [field.name for field in model._meta.concrete_fields if field.many_to_one]
+            instances = self.get_queryset().select_related(*foreign_keys).in_bulk(ids)
+            missing = sorted(set(ids) - set(instances))
+            if missing:
+                raise ValidationError({'detail': f'Objects {missing} do not exist'})
+
+            related = self.preload_related(data)
+            errors = []
+            changed = []
+            for item in data:
+                serializer = self.get_bulk_serializer(instances[int(item['id'])], data=item, partial=True, related=related)
+                errors.append({} if serializer.is_valid() else serializer.errors)
+                changed.append(dict(serializer.validated_data) if not errors[-1] else {})
+            if any(errors):
+                raise ValidationError(errors)
+
+            relations = [self.split_many_to_many(values) for values in changed]
+            fields = set()
+            for item, values in zip(data, changed):
+                instance = instances[int(item['id'])]
+                for name, value in values.items():
+                    setattr(instance, name, value)
+                fields.update(values)
+            updated = [instances[int(item['id'])] for item in data]
+            if fields:
+                # bulk_update skips auto_now, the fields are stamped here like save() does
+                for field in model._meta.concrete_fields:
+                    if getattr(field, 'auto_now', False):
+                        for instance in updated:
+                            field.pre_save(instance, add=False)
+                        fields.add(field.name)
+                model.objects.bulk_update(updated, fields)
+            self.set_many_to_many(updated, relations, replace=True)
+        return Response(self.get_serializer(updated, many=True).data)
+
+
+class VisibleToMixin:
+    """Limits a viewset to the rows the user may see, teachers only get the rows of their own groups."""
+
+    def get_queryset(self):
+        return super().get_queryset().visible_to(self.request.user)
+
+
+class StudentViewset(VisibleToMixin, BulkMixin, ModelViewSet):
+    queryset = Student.objects.prefetch_related('group')
+    serializer_class = StudentsSer
+    pagination_class = CreatedCursorPagination
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated, DjangoModelPermissions]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, OrderingFilter]
+    filterset_fields = {
+        'group': ['exact'],
+        'gender': ['exact'],
+        'created_at': ['gte', 'lte'],
+    }
+    search_fields = ["first_name", 'last_name']
+    search_kind = 'student'
+
+    # What the m2m_changed receivers of teacher/signals.py do for the group field
+    def many_to_many_changed(self, field, target_ids):
+        if field.name == 'group':
+            bump('students', 'groups')
+            rebuild_gradebook(target_ids)
+
+
+class GroupViewset(VisibleToMixin, BulkMixin, ModelViewSet):
+    queryset = Group.objects.all()
+    serializer_class = GroupSer
+    pagination_class = CreatedCursorPagination
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated, DjangoModelPermissions]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, OrderingFilter]
+    filterset_fields = ['name', 'teacher', 'lang']
+    search_fields = ['name__name', 'course_code']
+    search_kind = 'course'
+
+
+class LessonViewset(VisibleToMixin, BulkMixin, ModelViewSet):
+    queryset = Lesson.objects.all()
+    serializer_class = LessonSer
+    pagination_class = LessonCursorPagination
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated, DjangoModelPermissions]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, OrderingFilter]
+    filterset_fields = {
+        'group': ['exact'],
+        'date': ['exact', 'gte', 'lte'],
+    }
+    search_fields = ['theme', 'description']
+    search_kind = 'lesson'
+
+
+class LessonFilesViewset(VisibleToMixin, ModelViewSet):
+    queryset = LessonFiles.objects.all()
+    serializer_class = LessonFilesSer
+    pagination_class = IdCursorPagination
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated, DjangoModelPermissions]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['lesson']
+
+
+class ScoreAttendanceViewset(VisibleToMixin, BulkMixin, ModelViewSet):
+    queryset = Score_Attendance.objects.all()
+    serializer_class = ScoreAttendanceSer
+    pagination_class = CreatedCursorPagination
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated, DjangoModelPermissions]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = {
+        'lesson': ['exact'],
+        'lesson__group': ['exact'],
+        'student': ['exact'],
+        'is_present': ['exact'],
+        'created_at': ['gte', 'lte'],
+    }
+
+    # Every write refreshes the gradebook statistics of the lessons it touched
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            super().perform_create(serializer)
+            refresh_lessons([serializer.instance.lesson_id])
+
+    def perform_update(self, serializer):
+        previous = serializer.instance.lesson_id
+        with transaction.atomic():
+            super().perform_update(serializer)
+            refresh_lessons([previous, serializer.instance.lesson_id])
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
+            refresh_lessons([instance.lesson_id])
+
+    def bulk_create(self, data):
+        with transaction.atomic():
+            response = super().bulk_create(data)
+            refresh_lessons(item['lesson'] for item in response.data)
+        return response
+
+    def bulk_update(self, data):
+        with transaction.atomic():
+            previous = set(Score_Attendance.objects.filter(id__in=self.get_bulk_ids(data)).values_list('lesson_id', flat=True))
+            response = super().bulk_update(data)
+            refresh_lessons(previous | {item['lesson'] for item in response.data})
+        return response
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TeacherConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'teacher'
+
+    def ready(self):
+        # Connects the cache invalidation receivers and registers the checks
+        from teacher import checks, signals  # noqa: F401
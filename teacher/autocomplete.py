@@ -0,0 +1,105 @@
+from django import forms
+from django.db.models import Q
+from django.urls import reverse
+
+from teacher.models import Group, Skill, Teacher
+
+
+def group_label(group):
+    return ' '.join(filter(None, [str(group.name or ''), group.course_code]))
+
+
+def teacher_label(teacher):
+    return f'{teacher.first_name} {teacher.last_name}'
+
+
+# Source -> (model, prefix searched fields, select_related, label) of the choices the widgets load
+SOURCES = {
+    'groups': (Group, ('name__name', 'course_code'), ('name',), group_label),
+    'teachers': (Teacher, ('first_name', 'last_name', 'email'), (), teacher_label),
+    'skills': (Skill, ('name',), (), str),
+}
+
+# Source -> permissions of the forms whose widgets load it, one of them is needed to list the choices
+PERMISSIONS = {
+    'groups': ('teacher.add_student', 'teacher.change_student', 'teacher.add_lesson', 'teacher.change_lesson'),
+    'teachers': ('teacher.add_group', 'teacher.change_group'),
+    'skills': ('teacher.view_skill',),
+}
+
+LIMIT = 20
+
+
+def choices_queryset(source, user=None):
+    """The objects of a source, groups are limited to those the user sees like everywhere else."""
+    model, _, related, _ = SOURCES[source]
+    queryset = model.objects.select_related(*related)
+    if user is not None and source == 'groups':
+        queryset = queryset.visible_to(user)
+    return queryset
+
+
+def can_suggest(user, source):
+    return any(user.has_perm(permission) for permission in PERMISSIONS[source])
+
+
+def suggest(user, source, term, limit=LIMIT):
+    """
+    The choices whose fields start with the words typed by the user.
+
+    Every word must be the prefix of one of the searched fields, "ali kar" finds "Alisher Karimov".
+
+    :param user: Teacher object
+    :param source: str, key of SOURCES
+    :param term: str, what the user typed, the first choices if empty
+    :param limit: int, most results
+    :return: list of dicts with id and text
+    """
+    _, fields, _, label = SOURCES[source]
+    queryset = choices_queryset(source, user)
+    for word in (term or '').split():
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__istartswith': word})
+        queryset = queryset.filter(condition)
+    return [{'id': obj.pk, 'text': label(obj)} for obj in queryset.order_by(*fields[:1], 'pk')[:limit]]
+
+
+class AutocompleteMixin:
+    """
+    Renders only the selected choices, the others are loaded on demand from the
+    autocomplete view by js/autocomplete.js.
+
+    The field keeps its queryset, so a submitted id is still validated with a single
+    query for the submitted ids and never by listing every choice.
+    """
+
+    def __init__(self, source, attrs=None):
+        super().__init__(attrs)
+        self.source = source
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete'] = reverse('autocomplete', args=[self.source])
+        attrs['class'] = ' '.join(filter(None, [attrs.get('class'), 'form-control']))
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        ids = [pk for pk in value if str(pk).isdigit()]
+        options = []
+        if not self.allow_multiple_selected and self.choices.field.empty_label is not None:
+            options.append(self.create_option(name, '', self.choices.field.empty_label, not ids, 0))
+        if ids:
+            label = SOURCES[self.source][3]
+            queryset = self.choices.queryset.select_related(*SOURCES[self.source][2]).filter(pk__in=ids)
+            for obj in queryset:
+                options.append(self.create_option(name, obj.pk, label(obj), True, len(options)))
+        return [(None, options, 0)]
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass
@@ -0,0 +1,440 @@
+import hashlib
+import json
+import math
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+from itertools import count
+from urllib.parse import urlencode
+
+import django
+from django.contrib.auth.models import Group as GroupType, Permission
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from teacher.models import Group, GroupSpec, LessonFiles, Score_Attendance, Skill, Student, Teacher
+from teacher.roles import TEACHER
+from teacher.seeding import SchoolSeeder
+from teacher.uploads import start_upload, write_chunk
+
+
+# Dataset name -> SchoolSeeder arguments
+SIZES = {
+    'small': {'students': 1000, 'groups': 20, 'lessons_per_group': 10},
+    'medium': {'students': 10000, 'groups': 200, 'lessons_per_group': 20},
+    'large': {'students': 100000, 'groups': 2000, 'lessons_per_group': 40},
+}
+
+# Slower than the baseline by more than this share and by at least MIN_SLOWDOWN_MS is a regression
+THRESHOLD = 0.25
+MIN_SLOWDOWN_MS = 2.0
+# Responses may grow by this many bytes without being reported, e.g. a longer date
+MIN_GROWTH_BYTES = 1024
+
+FILE_CONTENT = b'%PDF-1.4\n' + bytes(range(256)) * 256
+
+
+class Fixtures:
+    """The objects the routes are requested with, picked from the seeded school."""
+
+    def __init__(self):
+        self.numbers = count(1)
+        manager_role, _ = GroupType.objects.get_or_create(name='Manager')
+        teacher_role, _ = GroupType.objects.get_or_create(name=TEACHER)
+        # Teachers see their own groups on the list pages, like in production they may view them
+        teacher_role.permissions.add(*Permission.objects.filter(content_type__app_label='teacher', codename__startswith='view_'))
+        self.manager = Teacher.objects.create_user(first_name='Bench', last_name='Manager', email='bench@example.com', phone='bench')
+        self.manager.is_superuser = self.manager.is_admin = self.manager.is_staff = True
+        self.manager.set_password('password')
+        self.manager.save()
+        self.manager.groups.add(manager_role)
+        # The API viewsets only take token authentication
+        self.token = Token.objects.create(user=self.manager).key
+
+        self.group = Group.objects.filter(teacher__isnull=False).order_by('id').first()
+        self.professor = self.group.teacher
+        self.lesson = self.group.lesson_set.order_by('id').first()
+        self.student = Student.objects.filter(group=self.group).order_by('id').first()
+        self.department = GroupSpec.objects.order_by('id').first()
+        self.skill = Skill.objects.create(name='Benchmark')
+        self.lesson_file = LessonFiles(lesson=self.lesson)
+        self.lesson_file.file.save('slides.pdf', ContentFile(FILE_CONTENT))
+        self.attendance = list(Score_Attendance.objects.filter(lesson=self.lesson).order_by('id'))
+        self.upload = self.new_upload(write=False)
+
+    def next(self):
+        return next(self.numbers)
+
+    def new_upload(self, write=True):
+        """An upload of one chunk, with the chunk already sent if write."""
+        content = FILE_CONTENT + str(self.next()).encode()
+        upload = start_upload(self.lesson, self.manager, 'notes.pdf', len(content), hashlib.sha256(content).hexdigest())
+        if write:
+            write_chunk(upload, 0, ContentFile(content))
+        return upload
+
+    # Objects deleted by the delete routes, one per request
+
+    def new_professor(self):
+        number = self.next()
+        return Teacher.objects.create_user(first_name='Gone', last_name='Soon', email=f'gone{number}@example.com', phone=f'gone{number}')
+
+    def new_student(self):
+        student = Student.objects.create(first_name='Gone', last_name='Soon', email='gone@example.com', phone='1', address='')
+        student.group.add(self.group)
+        return student
+
+    def new_group(self):
+        return Group.objects.create(name=self.department, description='', teacher=self.professor)
+
+    def new_lesson_file(self):
+        lesson_file = LessonFiles(lesson=self.lesson, name='copy.pdf')
+        lesson_file.file.name = self.lesson_file.file.name
+        lesson_file.save()
+        return lesson_file
+
+
+class Route:
+    """
+    One request of the benchmark.
+
+    args, query and data are values or callables taking the Fixtures, called before every
+    request and outside the measured time, so the delete routes get a new object each time.
+    """
+
+    def __init__(self, url_name, args=(), method='get', query=None, data=None, as_json=False, user='manager', label=None, before=None):
+        self.url_name = url_name
+        self.args = args
+        self.method = method
+        self.query = query
+        self.data = data
+        self.as_json = as_json
+        self.user = user
+        self.label = label or url_name
+        self.before = before
+
+    @staticmethod
+    def value(value, fixtures):
+        return value(fixtures) if callable(value) else value
+
+    def request(self, fixtures):
+        """:return: (url, keyword arguments of the test client method)"""
+        url = reverse(self.url_name, args=self.value(self.args, fixtures))
+        kwargs = {}
+        if self.query:
+            kwargs['QUERY_STRING'] = urlencode(self.value(self.query, fixtures))
+        data = self.value(self.data, fixtures)
+        if data is not None:
+            kwargs['data'] = json.dumps(data, default=str) if self.as_json else data
+            if self.as_json:
+                kwargs['content_type'] = 'application/json'
+        return url, kwargs
+
+
+def attendance_grid(fixtures):
+    data = {'form-TOTAL_FORMS': len(fixtures.attendance), 'form-INITIAL_FORMS': len(fixtures.attendance)}
+    for index, row in enumerate(fixtures.attendance):
+        data[f'form-{index}-student'] = row.student_id
+        data[f'form-{index}-mark'] = '' if row.mark is None else row.mark
+        if row.is_present:
+            data[f'form-{index}-is_present'] = 'on'
+    return data
+
+
+def new_professor_form(fixtures):
+    number = fixtures.next()
+    return {
+        'first_name': 'New', 'last_name': 'Professor', 'email': f'new{number}@example.com',
+        'phone': f'+998 90 {number % 1000:03}-{number // 1000 % 100:02}-{number // 100000 % 100:02}',
+        'gender': '1', 'education': 'Teacher', 'password1': 'Benchmark-password-1', 'password2': 'Benchmark-password-1',
+    }
+
+
+ROUTES = [
+    # education/urls.py
+    Route('home'),
+    Route('search', query={'q': 'ali'}),
+    Route('search', query={'q': 'ali', 'format': 'json'}, label='search json'),
+    Route('autocomplete', args=['groups'], query={'q': 'py'}, label='autocomplete groups'),
+    Route('autocomplete', args=['teachers'], query={'q': 'a'}, label='autocomplete teachers'),
+    Route('register'),
+    Route('login', user=None),
+    Route('logout', user=None, before=lambda client, fixtures: client.force_login(fixtures.manager)),
+    Route('get_token', method='post', data={'username': 'bench@example.com', 'password': 'password'}, user=None),
+    Route('media', args=lambda f: [f.lesson_file.file.name]),
+    Route('admin:index'),
+    Route('admin:teacher_student_changelist'),
+    Route('admin:teacher_student_change', args=lambda f: [f.student.id]),
+    Route('admin:teacher_teacher_change', args=lambda f: [f.professor.id]),
+    Route('admin:teacher_score_attendance_changelist'),
+
+    # teacher/urls.py
+    Route('all_professors'),
+    Route('add_professor'),
+    Route('add_professor', method='post', data=new_professor_form, label='add_professor post'),
+    Route('edit_professor', args=lambda f: [f.professor.id]),
+    Route('professor_profile', args=lambda f: [f.professor.id]),
+    Route('delete_professor', args=lambda f: [f.new_professor().id]),
+    Route('all_students'),
+    Route('all_students', user='professor', label='all_students teacher'),
+    Route('add_student'),
+    Route('edit_student', args=lambda f: [f.student.id]),
+    Route('student_profile', args=lambda f: [f.student.id]),
+    Route('delete_student', args=lambda f: [f.new_student().id]),
+    Route('all_courses'),
+    Route('add_course'),
+    Route('edit_course', args=lambda f: [f.group.id]),
+    Route('about_course', args=lambda f: [f.group.id]),
+    Route('delete_course', args=lambda f: [f.new_group().id]),
+    Route('view_course', args=lambda f: [f.group.id]),
+    Route('add_lesson'),
+    Route('all_lessons'),
+    Route('all_lessons', user='professor', label='all_lessons teacher'),
+    Route('edit_lesson', args=lambda f: [f.lesson.id]),
+    Route('delete_lesson_file', args=lambda f: [f.new_lesson_file().id]),
+    Route('attendance', args=lambda f: [f.lesson.id]),
+    Route('attendance', args=lambda f: [f.lesson.id], method='post', data=attendance_grid, label='attendance post'),
+    Route('attendance_bulk', args=lambda f: [f.lesson.id], method='post', as_json=True, data=lambda f: {'rows': [
+        {'student': row.student_id, 'mark': row.mark, 'is_present': row.is_present} for row in f.attendance
+    ]}),
+    Route('department'),
+    Route('add_department'),
+    Route('edit_department', args=lambda f: [f.department.id]),
+    Route('delete_department', args=lambda f: [GroupSpec.objects.create(name='Gone', description='').id]),
+    Route('all_skills'),
+    Route('add_skill'),
+    Route('edit_skill', args=lambda f: [f.skill.id]),
+    Route('delete_skill', args=lambda f: [Skill.objects.create(name='Gone').id]),
+    Route('add_like', args=lambda f: [f.group.id]),
+    Route('add_like', args=lambda f: [f.group.id], method='post', label='add_like post'),
+    Route('group_likes', query=lambda f: {'ids': ','.join(str(pk) for pk in Group.objects.order_by('id').values_list('id', flat=True)[:20])}),
+    Route('export_gradebook', query=lambda f: {'group': f.group.id}),
+    Route('lesson_upload', args=lambda f: [f.lesson.id], method='post', as_json=True, data=lambda f: {
+        'file_name': 'notes.pdf', 'size': 1024, 'sha256': hashlib.sha256(str(f.next()).encode()).hexdigest(),
+    }),
+    Route('upload_status', args=lambda f: [f.upload.id]),
+    Route('upload_chunk', args=lambda f: [f.upload.id, 0], method='put', data=lambda f: FILE_CONTENT + b'0'),
+    Route('upload_finalize', args=lambda f: [f.new_upload().id], method='post'),
+
+    # teacher/router.py
+    Route('api-root'),
+    Route('viewset-list'),
+    Route('viewset-detail', args=lambda f: [f.professor.id]),
+    Route('students-list'),
+    Route('students-list', query={'search': 'ali'}, label='students-list search'),
+    Route('students-detail', args=lambda f: [f.student.id]),
+    Route('students-bulk', method='patch', as_json=True, data=lambda f: [
+        {'id': pk, 'education': 'School'} for pk in Student.objects.filter(group=f.group).order_by('id').values_list('id', flat=True)
+    ]),
+    Route('groups-list'),
+    Route('groups-detail', args=lambda f: [f.group.id]),
+    Route('groups-bulk', method='patch', as_json=True, data=lambda f: [{'id': f.group.id, 'max_student': 100}]),
+    Route('lessons-list'),
+    Route('lessons-detail', args=lambda f: [f.lesson.id]),
+    Route('lessons-bulk', method='patch', as_json=True, data=lambda f: [
+        {'id': pk, 'description': 'Benchmark'} for pk in f.group.lesson_set.order_by('id').values_list('id', flat=True)
+    ]),
+    Route('lesson-files-list'),
+    Route('lesson-files-detail', args=lambda f: [f.lesson_file.id]),
+    Route('attendance-list'),
+    Route('attendance-detail', args=lambda f: [f.attendance[0].id]),
+    Route('attendance-bulk', method='patch', as_json=True, data=lambda f: [{'id': row.id, 'mark': row.mark} for row in f.attendance]),
+    Route('professors'),
+    Route('professor', args=lambda f: [f.professor.id]),
+    Route('api_search', query={'q': 'ali'}),
+]
+
+
+def url_names(patterns=None, namespace=None):
+    """Names of every URL pattern outside the admin, the routes should cover all of them."""
+    names = set()
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace != 'admin':
+                names |= url_names(pattern.url_patterns, pattern.namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(f'{namespace}:{pattern.name}' if namespace else pattern.name)
+    return names
+
+
+def percentile(samples, share):
+    """Nearest rank percentile of a sorted list."""
+    return samples[max(math.ceil(share * len(samples)) - 1, 0)]
+
+
+class QueryTimer:
+    """Counts the SQL queries of a request and adds up their time, with perf_counter precision."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def measure(client, route, fixtures, repeat):
+    """
+    Requests the route repeat times after one warm up request.
+
+    :return: dict with the status, latency percentiles and mean in ms, the most SQL queries
+             of a request, the median SQL time in ms and the response size in bytes
+    """
+    times, queries, sql_times = [], [], []
+    status = size = None
+    for number in range(repeat + 1):
+        if route.before:
+            route.before(client, fixtures)
+        url, kwargs = route.request(fixtures)
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = getattr(client, route.method)(url, **kwargs)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            elapsed = time.perf_counter() - started
+        if number == 0:
+            continue
+        times.append(elapsed * 1000)
+        queries.append(timer.count)
+        sql_times.append(timer.seconds * 1000)
+        status, size = response.status_code, len(body)
+    times.sort()
+    return {
+        'method': route.method.upper(),
+        'url': url,
+        'status': status,
+        'p50_ms': round(percentile(times, 0.5), 2),
+        'p90_ms': round(percentile(times, 0.9), 2),
+        'p99_ms': round(percentile(times, 0.99), 2),
+        'mean_ms': round(statistics.mean(times), 2),
+        'queries': max(queries),
+        'sql_ms': round(statistics.median(sql_times), 2),
+        'bytes': size,
+    }
+
+
+def run_size(size, repeat, routes, log):
+    """Seeds a school of the given size into a new test database and measures the routes against it."""
+    creation = connection.creation
+    old_name = connection.settings_dict['NAME']
+    creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        log(f'Seeding the {size} school')
+        SchoolSeeder(**SIZES[size]).run()
+        fixtures = Fixtures()
+        clients = {}
+        for user in ('manager', 'professor', None):
+            clients[user] = Client(headers={'Authorization': f'Token {fixtures.token}'} if user == 'manager' else None)
+            if user:
+                clients[user].force_login(getattr(fixtures, user))
+        results = {}
+        for route in routes:
+            results[route.label] = measure(clients[route.user], route, fixtures, repeat)
+            log(format_result(route.label, results[route.label]))
+        return results
+    finally:
+        creation.destroy_test_db(old_name, verbosity=0)
+
+
+def run_benchmark(sizes=('small', 'medium'), repeat=10, only=None, cached=False, log=lambda message: None):
+    """
+    Measures every route against seeded schools of the given sizes.
+
+    Every size gets its own test database, the configured database is never touched. The page
+    cache is off unless cached, so the numbers are what building the pages costs.
+
+    :param sizes: iterable of keys of SIZES
+    :param repeat: int, measured requests per route
+    :param only: iterable of str, only the routes whose label contains one of them
+    :param cached: bool, keep the configured cache
+    :param log: callable taking a line of progress
+    :return: dict ready for JSON
+    """
+    routes = [route for route in ROUTES if not only or any(part in route.label for part in only)]
+    media = tempfile.mkdtemp(prefix='benchmark-')
+    overrides = {
+        'MEDIA_ROOT': media,
+        'LESSON_UPLOAD_DIR': f'{media}/uploads',
+        # Side effects are queued like in production, the worker is not measured
+        'TASKS_EAGER': False,
+    }
+    if not cached:
+        overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+    setup_test_environment()
+    try:
+        with override_settings(**overrides):
+            results = {size: {'dataset': SIZES[size], 'routes': run_size(size, repeat, routes, log)} for size in sizes}
+    finally:
+        teardown_test_environment()
+        shutil.rmtree(media, ignore_errors=True)
+    return {
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': f'sqlite {connection.Database.sqlite_version}' if connection.vendor == 'sqlite' else connection.vendor,
+        'repeat': repeat,
+        'cached': cached,
+        'uncovered': sorted(url_names() - {route.url_name for route in ROUTES}),
+        'sizes': results,
+    }
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    Lists the routes that got worse than in the baseline.
+
+    More SQL queries, another status code, a median latency more than threshold slower or a
+    response more than threshold larger are regressions. Routes and sizes missing from either
+    run are skipped.
+
+    :param results: dict from run_benchmark
+    :param baseline: dict from an earlier run_benchmark, e.g. loaded from its JSON file
+    :param threshold: float, allowed relative slowdown and growth
+    :return: list of str
+    """
+    regressions = []
+    for size, current_size in results['sizes'].items():
+        old_routes = baseline.get('sizes', {}).get(size, {}).get('routes', {})
+        for label, current in current_size['routes'].items():
+            old = old_routes.get(label)
+            if old is None:
+                continue
+            name = f'{size} {label}'
+            if current['status'] != old['status']:
+                regressions.append(f'{name}: status {old["status"]} -> {current["status"]}')
+            if current['queries'] > old['queries']:
+                regressions.append(f'{name}: {old["queries"]} -> {current["queries"]} queries')
+            if current['p50_ms'] > old['p50_ms'] * (1 + threshold) and current['p50_ms'] - old['p50_ms'] >= MIN_SLOWDOWN_MS:
+                regressions.append(f'{name}: p50 {old["p50_ms"]} -> {current["p50_ms"]} ms')
+            if current['bytes'] > old['bytes'] * (1 + threshold) and current['bytes'] - old['bytes'] >= MIN_GROWTH_BYTES:
+                regressions.append(f'{name}: {old["bytes"]} -> {current["bytes"]} bytes')
+    return regressions
+
+
+def format_result(label, result):
+    return (
+        f'{label:<40} {result["status"]:>3} {result["p50_ms"]:>9.1f} {result["p90_ms"]:>9.1f} {result["p99_ms"]:>9.1f} ms'
+        f' {result["queries"]:>4} q {result["sql_ms"]:>8.1f} ms sql {result["bytes"] / 1024:>9.1f} KB'
+    )
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save(results, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2)
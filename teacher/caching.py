@@ -0,0 +1,112 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+# Model label -> namespaces of the cached pages and fragments that render the model
+NAMESPACES = {
+    'teacher.group': ('groups',),
+    # Course names are GroupSpec names
+    'teacher.groupspec': ('departments', 'groups'),
+    'teacher.skill': ('skills',),
+    'teacher.student': ('students',),
+    # The sidebar links depend on is_superuser and is_active
+    'teacher.teacher': ('teachers', 'permissions'),
+    'teacher.grouplikes': ('likes',),
+}
+
+
+def get_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 300)
+
+
+def version_key(namespace):
+    return f'version:{namespace}'
+
+
+def new_version():
+    # A version the namespace never had before, so entries written before an eviction are never read again
+    return time.time_ns()
+
+
+def get_versions(*namespaces):
+    """
+    Returns the current version of every namespace with one cache round trip.
+
+    :return: dict of namespace -> int
+    """
+    keys = {version_key(namespace): namespace for namespace in namespaces}
+    found = cache.get_many(keys)
+    for key in set(keys) - set(found):
+        cache.add(key, new_version(), None)
+        found[key] = cache.get(key)
+    return {namespace: found[key] for key, namespace in keys.items()}
+
+
+def bump(*namespaces):
+    """
+    Moves the namespaces to a new version, every key built with the old one is never read again.
+
+    The bump waits for the current transaction to commit, otherwise a request running in between
+    could cache the old rows under the new version.
+    Every bump writes a version the namespace never had, incr is a read and a write on the database
+    cache, two processes bumping at once would both move to the same version.
+    """
+    def move():
+        cache.set_many({version_key(namespace): new_version() for namespace in namespaces}, None)
+    transaction.on_commit(move)
+
+
+def invalidate_model(model):
+    """Bumps the namespaces that render the model, for writes that do not send signals like bulk_create."""
+    bump(*NAMESPACES.get(model._meta.label_lower, ()))
+
+
+def make_key(name, namespaces, *parts):
+    """
+    Builds a cache key that contains the versions of every namespace the value depends on.
+
+    :param name: str, what is cached
+    :param namespaces: tuple of namespaces the value depends on
+    :param parts: anything else the value varies on, like the user id or the query string
+    :return: str
+    """
+    versions = get_versions(*namespaces)
+    return ':'.join(['page', name, *(f'{namespace}.{versions[namespace]}' for namespace in namespaces), *map(str, parts)])
+
+
+def cached(name, namespaces, compute, *parts):
+    """
+    Returns the cached value or computes and stores it.
+
+    compute must return something picklable that does not hit the database any more,
+    evaluated lists instead of lazy querysets.
+
+    :param name: str, what is cached
+    :param namespaces: tuple of namespaces the value depends on
+    :param compute: callable without arguments
+    :param parts: anything else the value varies on
+    """
+    key = make_key(name, namespaces, *parts)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, get_timeout())
+    return value
+
+
+class CacheVersions:
+    """Looks the namespace versions up lazily for {% cache %} tags, e.g. cache_versions.groups."""
+
+    def __getitem__(self, namespace):
+        return get_versions(namespace)[namespace]
+
+
+def cache_versions(request):
+    """Context processor for the template fragment caches."""
+    return {
+        'cache_versions': CacheVersions(),
+        'cache_timeout': get_timeout(),
+    }
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+# Cache backends whose entries only the process that wrote them can see
+PROCESS_LOCAL_CACHES = {'django.core.cache.backends.locmem.LocMemCache'}
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Roles, permissions and pages are cached under versions that the writes bump, see teacher/caching.py.
+    A process-local cache only sees the bumps of its own process.
+    """
+    if settings.CACHES.get('default', {}).get('BACKEND') in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            'The default cache is local to each process.',
+            hint='Roles, permissions and pages cached by one process are not invalidated by the writes of another, '
+                 'a revoked permission keeps working there. Use the file, Redis, Memcached or database cache when more '
+                 'than one process serves the site.',
+            id='teacher.W001',
+        )]
+    return []
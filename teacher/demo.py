@@ -0,0 +1,39 @@
+from functools import lru_cache
+from random import randint
+
+from django.conf import settings
+
+
+def is_enabled(request=None):
+    """
+    Demo prefill is on with the DEMO_PREFILL setting or for one page with ?demo=1.
+
+    :param request: Request object or None
+    :return: bool
+    """
+    if getattr(settings, 'DEMO_PREFILL', False):
+        return True
+    return request is not None and request.GET.get('demo') == '1'
+
+
+@lru_cache(maxsize=None)
+def get_faker():
+    # Faker loads its locale providers on import, only demo pages pay for it
+    from faker import Faker
+    return Faker()
+
+
+def professor_initial():
+    """Made up values for the add professor form, so a demo is filled in with one click."""
+    fake = get_faker()
+    return {
+        'first_name': fake.first_name(),
+        'last_name': fake.last_name(),
+        'email': fake.email(),
+        'phone': f'+998 {randint(10, 99)} {randint(0, 999):03}-{randint(0, 99):02}-{randint(0, 99):02}',
+        'address': fake.address(),
+        'gender': fake.random_element(elements=['1', '2']),
+        'date_of_birth': fake.date_of_birth(minimum_age=18, maximum_age=65),
+        'education': fake.job(),
+        'date_joined': fake.date(),
+    }
@@ -0,0 +1,73 @@
+from teacher.models import Group, Lesson, Score_Attendance, Student
+
+
+CHUNK_SIZE = 2000
+
+
+def filter_groups(group=None, teacher=None, user=None):
+    """
+    Groups to export, filtered by group id and teacher id.
+
+    :param user: Teacher object, only the groups the user sees, every group if None
+    :return: QuerySet of Group ordered by id
+    """
+    groups = Group.objects.select_related('name').order_by('id')
+    if user is not None:
+        groups = groups.visible_to(user)
+    if group:
+        groups = groups.filter(id=group)
+    if teacher:
+        groups = groups.filter(teacher=teacher)
+    return groups
+
+
+def cell(mark, is_present):
+    if not is_present:
+        return 'absent'
+    return mark if mark is not None else 'present'
+
+
+def gradebook_rows(groups, date_from=None, date_to=None):
+    """
+    Yields the gradebook of every group as CSV rows: one row per student, one column per lesson.
+
+    Students and marks are both read with .iterator() ordered by student id and merged,
+    so only the lessons of one group and the row being built are held in memory.
+
+    :param groups: QuerySet of Group
+    :param date_from: date or None, first lesson date to include
+    :param date_to: date or None, last lesson date to include
+    """
+    for group in groups.iterator(chunk_size=CHUNK_SIZE):
+        dates = {}
+        if date_from:
+            dates['date__gte'] = date_from
+        if date_to:
+            dates['date__lte'] = date_to
+        lessons = list(Lesson.objects.filter(group=group, **dates).order_by('date', 'id').values_list('id', 'date', 'theme'))
+        column = {lesson_id: index for index, (lesson_id, _, _) in enumerate(lessons)}
+
+        yield ['Group', f'{group.name.name if group.name else ""} {group.course_code or ""}'.strip()]
+        yield ['Student id', 'Last name', 'First name'] + [f'{date:%Y-%m-%d} {theme}' for _, date, theme in lessons]
+
+        marks = iter(
+            Score_Attendance.objects
+            .filter(lesson__group=group, student__isnull=False, **{f'lesson__{key}': value for key, value in dates.items()})
+            .order_by('student_id', 'lesson_id')
+            .values_list('student_id', 'lesson_id', 'mark', 'is_present')
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        mark = next(marks, None)
+        students = (
+            Student.objects.filter(group=group).order_by('id')
+            .values_list('id', 'last_name', 'first_name')
+            .iterator(chunk_size=CHUNK_SIZE)
+        )
+        for student_id, last_name, first_name in students:
+            cells = [''] * len(lessons)
+            while mark is not None and mark[0] <= student_id:
+                if mark[0] == student_id:
+                    cells[column[mark[1]]] = cell(mark[2], mark[3])
+                mark = next(marks, None)
+            yield [student_id, last_name, first_name] + cells
+        yield []
@@ -3,19 +3,21 @@ import re
 from typing import Any
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from faker import Faker
 from django.contrib.auth import get_user_model
-from django.forms import ValidationError, modelformset_factory
+from django.forms import ValidationError
 from django.db import models
-from random import randint
 from teacher.models import   Group, GroupSpec, Lesson, Score_Attendance, Skill, Student
 from django.contrib.auth.models import Group as GroupType
 from teacher.models import Group, GroupSpec, Lesson, Score_Attendance, Student
-
-fake = Faker()
+from teacher.autocomplete import AutocompleteSelect, AutocompleteSelectMultiple
+from teacher.roles import TEACHER, role_id
+from teacher.services import hidden_groups
+from teacher.uploads import get_max_size
 
 User = get_user_model()
 
+PHONE_CHECK = re.compile(r"^(\+998\s?)?[0-9]{2}\s?[0-9]{3}[\s?-]?[0-9]{2}[\s?-]?[0-9]{2}$")
+
 
 class AddProfessorForm(UserCreationForm):
 
@@ -38,45 +40,16 @@ class AddProfessorForm(UserCreationForm):
         label=''
 )
 
-    def __init__(self, *args, **kwargs):
-        self.one = randint(000, 999)
-        self.two = randint(00, 99)
-        self.three = randint(00, 99)
-        # Accept initial data from kwargs
-        initial = kwargs.get('initial', {})
-        
-        # Generate fake data if not provided
-        initial.setdefault('first_name', fake.first_name())
-        initial.setdefault('last_name', fake.last_name())
-        initial.setdefault('email', fake.email())
-        initial.setdefault('phone', f'+998-{randint(10, 100)}-{self.one if self.one > 9 else f'00{self.one}'}-{self.two if self.two > 9 else f'0{self.two}'}-{self.three if self.three > 9 else f'0{self.three}'}')
-        initial.setdefault('address', fake.address())
-        initial.setdefault('gender', fake.random_element(elements=['1', '2']))  # Example gender
-        initial.setdefault('department', None)  # Replace with actual default if needed
-        initial.setdefault('date_of_birth', fake.date_of_birth(minimum_age=18, maximum_age=65))
-        initial.setdefault('education', fake.job())  # Replace with actual default if needed
-        initial.setdefault('profile_photo', None)
-        initial.setdefault('date_joined', fake.date())
-        
-        super().__init__(*args, **kwargs)
-        self.fields['gender'].choices = [('1', 'Male'), ('2', 'Female')]  # Ensure choices are set
-
-        # Update form's initial data
-        self.initial.update(initial)
-    
     def save(self, commit = True):
         user = super().save(commit)
-        group = GroupType.objects.get(name='Teacher')
-        user.groups.add(group)
+        user.groups.add(role_id(TEACHER))
         if commit:
             user.save()
         return user
     
     def clean_phone(self):
         phone = self.cleaned_data.get("phone", '')
-        phone_regex = r"^(\+998\s?)?[0-9]{2}\s?[0-9]{3}[\s?-]?[0-9]{2}[\s?-]?[0-9]{2}$"
-        phone_check = re.compile(phone_regex)
-        if not phone_check.fullmatch(phone):
+        if not PHONE_CHECK.fullmatch(phone):
             raise ValidationError('Invalid phone number')
         return phone
 
@@ -101,9 +74,7 @@ class EditProfessorForm(forms.ModelForm):
 
     def clean_phone(self):
         phone = self.cleaned_data.get("phone", '')
-        phone_regex = r"^(\+998\s?)?[0-9]{2}\s?[0-9]{3}[\s?-]?[0-9]{2}[\s?-]?[0-9]{2}$"
-        phone_check = re.compile(phone_regex)
-        if not phone_check.fullmatch(phone):
+        if not PHONE_CHECK.fullmatch(phone):
             raise ValidationError('Invalid phone number')
         return phone
 
@@ -138,14 +109,38 @@ class AddCourseForm(forms.ModelForm):
     class Meta:
         model = Group
         fields = ('name', 'course_code', 'description', 'start_from', 'duration', 'price', 'teacher', 'max_student', 'contact_number', 'lang', 'group_photo')
+        widgets = {
+            'teacher': AutocompleteSelect('teachers'),
+        }
+
+
+class VisibleGroupsMixin:
+    """
+    Limits the group choices to the groups of the user, teachers only pick their own groups.
+
+    The groups of a student the user does not see are kept on save, see services.hidden_groups.
+    """
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        if user is not None:
+            self.fields['group'].queryset = self.fields['group'].queryset.visible_to(user)
+
+    def clean_group(self):
+        group = self.cleaned_data['group']
+        if self.user is None or not isinstance(self.fields['group'], forms.ModelMultipleChoiceField):
+            return group
+        return [*group, *hidden_groups(self.instance, self.user)]
 
 
-class AddStudentForm(forms.ModelForm):  
+class AddStudentForm(VisibleGroupsMixin, forms.ModelForm):
     class Meta:
         model = Student
         fields = ("first_name", "last_name","surname","email","phone","address","group","education","profile_photo","gender","birthday")
         widgets = {
-            "gender":forms.Select
+            "gender":forms.Select,
+            "group": AutocompleteSelectMultiple('groups'),
         }
 
     gender = forms.ChoiceField(
@@ -157,23 +152,22 @@ class AddStudentForm(forms.ModelForm):
     
     def clean_phone(self):
         phone = self.cleaned_data.get("phone", '')
-        phone_regex = r"^(\+998\s?)?[0-9]{2}\s?[0-9]{3}[\s?-]?[0-9]{2}[\s?-]?[0-9]{2}$"
-        phone_check = re.compile(phone_regex)
-        if not phone_check.fullmatch(phone):
+        if not PHONE_CHECK.fullmatch(phone):
             raise ValidationError('Invalid phone number')
         return phone
     
 
-class EditStudentForm(forms.ModelForm):
+class EditStudentForm(VisibleGroupsMixin, forms.ModelForm):
     class Meta:
         model = Student
         fields = ("first_name", "last_name", "email", "phone", "address", "group", "profile_photo", "gender")
+        widgets = {
+            "group": AutocompleteSelectMultiple('groups'),
+        }
 
     def clean_phone(self):
         phone = self.cleaned_data.get("phone", '')
-        phone_regex = r"^(\+998\s?)?[0-9]{2}\s?[0-9]{3}[\s?-]?[0-9]{2}[\s?-]?[0-9]{2}$"
-        phone_check = re.compile(phone_regex)
-        if not phone_check.fullmatch(phone):
+        if not PHONE_CHECK.fullmatch(phone):
             raise ValidationError('Invalid phone number')
         return phone
     
@@ -185,16 +179,22 @@ class EditStudentForm(forms.ModelForm):
         )
 
 
-class AddLessonForm(forms.ModelForm):
+class AddLessonForm(VisibleGroupsMixin, forms.ModelForm):
     class Meta:
         model = Lesson
         fields = '__all__'
+        widgets = {
+            'group': AutocompleteSelect('groups'),
+        }
 
 
-class EditLessonForm(forms.ModelForm):
+class EditLessonForm(VisibleGroupsMixin, forms.ModelForm):
     class Meta:
         model = Lesson
         fields = '__all__'
+        widgets = {
+            'group': AutocompleteSelect('groups'),
+        }
 
 
 # class AttendanceForm(forms.ModelForm):
@@ -202,7 +202,74 @@ class EditLessonForm(forms.ModelForm):
 #         model = Score_Attendance
 #         fields = ["student", 'lesson', 'mark', 'is_present']
 
-StudentsAttendanceFormSet = modelformset_factory(model=Score_Attendance, fields=["student", 'lesson', 'mark', 'is_present'], extra=0)
+class AttendanceMarkForm(forms.Form):
+    """One row of the compact JSON attendance payload."""
+    student = forms.IntegerField(min_value=1)
+    mark = forms.DecimalField(required=False, max_digits=3, decimal_places=1, min_value=0, max_value=10)
+    is_present = forms.BooleanField(required=False)
+
+
+class AttendanceGridRowForm(AttendanceMarkForm):
+    """One row of the attendance grid, the student is pinned in a hidden input."""
+    student = forms.IntegerField(min_value=1, widget=forms.HiddenInput)
+
+
+class BaseAttendanceGridFormSet(forms.BaseFormSet):
+    """
+    The attendance sheet of one lesson.
+
+    The rows are the preloaded Score_Attendance objects of the sheet, the lesson comes from
+    the URL and the students are plain ids checked against the sheet. No row renders or
+    queries a list of students or lessons, so the page only depends on the group size.
+    """
+
+    def __init__(self, data=None, *, sheet, **kwargs):
+        self.sheet = list(sheet)
+        self.rows = {row.student_id: row for row in self.sheet}
+        # A tampered TOTAL_FORMS cannot make the formset build more forms than the sheet has rows
+        self.max_num = self.absolute_max = len(self.sheet)
+        self.validate_max = True
+        kwargs.setdefault('initial', [
+            {'student': row.student_id, 'mark': row.mark, 'is_present': row.is_present}
+            for row in self.sheet
+        ])
+        super().__init__(data, **kwargs)
+        for form, row in zip(self.forms, self.sheet):
+            form.row = row
+
+    def clean(self):
+        seen = set()
+        for form in self.forms:
+            student_id = form.cleaned_data.get('student')
+            if student_id is None:
+                continue
+            if student_id not in self.rows:
+                raise ValidationError(f'Student {student_id} is not in the group of this lesson')
+            if student_id in seen:
+                raise ValidationError(f'Student {student_id} appears more than once')
+            seen.add(student_id)
+
+    def changed_rows(self):
+        """
+        Applies the submitted values to the sheet rows.
+
+        :return: list of Score_Attendance objects whose mark or is_present changed
+        """
+        changed = []
+        for form in self.forms:
+            if 'student' not in form.cleaned_data:
+                # An unchanged row sent as an extra form is not cleaned
+                continue
+            row = self.rows[form.cleaned_data['student']]
+            mark, is_present = form.cleaned_data['mark'], form.cleaned_data['is_present']
+            if row.mark != mark or row.is_present != is_present:
+                row.mark = mark
+                row.is_present = is_present
+                changed.append(row)
+        return changed
+
+
+AttendanceGridFormSet = forms.formset_factory(AttendanceGridRowForm, formset=BaseAttendanceGridFormSet, extra=0)
 
 
 class AddDepartmentForm(forms.ModelForm):
@@ -220,4 +287,52 @@ class AddSkillForm(forms.ModelForm):
 class EditSkillForm(forms.ModelForm):
     class Meta:
         model = Skill
-        fields = "__all__"
\ No newline at end of file
+        fields = "__all__"
+
+
+class StudentImportForm(forms.ModelForm):
+    """Validates the spreadsheet rows of the student import, groups are resolved separately."""
+    class Meta:
+        model = Student
+        fields = ("first_name", "last_name", "surname", "email", "phone", "address", "education", "gender", "birthday")
+
+    @classmethod
+    def clean_row(cls, values):
+        """
+        Cleans one row with the form fields without building a form instance.
+
+        Building a form deep-copies every field, which dominates the import time at tens of thousands of rows.
+
+        :param values: dict of field name -> raw string
+        :return: tuple of (cleaned data, dict of field name -> list of messages)
+        """
+        cleaned, errors = {}, {}
+        for name, field in cls.base_fields.items():
+            try:
+                cleaned[name] = field.clean(values.get(name, ''))
+            except ValidationError as error:
+                errors[name] = error.messages
+        if 'phone' in cleaned and not PHONE_CHECK.fullmatch(cleaned['phone']):
+            errors['phone'] = ['Invalid phone number']
+        return cleaned, errors
+
+
+class GradebookExportForm(forms.Form):
+    group = forms.IntegerField(required=False, min_value=1)
+    teacher = forms.IntegerField(required=False, min_value=1)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+
+
+class LessonUploadForm(forms.Form):
+    """Validates the start of a chunked lesson file upload, see teacher.uploads."""
+    file_name = forms.CharField(max_length=255)
+    size = forms.IntegerField(min_value=1)
+    sha256 = forms.RegexField(regex=r'^[0-9a-fA-F]{64}$')
+    chunk_size = forms.IntegerField(required=False, min_value=256 * 1024, max_value=64 * 1024 * 1024)
+
+    def clean_size(self):
+        size = self.cleaned_data['size']
+        if size > get_max_size():
+            raise ValidationError(f'Files larger than {get_max_size()} bytes are not accepted.')
+        return size
@@ -0,0 +1,172 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Q, Window
+from django.db.models.functions import Rank
+
+from teacher.models import Group, GroupStats, Lesson, LessonStats, Score_Attendance, StudentStats
+
+
+TWO_PLACES = Decimal('0.01')
+
+# Aggregates shared by the lesson, student and group statistics
+TOTALS = {
+    'total': Count('id'),
+    'present': Count('id', filter=Q(is_present=True)),
+    'marked': Count('mark'),
+    'mark_avg': Avg('mark'),
+}
+
+
+def average(value):
+    return None if value is None else Decimal(str(value)).quantize(TWO_PLACES)
+
+
+def rate(part, total):
+    """Returns part / total as a percentage or None when there is nothing to count."""
+    if not total:
+        return None
+    return (Decimal(part) * 100 / total).quantize(TWO_PLACES)
+
+
+def group_marks(group_id):
+    """
+    Score_Attendance rows that count for the group: rows of its lessons for the students still enrolled.
+
+    :param group_id: int
+    :return: QuerySet of Score_Attendance
+    """
+    return Score_Attendance.objects.filter(lesson__group=group_id, student__group=group_id)
+
+
+def refresh_lesson_stats(group_id, lesson_ids=None):
+    """
+    Recomputes LessonStats of the group's lessons with one GROUP BY query and one upsert.
+
+    :param group_id: int
+    :param lesson_ids: list of lesson ids to refresh, every lesson of the group if None
+    """
+    rows = group_marks(group_id)
+    stale = LessonStats.objects.filter(lesson__group=group_id)
+    if lesson_ids is not None:
+        rows = rows.filter(lesson__in=lesson_ids)
+        stale = stale.filter(lesson__in=lesson_ids)
+
+    stats = [
+        LessonStats(
+            lesson_id=row['lesson_id'],
+            students=row['total'],
+            present=row['present'],
+            marked=row['marked'],
+            mark_avg=average(row['mark_avg']),
+            attendance_rate=rate(row['present'], row['total']),
+        )
+        for row in rows.values('lesson_id').annotate(**TOTALS).order_by()
+    ]
+    LessonStats.objects.bulk_create(
+        stats, update_conflicts=True, unique_fields=['lesson'],
+        update_fields=['students', 'present', 'marked', 'mark_avg', 'attendance_rate', 'updated_at'],
+    )
+    stale.exclude(lesson__in=[stat.lesson_id for stat in stats]).delete()
+
+
+def refresh_group_stats(group_id):
+    """
+    Recomputes the StudentStats rows and the GroupStats row of the group.
+
+    The per-student totals and the rank inside the group come from one query: the marks are
+    grouped by student and ranked with RANK() OVER (ORDER BY AVG(mark) DESC), students without
+    any mark are not ranked. The group totals are one more aggregate over the same rows.
+
+    :param group_id: int
+    """
+    rows = (
+        group_marks(group_id)
+        .values('student_id')
+        .annotate(**TOTALS)
+        .annotate(rank=Window(Rank(), order_by=F('mark_avg').desc(nulls_last=True)))
+        .order_by()
+    )
+    stats = [
+        StudentStats(
+            student_id=row['student_id'],
+            group_id=group_id,
+            lessons=row['total'],
+            present=row['present'],
+            marked=row['marked'],
+            mark_avg=average(row['mark_avg']),
+            attendance_rate=rate(row['present'], row['total']),
+            rank=row['rank'] if row['mark_avg'] is not None else None,
+        )
+        for row in rows
+    ]
+    StudentStats.objects.bulk_create(
+        stats, update_conflicts=True, unique_fields=['student', 'group'],
+        update_fields=['lessons', 'present', 'marked', 'mark_avg', 'attendance_rate', 'rank', 'updated_at'],
+    )
+    StudentStats.objects.filter(group=group_id).exclude(student__in=[stat.student_id for stat in stats]).delete()
+
+    totals = group_marks(group_id).aggregate(
+        **TOTALS,
+        students=Count('student', distinct=True),
+        lessons=Count('lesson', distinct=True),
+    )
+    GroupStats.objects.update_or_create(group_id=group_id, defaults={
+        'students': totals['students'],
+        'lessons': totals['lessons'],
+        'mark_avg': average(totals['mark_avg']),
+        'attendance_rate': rate(totals['present'], totals['total']),
+    })
+
+
+def refresh_lesson(lesson):
+    """
+    Brings the statistics up to date after the attendance sheet of one lesson was saved.
+
+    Only that lesson's LessonStats is recomputed, the student and group statistics of its group
+    are recomputed as a whole because one mark can move every rank of the group.
+    The number of queries does not depend on the size of the group.
+
+    :param lesson: Lesson object
+    """
+    if lesson.group_id is None:
+        return
+    with transaction.atomic():
+        refresh_lesson_stats(lesson.group_id, [lesson.id])
+        refresh_group_stats(lesson.group_id)
+
+
+def refresh_lessons(lesson_ids):
+    """
+    Same as refresh_lesson for many lessons at once, each affected group is refreshed once.
+
+    :param lesson_ids: iterable of lesson ids
+    """
+    by_group = {}
+    for lesson_id, group_id in Lesson.objects.filter(id__in=set(lesson_ids), group__isnull=False).values_list('id', 'group_id'):
+        by_group.setdefault(group_id, []).append(lesson_id)
+    with transaction.atomic():
+        for group_id, ids in by_group.items():
+            refresh_lesson_stats(group_id, ids)
+            refresh_group_stats(group_id)
+
+
+def rebuild_gradebook(group_ids=None):
+    """
+    Recomputes every statistic of the given groups, used by the refresh_gradebook command and
+    by teacher/signals.py after enrollments change and lessons or students are deleted.
+    Groups that no longer exist are skipped.
+
+    :param group_ids: iterable of group ids, every group if None
+    :return: int, number of refreshed groups
+    """
+    groups = Group.objects.order_by('id').values_list('id', flat=True)
+    if group_ids is not None:
+        groups = groups.filter(id__in=group_ids)
+    count = 0
+    for group_id in groups:
+        with transaction.atomic():
+            refresh_lesson_stats(group_id)
+            refresh_group_stats(group_id)
+        count += 1
+    return count
@@ -0,0 +1,182 @@
+import csv
+import io
+import os
+
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from teacher.caching import invalidate_model
+from teacher.forms import StudentImportForm
+from teacher.models import Group, Student
+from teacher.search import index_model
+
+
+COLUMNS = ("first_name", "last_name", "surname", "email", "phone", "address", "education", "gender", "birthday", "group")
+GENDERS = {'1': '1', '2': '2', 'male': '1', 'female': '2', 'm': '1', 'f': '2'}
+
+
+def read_csv(file):
+    """
+    Yields the rows of a CSV file as dicts, one at a time.
+
+    :param file: binary file object
+    """
+    reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [name.strip().lower() for name in header]
+    for row in reader:
+        yield dict(zip(header, row))
+
+
+def read_xlsx(file):
+    """
+    Yields the rows of the first sheet of an XLSX file as dicts, one at a time.
+
+    openpyxl is only needed for XLSX files, so it is imported here.
+
+    :param file: binary file object or path
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('Reading XLSX files needs openpyxl, install it or upload a CSV file')
+
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except Exception as error:
+        raise ValueError(f'Could not read the XLSX file: {error}')
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(name or '').strip().lower() for name in header]
+        for row in rows:
+            yield dict(zip(header, ('' if value is None else value for value in row)))
+    finally:
+        workbook.close()
+
+
+def read_rows(file, file_name):
+    """Picks the reader from the file extension."""
+    if os.path.splitext(file_name)[1].lower() == '.xlsx':
+        return read_xlsx(file)
+    return read_csv(file)
+
+
+def group_map():
+    """
+    Loads every group once, keyed by course code and by course name.
+
+    Course names shared by several groups are left out, those rows have to use the course code.
+
+    :return: dict of lowercased name -> group id
+    """
+    by_code = {}
+    by_name = {}
+    for group_id, code, name in Group.objects.values_list('id', 'course_code', 'name__name'):
+        if code:
+            by_code[code.strip().lower()] = group_id
+        if name:
+            key = name.strip().lower()
+            by_name[key] = None if key in by_name else group_id
+    groups = {name: group_id for name, group_id in by_name.items() if group_id is not None}
+    groups.update(by_code)
+    return groups
+
+
+class StudentImporter:
+    """
+    Validates and inserts students from an iterable of row dicts.
+
+    Valid rows are buffered up to chunk_size, then written with one bulk_create for the students
+    and one bulk_create for the group memberships, so memory stays bounded by the chunk size.
+    Invalid rows are skipped and collected in errors as (row number, message). So are rows whose
+    email was already imported, earlier in the file or before, an import run twice adds nobody twice.
+    """
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+        self.groups = group_map()
+        self.created = 0
+        self.errors = []
+        self.pending = []
+        self.emails = set()
+
+    def run(self, rows):
+        # Row 1 is the header
+        for number, row in enumerate(rows, start=2):
+            self.add(number, row)
+        self.flush()
+        return self
+
+    def add(self, number, row):
+        values = {name: str(row.get(name, '')).strip() for name in COLUMNS}
+        if not any(values.values()):
+            return
+        values['gender'] = GENDERS.get(values['gender'].lower(), values['gender'])
+        if ' ' in values['birthday']:
+            # XLSX dates come as datetimes
+            values['birthday'] = values['birthday'].split(' ')[0]
+
+        group_ids = []
+        for name in filter(None, (name.strip().lower() for name in values.pop('group').replace(',', ';').split(';'))):
+            group_id = self.groups.get(name)
+            if group_id is None:
+                self.errors.append((number, f'Unknown group "{name}"'))
+                return
+            group_ids.append(group_id)
+
+        cleaned, errors = StudentImportForm.clean_row(values)
+        if errors:
+            self.errors.append((number, '; '.join(f'{field}: {" ".join(messages)}' for field, messages in errors.items())))
+            return
+
+        email = cleaned['email'].lower()
+        if email in self.emails:
+            self.errors.append((number, f'email: {cleaned["email"]} is already in the file'))
+            return
+        self.emails.add(email)
+
+        self.pending.append((number, Student(**cleaned), group_ids))
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        existing = set(
+            Student.objects.annotate(lower_email=Lower('email'))
+            .filter(lower_email__in=[student.email.lower() for _, student, _ in pending])
+            .values_list('lower_email', flat=True)
+        )
+        if existing:
+            for number, student, _ in pending:
+                if student.email.lower() in existing:
+                    self.errors.append((number, f'email: a student with {student.email} already exists'))
+            # Keep the report in row order, the rows above were only checked now
+            self.errors.sort()
+            pending = [entry for entry in pending if entry[1].email.lower() not in existing]
+            if not pending:
+                return
+        Membership = Student.group.through
+        with transaction.atomic():
+            students = Student.objects.bulk_create(student for _, student, _ in pending)
+            Membership.objects.bulk_create(
+                Membership(student_id=student.id, group_id=group_id)
+                for student, (_, _, group_ids) in zip(students, pending)
+                for group_id in set(group_ids)
+            )
+        # bulk_create sends no signals
+        invalidate_model(Student)
+        index_model(Student, [student.id for student in students])
+        self.created += len(students)
+
+    def write_errors(self, file):
+        """Writes the per-row error report as CSV."""
+        writer = csv.writer(file)
+        writer.writerow(['row', 'error'])
+        writer.writerows(self.errors)
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from teacher.benchmark import SIZES, THRESHOLD, compare, load, run_benchmark, save
+
+
+class Command(BaseCommand):
+    help = (
+        "Requests every route against seeded schools of several sizes and records latency percentiles, "
+        "SQL queries, SQL time and response sizes, optionally comparing them with a saved baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=list(SIZES), action='append', help='Dataset, can be repeated, small and medium by default')
+        parser.add_argument('--repeat', type=int, default=10, help='Measured requests per route, 10 by default')
+        parser.add_argument('--route', action='append', help='Only the routes whose label contains this, can be repeated')
+        parser.add_argument('--output', default='benchmark.json', help='JSON file the results are written to, benchmark.json by default')
+        parser.add_argument('--baseline', help='JSON file of an earlier run, regressions make the command fail')
+        parser.add_argument('--threshold', type=float, default=THRESHOLD, help=f'Allowed relative slowdown and growth, {THRESHOLD} by default')
+        parser.add_argument('--cached', action='store_true', help='Keep the configured cache instead of measuring uncached pages')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        baseline = load(options['baseline']) if options['baseline'] else None
+        results = run_benchmark(
+            sizes=options['size'] or ('small', 'medium'), repeat=options['repeat'], only=options['route'],
+            cached=options['cached'], log=self.stdout.write,
+        )
+        save(results, options['output'])
+        if results['uncovered']:
+            self.stdout.write(self.style.WARNING(f'Routes without a benchmark: {", ".join(results["uncovered"])}'))
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
@@ -0,0 +1,42 @@
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Every scenario starts a fresh interpreter, like a worker that boots and loads the forms
+SETUP = 'import os, time; os.environ.setdefault("DJANGO_SETTINGS_MODULE", "{settings}"); import django; django.setup(); start = time.perf_counter(); '
+SCENARIOS = {
+    'forms': 'import teacher.forms, education.forms',
+    # What every worker paid while the forms built a Faker instance at import time
+    'forms + Faker()': 'import teacher.forms, education.forms; from faker import Faker; Faker()',
+}
+REPORT = '; import sys; print((time.perf_counter() - start) * 1000, "faker" in sys.modules)'
+
+
+class Command(BaseCommand):
+    help = "Measures how long a fresh process takes to import the forms, with and without building Faker"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per scenario, 5 by default')
+
+    def measure(self, code, runs):
+        times = []
+        loaded = False
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, '-c', SETUP.format(settings=settings.SETTINGS_MODULE) + code + REPORT],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.split()
+            times.append(float(output[0]))
+            loaded = output[1] == 'True'
+        return statistics.median(times), loaded
+
+    def handle(self, *args, **options):
+        results = {name: self.measure(code, options['runs']) for name, code in SCENARIOS.items()}
+        for name, (median, loaded) in results.items():
+            self.stdout.write(f'{name:<18} {median:8.1f} ms median  faker imported: {"yes" if loaded else "no"}')
+        saved = results['forms + Faker()'][0] - results['forms'][0]
+        self.stdout.write(self.style.SUCCESS(f'Import time saved per process: {saved:.1f} ms'))
@@ -0,0 +1,34 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from teacher.exporting import filter_groups, gradebook_rows
+from teacher.forms import GradebookExportForm
+
+
+class Command(BaseCommand):
+    help = "Writes the gradebooks (students x lessons with marks and presence) of the selected groups as CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', help='Group id')
+        parser.add_argument('--teacher', help='Teacher id')
+        parser.add_argument('--from', dest='date_from', help='First lesson date, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', help='Last lesson date, YYYY-MM-DD')
+        parser.add_argument('--output', help='CSV file to write, stdout by default')
+
+    def handle(self, *args, **options):
+        form = GradebookExportForm({key: options[key] for key in ('group', 'teacher', 'date_from', 'date_to') if options[key]})
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        rows = gradebook_rows(
+            filter_groups(form.cleaned_data['group'], form.cleaned_data['teacher']),
+            form.cleaned_data['date_from'],
+            form.cleaned_data['date_to'],
+        )
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as file:
+                csv.writer(file).writerows(rows)
+        else:
+            csv.writer(sys.stdout).writerows(rows)
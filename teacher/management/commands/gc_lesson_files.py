@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from teacher.models import LessonFiles
+from teacher.storage import BLOB_DIR, collect_garbage, convert_to_blob
+
+
+class Command(BaseCommand):
+    help = "Deletes lesson file blobs nothing refers to any more, with --convert first moves older lesson files into blobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true', help='Deduplicate the files stored before the content addressed storage')
+
+    def handle(self, *args, **options):
+        if options['convert']:
+            lesson_files = LessonFiles.objects.exclude(file='').exclude(file__isnull=True).exclude(file__startswith=f'{BLOB_DIR}/')
+            converted = sum(convert_to_blob(lesson_file) for lesson_file in lesson_files.iterator())
+            self.stdout.write(f'Converted {converted} lesson files')
+        count = collect_garbage()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} unreferenced blobs'))
@@ -0,0 +1,29 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from teacher.importing import StudentImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Imports students from a CSV or XLSX file with the columns first_name, last_name, surname, email, phone, address, education, gender, birthday, group"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows inserted per bulk_create')
+        parser.add_argument('--errors', help='Write the per-row error report to this CSV file instead of stdout')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as file:
+                importer = StudentImporter(chunk_size=options['chunk_size']).run(read_rows(file, options['path']))
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        if importer.errors:
+            if options['errors']:
+                with open(options['errors'], 'w', newline='', encoding='utf-8') as report:
+                    importer.write_errors(report)
+            else:
+                importer.write_errors(sys.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Imported {importer.created} students, {len(importer.errors)} rows rejected'))
@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from teacher.uploads import EXPIRY, purge_uploads
+
+
+class Command(BaseCommand):
+    help = "Deletes the chunked lesson file uploads that were not finished and received no chunk for a while"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=int(EXPIRY.total_seconds() // 3600), help='Idle time after which an upload is abandoned, 24 by default')
+
+    def handle(self, *args, **options):
+        count = purge_uploads(timezone.now() - timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Deleted {count} abandoned uploads'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from teacher.search import KINDS, is_available, rebuild
+
+
+class Command(BaseCommand):
+    help = "Builds the full-text search index of students, professors, courses and lessons from scratch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=list(KINDS), action='append', help='Kind to rebuild, can be repeated, every kind by default')
+
+    def handle(self, *args, **options):
+        if not is_available():
+            raise CommandError('The full-text index needs SQLite with FTS5')
+        count = rebuild(*(options['kind'] or ()))
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} documents'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from teacher.gradebook import rebuild_gradebook
+
+
+class Command(BaseCommand):
+    help = "Recomputes the precomputed gradebook statistics (averages, attendance rates and ranks) of the groups"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, action='append', help='Group id, can be repeated, every group by default')
+
+    def handle(self, *args, **options):
+        count = rebuild_gradebook(options['group'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed the statistics of {count} groups'))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from teacher.seeding import SchoolSeeder
+
+
+class Command(BaseCommand):
+    help = "Fills the database with a synthetic school: departments, teachers, groups, students, lessons and attendance"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000, help='1000 by default')
+        parser.add_argument('--groups', type=int, default=20, help='20 by default')
+        parser.add_argument('--lessons-per-group', type=int, default=40, help='40 by default')
+        parser.add_argument('--teachers', type=int, help='A quarter of the groups by default')
+        parser.add_argument('--departments', type=int, default=16, help='16 by default')
+        parser.add_argument('--seed', type=int, default=0, help='The same seed gives the same school, 0 by default')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows inserted per bulk_create, 5000 by default')
+        parser.add_argument('--password', default='password', help='Password of every seeded teacher')
+
+    def handle(self, *args, **options):
+        if options['groups'] < 1 or options['students'] < 0 or options['lessons_per_group'] < 0:
+            raise CommandError('--groups must be at least 1, --students and --lessons-per-group not negative')
+        started = time.monotonic()
+        seeder = SchoolSeeder(
+            students=options['students'], groups=options['groups'], lessons_per_group=options['lessons_per_group'],
+            teachers=options['teachers'], departments=options['departments'], seed=options['seed'],
+            batch_size=options['batch_size'], password=options['password'],
+            log=lambda message: self.stdout.write(f'{time.monotonic() - started:7.1f}s  {message}'),
+        ).run()
+        created = ', '.join(f'{count} {name}' for name, count in seeder.created.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {created} in {time.monotonic() - started:.0f}s'))
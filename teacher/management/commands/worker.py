@@ -0,0 +1,29 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from teacher.models import Task
+from teacher.tasks import run_pending, work
+
+
+class Command(BaseCommand):
+    help = "Runs the background tasks of the database task queue, several workers can run side by side"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the tasks that are due now and exit')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty, 1 by default')
+        parser.add_argument('--batch', type=int, default=100, help='Tasks taken at a time, 100 by default')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            succeeded, failed = run_pending(options['batch'])
+            self.stdout.write(self.style.SUCCESS(f'Ran {succeeded} tasks, {failed} failed'))
+            return
+
+        stopping = []
+        # Finish the current task on Ctrl+C or a deploy's SIGTERM, a killed task would wait for its lease
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stopping.append(True))
+        self.stdout.write(f'Worker started, {Task.objects.filter(status=Task.PENDING).count()} tasks pending')
+        work(options['sleep'], options['batch'], stop=lambda: bool(stopping))
+        self.stdout.write('Worker stopped')
@@ -0,0 +1,167 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from teacher.models import LessonFiles
+
+
+CHUNK_SIZE = 64 * 1024
+
+# Names with a content or variant hash never change, like the thumbnails "a.1f2e3d4c5b6a.webp"
+# and the lesson file blobs "lessons/blobs/9f/9f86d0...0a08.pdf"
+HASHED_NAME = re.compile(r'[./][0-9a-f]{12,64}\.[A-Za-z0-9]+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def media_name(path):
+    """
+    Checks the path of a media URL, only the plain spelling of a name is served.
+
+    "./", "../" or "//" would reach a lesson file under a name can_read does not take for one,
+    so the access check and the file sent must both work on the name returned here.
+
+    :param path: str, path under MEDIA_ROOT from the URL
+    :return: str, the name
+    :raises Http404: if a segment is empty, "." or ".."
+    """
+    if '\\' in path or any(segment in ('', '.', '..') for segment in path.split('/')):
+        raise Http404('Not found')
+    return path
+
+
+def media_path(name):
+    """
+    Absolute path of a file under MEDIA_ROOT.
+
+    :raises Http404: if the name leaves MEDIA_ROOT or the file does not exist
+    """
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+    if not os.path.isfile(path):
+        raise Http404('Not found')
+    return path
+
+
+def can_read(user, name):
+    """Lesson files are only readable by the users who see their lesson, photos by every signed in user."""
+    if name.startswith('lessons/'):
+        return LessonFiles.objects.visible_to(user).filter(file=name).exists()
+    return True
+
+
+def parse_range(header, size):
+    """
+    Parses a single byte range of the Range header.
+
+    Several ranges in one header are answered with the whole file, which RFC 9110 allows.
+
+    :param header: str or None
+    :param size: int, file size
+    :return: (start, end) with end inclusive, None to send the whole file or False if unsatisfiable
+    """
+    match = RANGE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+        if start > end:
+            return False if start >= size else None
+        return start, end
+    # bytes=-500 is the last 500 bytes
+    length = int(end)
+    if length == 0:
+        return False
+    return max(size - length, 0), size - 1
+
+
+def if_range_passes(request, etag, last_modified):
+    """A Range is only honoured if If-Range, when sent, still names the current file."""
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def read_range(path, start, length):
+    """Yields length bytes of the file from start, CHUNK_SIZE at a time."""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def set_cache_headers(response, name, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    # private: the files need a login, so shared caches must not keep them
+    if HASHED_NAME.search(name):
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def serve(request, name):
+    """
+    Sends a file of MEDIA_ROOT with conditional GET and byte range support.
+
+    With MEDIA_SENDFILE set to 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd)
+    only the headers are built here and the front proxy sends the file itself.
+
+    :param request: Request object
+    :param name: str, path relative to MEDIA_ROOT
+    :return: HttpResponse object
+    """
+    path = media_path(name)
+    stat = os.stat(path)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return set_cache_headers(not_modified, name, etag, last_modified)
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    mode = getattr(settings, 'MEDIA_SENDFILE', None)
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/') + quote(name)
+        return set_cache_headers(response, name, etag, last_modified)
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return set_cache_headers(response, name, etag, last_modified)
+
+    byte_range = parse_range(request.headers.get('Range'), stat.st_size) if if_range_passes(request, etag, last_modified) else None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        return set_cache_headers(response, name, etag, last_modified)
+
+    start, end = byte_range
+    response = StreamingHttpResponse(read_range(path, start, end - start + 1), status=206, content_type=content_type)
+    response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response['Content-Length'] = str(end - start + 1)
+    return set_cache_headers(response, name, etag, last_modified)
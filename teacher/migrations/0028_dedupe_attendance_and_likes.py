@@ -0,0 +1,54 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def dedupe_attendance(apps, schema_editor):
+    """Keeps the most recently updated Score_Attendance row of every (lesson, student) pair."""
+    Score_Attendance = apps.get_model('teacher', 'Score_Attendance')
+    duplicates = (
+        Score_Attendance.objects
+        .filter(lesson__isnull=False, student__isnull=False)
+        .values('lesson_id', 'student_id')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        ids = list(
+            Score_Attendance.objects
+            .filter(lesson_id=duplicate['lesson_id'], student_id=duplicate['student_id'])
+            .order_by('-updated_at', '-id')
+            .values_list('id', flat=True)
+        )
+        Score_Attendance.objects.filter(id__in=ids[1:]).delete()
+
+
+def dedupe_likes(apps, schema_editor):
+    """Keeps the first GroupLikes row of every (group, user) pair."""
+    GroupLikes = apps.get_model('teacher', 'GroupLikes')
+    duplicates = (
+        GroupLikes.objects
+        .filter(group__isnull=False, user_id__isnull=False)
+        .values('group_id', 'user_id_id')
+        .annotate(rows=Count('id'))
+        .filter(rows__gt=1)
+    )
+    for duplicate in duplicates:
+        ids = list(
+            GroupLikes.objects
+            .filter(group_id=duplicate['group_id'], user_id_id=duplicate['user_id_id'])
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        GroupLikes.objects.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teacher', '0027_alter_grouplikes_user_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_attendance, migrations.RunPython.noop),
+        migrations.RunPython(dedupe_likes, migrations.RunPython.noop),
+    ]
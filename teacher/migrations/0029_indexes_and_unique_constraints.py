@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teacher', '0028_dedupe_attendance_and_likes'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='grouplikes',
+            options={'verbose_name_plural': 'Group Likes'},
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['group', 'date'], name='lesson_group_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['-created_at'], name='student_created_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='grouplikes',
+            constraint=models.UniqueConstraint(fields=('group', 'user_id'), name='unique_group_like'),
+        ),
+        migrations.AddConstraint(
+            model_name='score_attendance',
+            constraint=models.UniqueConstraint(fields=('lesson', 'student'), name='unique_attendance_lesson_student'),
+        ),
+    ]
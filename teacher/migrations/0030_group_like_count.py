@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_like_count(apps, schema_editor):
+    Group = apps.get_model('teacher', 'Group')
+    GroupLikes = apps.get_model('teacher', 'GroupLikes')
+    likes = (
+        GroupLikes.objects
+        .filter(group=OuterRef('pk'))
+        .values('group')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Group.objects.update(like_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teacher', '0029_indexes_and_unique_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_like_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teacher', '0030_group_like_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='teacher.group')),
+                ('students', models.PositiveIntegerField(default=0)),
+                ('lessons', models.PositiveIntegerField(default=0)),
+                ('mark_avg', models.DecimalField(blank=True, decimal_places=2, max_digits=4, null=True)),
+                ('attendance_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Group Stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='LessonStats',
+            fields=[
+                ('lesson', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='teacher.lesson')),
+                ('students', models.PositiveIntegerField(default=0)),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('marked', models.PositiveIntegerField(default=0)),
+                ('mark_avg', models.DecimalField(blank=True, decimal_places=2, max_digits=4, null=True)),
+                ('attendance_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Lesson Stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lessons', models.PositiveIntegerField(default=0)),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('marked', models.PositiveIntegerField(default=0)),
+                ('mark_avg', models.DecimalField(blank=True, decimal_places=2, max_digits=4, null=True)),
+                ('attendance_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('rank', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_stats', to='teacher.group')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='teacher.student')),
+            ],
+            options={
+                'verbose_name_plural': 'Student Stats',
+                'indexes': [models.Index(fields=['group', 'rank'], name='student_stats_rank_idx')],
+                'constraints': [models.UniqueConstraint(fields=('student', 'group'), name='unique_student_stats')],
+            },
+        ),
+    ]
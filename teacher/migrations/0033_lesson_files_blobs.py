@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:07
+
+import os
+
+import teacher.models
+import teacher.storage
+from django.db import migrations, models
+
+
+def fill_name(apps, schema_editor):
+    LessonFiles = apps.get_model('teacher', 'LessonFiles')
+    lesson_files = LessonFiles.objects.exclude(file='').exclude(file__isnull=True).only('file')
+    LessonFiles.objects.bulk_update([
+        LessonFiles(id=lesson_file.id, name=os.path.basename(lesson_file.file.name)) for lesson_file in lesson_files
+    ], ['name'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teacher', '0032_lesson_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonfiles',
+            name='name',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='lessonfiles',
+            name='file',
+            field=models.FileField(blank=True, db_index=True, null=True, storage=teacher.storage.get_lesson_files_storage, upload_to=teacher.models.lesson_file_upload_path),
+        ),
+        migrations.RunPython(fill_name, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:40
+
+from django.db import migrations
+
+
+DIGITS = "replace(replace(replace(replace(replace(coalesce({0}, ''), ' ', ''), '-', ''), '+', ''), '(', ''), ')', '')"
+
+# The documents as teacher/search.py builds them at the time of this migration
+DOCUMENTS = [
+    "SELECT s.id * 4 + 0, 'student', s.id, s.first_name || ' ' || s.last_name || ' ' || coalesce(s.surname, ''), "
+    f"s.email || ' ' || s.phone || ' ' || {DIGITS.format('s.phone')} FROM teacher_student s",
+    "SELECT t.id * 4 + 1, 'professor', t.id, t.first_name || ' ' || t.last_name, "
+    f"t.email || ' ' || coalesce(t.phone, '') || ' ' || {DIGITS.format('t.phone')} || ' ' || coalesce(t.education, '') FROM teacher_teacher t",
+    "SELECT g.id * 4 + 2, 'course', g.id, coalesce(gs.name, '') || ' ' || coalesce(g.course_code, ''), g.description "
+    "FROM teacher_group g LEFT JOIN teacher_groupspec gs ON gs.id = g.name_id",
+    "SELECT l.id * 4 + 3, 'lesson', l.id, l.theme, l.description || ' ' || coalesce(gs.name, '') || ' ' || coalesce(g.course_code, '') "
+    "FROM teacher_lesson l LEFT JOIN teacher_group g ON g.id = l.group_id LEFT JOIN teacher_groupspec gs ON gs.id = g.name_id",
+]
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    # Prefix indexes make "ali*" as fast as a whole word, titles weigh ten times the body in bm25
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE teacher_search USING fts5("
+        "kind UNINDEXED, object_id UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+    )
+    schema_editor.execute("INSERT INTO teacher_search (teacher_search, rank) VALUES ('rank', 'bm25(0.0, 0.0, 10.0, 1.0)')")
+    for select in DOCUMENTS:
+        schema_editor.execute(f'INSERT INTO teacher_search (rowid, kind, object_id, title, body) {select}')
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS teacher_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teacher', '0034_task_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,15 +1,51 @@
 import os
+import uuid
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
 from django.db import models
 from django.contrib.auth.models import PermissionsMixin
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from teacher.storage import get_lesson_files_storage
+
 
 
 # Create your models here.
 
 
-class TeacherManager(BaseUserManager):
+def is_scoped_to_own_groups(user):
+    """Users with the Teacher role only see the groups they teach, managers and admins see everything."""
+    # teacher.roles imports the auth backends, which need the user model loaded first
+    from teacher.roles import get_roles
+    return get_roles(user).is_teacher
+
+
+class VisibleToQuerySet(models.QuerySet):
+    """
+    Adds visible_to(user): the rows of the groups a teacher teaches, every row for the other users.
+
+    teacher_lookup is the path from the model to Group.teacher, the filter is on the teacher id
+    so it uses the foreign key indexes.
+    """
+    teacher_lookup = None
+
+    def visible_to(self, user):
+        if not user.is_authenticated:
+            return self.none()
+        if not is_scoped_to_own_groups(user):
+            return self
+        return self.scope_to_teacher(user.pk)
+
+    def scope_to_teacher(self, teacher_id):
+        return self.filter(**{self.teacher_lookup: teacher_id})
+
+
+class TeacherQuerySet(models.QuerySet):
+    def for_list(self):
+        """Teachers with everything all-professors.html touches per row."""
+        return self.select_related('department')
+
+
+class TeacherManager(BaseUserManager.from_queryset(TeacherQuerySet)):
 
     def create_user(self, first_name, last_name, email, phone=None, address=None, password=None, gender=None, department=None, date_of_birth=None, education=None, date_joined=None):
         if not email:
@@ -95,16 +131,6 @@ class Teacher(AbstractBaseUser, PermissionsMixin):
     def __str__(self) -> str:
         return f'{self.first_name} {self.last_name}'
 
-    def delete(self, using =None, keep_parents =False):
-        if self.profile_photo.delete():
-            path = self.profile_photo.path
-            print('delete   -------------------------------------------')
-            print(path)
-            print('delete   -------------------------------------------')
-            if path:
-                os.remove(path)
-        return super().delete(using, keep_parents)
-
     # class Meta:
     #     permissions = [
     #         ('add_professor', 'Can add a professor'),
@@ -128,6 +154,14 @@ class GroupSpec(models.Model):
         return f'{self.name}'
 
 
+class GroupQuerySet(VisibleToQuerySet):
+    teacher_lookup = 'teacher'
+
+    def for_list(self):
+        """Groups with the course name and the teacher already joined for the course cards."""
+        return self.select_related('name', 'teacher')
+
+
 LANG_CHOICES = (
     ("1", "UZ"),
     ("2", "RU"),
@@ -148,21 +182,17 @@ class Group(models.Model):
     contact_number = models.CharField(max_length=100, null=True)
     lang = models.CharField(max_length=20, choices=LANG_CHOICES, null=True)
     group_photo = models.ImageField(upload_to='courses/course_photo/%Y/%m', null=True, blank=True)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateField(auto_now_add=True)
 
+    objects = GroupQuerySet.as_manager()
+
     def f_price(self):
         return f'{self.price:,}'
 
     def __str__(self):
         return f'{self.name}. Language: {self.get_lang_display()}'
 
-    def delete(self, using =None, keep_parents =False):
-        if self.group_photo:
-            path = self.group_photo.path
-            if path:
-                os.remove(path)
-        return super().delete(using, keep_parents)
-
 
 class ReadMore(models.Model):
     language = models.CharField(max_length=50, null=True, blank=True)
@@ -185,6 +215,19 @@ class ReadMore(models.Model):
         end = full[-1]
         return start, mid, end
 
+class StudentQuerySet(VisibleToQuerySet):
+    def for_list(self):
+        """Students with their groups, and the course name and teacher of every group, prefetched."""
+        return self.prefetch_related(
+            models.Prefetch('group', queryset=Group.objects.for_list())
+        )
+
+    def scope_to_teacher(self, teacher_id):
+        # EXISTS instead of a join on the memberships, a student in two of the teacher's groups is listed once
+        memberships = Student.group.through.objects.filter(student=models.OuterRef('pk'), group__teacher=teacher_id)
+        return self.filter(models.Exists(memberships))
+
+
 class Student(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -198,15 +241,17 @@ class Student(models.Model):
     gender = models.CharField(max_length=20, null=True, blank=False, choices=GENDER_CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
     birthday = models.DateField(null=True) 
+
+    objects = StudentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at'], name='student_created_at_idx'),
+        ]
+
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
 
-    def delete(self, using=None, keep_parents=False):
-        if self.profile_photo:
-            path = self.profile_photo.path
-            os.remove(path)
-        return super().delete(using, keep_parents)
-
 
 def lesson_file_upload_path(instance, file_name):
     if instance.lesson.group.name.name:
@@ -216,21 +261,50 @@ def lesson_file_upload_path(instance, file_name):
         return f"lessons/{group_name}/{file_name}"
     
 
+class LessonQuerySet(VisibleToQuerySet):
+    teacher_lookup = 'group__teacher'
+
+    def for_list(self):
+        """Lessons with the group and its course name joined for the lesson tables."""
+        return self.select_related('group__name')
+
+
 class Lesson(models.Model):
     theme = models.CharField(max_length=255)
     date = models.DateField()
     description = models.CharField(max_length=255)
     group = models.ForeignKey(Group, on_delete=models.SET_DEFAULT, default=None, null=True, blank=True)
 
+    objects = LessonQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['group', 'date'], name='lesson_group_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.theme}"
 
+class LessonFilesQuerySet(VisibleToQuerySet):
+    teacher_lookup = 'lesson__group__teacher'
+
+
 class LessonFiles(models.Model):
-    file = models.FileField(null=True, blank=True, upload_to=lesson_file_upload_path)
+    # Content addressed: rows with equal content share one blob, the rows are its references
+    file = models.FileField(null=True, blank=True, upload_to=lesson_file_upload_path, storage=get_lesson_files_storage, db_index=True)
+    # Name of the file as it was uploaded, the blob is named after its content
+    name = models.CharField(max_length=255, blank=True)
     lesson = models.ForeignKey(Lesson, on_delete=models.SET_DEFAULT, default=None, null=True, blank=True)
 
+    objects = LessonFilesQuerySet.as_manager()
+
     def __str__(self):
-        return f'{self.file.name}'
+        return self.name or f'{self.file.name}'
+
+    def save(self, *args, **kwargs):
+        if self.file and not self.file._committed:
+            self.name = os.path.basename(self.file.name)
+        return super().save(*args, **kwargs)
     
     # def delete(self, using =None, keep_parents =False):
     #     if self.file:
@@ -243,6 +317,40 @@ class LessonFiles(models.Model):
         verbose_name_plural = "LessonFiles"
 
 
+class LessonUpload(models.Model):
+    """A chunked lesson file upload that is not finished yet, see teacher.uploads."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
+    user = models.ForeignKey(Teacher, on_delete=models.CASCADE)
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    # Numbers of the chunks written so far
+    received = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.file_name} ({len(self.received)}/{self.chunk_count} chunks)'
+
+    @property
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size)
+
+    def chunk_length(self, number):
+        """Bytes chunk number must have, the last chunk is shorter."""
+        return min(self.chunk_size, self.size - number * self.chunk_size)
+
+    @property
+    def missing(self):
+        return sorted(set(range(self.chunk_count)) - set(self.received))
+
+
+class Score_AttendanceQuerySet(VisibleToQuerySet):
+    teacher_lookup = 'lesson__group__teacher'
+
+
 class Score_Attendance(models.Model):
     student = models.ForeignKey(Student, on_delete=models.SET_DEFAULT, default=None, blank=True, null=True)
     lesson = models.ForeignKey(Lesson, on_delete=models.SET_DEFAULT, default=None, null=True, blank=True)
@@ -251,6 +359,13 @@ class Score_Attendance(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_present = models.BooleanField(default=True)
 
+    objects = Score_AttendanceQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lesson', 'student'], name='unique_attendance_lesson_student'),
+        ]
+
     def __str__(self):
         return f'{self.student}'
 # class Attendance(models.Model):
@@ -264,5 +379,103 @@ class GroupLikes(models.Model):
 
     class Meta:
         verbose_name_plural = 'Group Likes'
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'user_id'], name='unique_group_like'),
+        ]
 
 
+
+
+class GroupStats(models.Model):
+    """Precomputed gradebook numbers of a whole group, kept up to date by teacher.gradebook."""
+    group = models.OneToOneField(Group, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    students = models.PositiveIntegerField(default=0)
+    lessons = models.PositiveIntegerField(default=0)
+    mark_avg = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True)
+    attendance_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Group Stats'
+
+    def __str__(self):
+        return f'{self.group_id}: {self.mark_avg} / {self.attendance_rate}%'
+
+
+class StudentStats(models.Model):
+    """Precomputed gradebook numbers of one student in one group, rank 1 is the best average of the group."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='stats')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='student_stats')
+    lessons = models.PositiveIntegerField(default=0)
+    present = models.PositiveIntegerField(default=0)
+    marked = models.PositiveIntegerField(default=0)
+    mark_avg = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True)
+    attendance_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    rank = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Student Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'group'], name='unique_student_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['group', 'rank'], name='student_stats_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.student_id} in {self.group_id}: {self.mark_avg} / {self.attendance_rate}%'
+
+
+class LessonStats(models.Model):
+    """Precomputed gradebook numbers of one lesson."""
+    lesson = models.OneToOneField(Lesson, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    students = models.PositiveIntegerField(default=0)
+    present = models.PositiveIntegerField(default=0)
+    marked = models.PositiveIntegerField(default=0)
+    mark_avg = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True)
+    attendance_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Lesson Stats'
+
+    def __str__(self):
+        return f'{self.lesson_id}: {self.mark_avg} / {self.attendance_rate}%'
+
+
+class Task(models.Model):
+    """A background job of the database task queue, see teacher.tasks. Finished tasks are deleted."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    # At most one pending task per key, enqueueing the same work again is a no-op
+    key = models.CharField(max_length=255, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    run_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    # A running task whose worker died is picked up again after this
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status='pending'), name='unique_pending_task_key'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status}, {self.attempts}/{self.max_attempts})'
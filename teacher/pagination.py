@@ -0,0 +1,169 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+def get_page_size(request):
+    """
+    Reads ?size= from the request and clamps it to LIST_MAX_PAGE_SIZE.
+
+    :param request: Request object
+    :return: int
+    """
+    default = getattr(settings, 'LIST_PAGE_SIZE', 20)
+    maximum = getattr(settings, 'LIST_MAX_PAGE_SIZE', 100)
+    try:
+        size = int(request.GET.get('size', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, maximum))
+
+
+def query_with(request, **params):
+    """Returns the current query string with params replaced, None values are dropped."""
+    query = request.GET.copy()
+    for key, value in params.items():
+        query.pop(key, None)
+        if value is not None:
+            query[key] = value
+    return query.urlencode()
+
+
+class Pager:
+    """What include/pager.html needs to render the previous / next controls."""
+
+    def __init__(self, object_list, previous_query=None, next_query=None, label=''):
+        self.object_list = object_list
+        self.previous_query = previous_query
+        self.next_query = next_query
+        self.label = label
+
+    @property
+    def has_previous(self):
+        return self.previous_query is not None
+
+    @property
+    def has_next(self):
+        return self.next_query is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate_offset(request, queryset):
+    """
+    Classic ?page= pagination for small tables.
+
+    :param request: Request object
+    :param queryset: ordered QuerySet
+    :return: Pager object
+    """
+    paginator = Paginator(queryset, get_page_size(request))
+    try:
+        page = paginator.page(request.GET.get('page', 1))
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+    return Pager(
+        list(page.object_list),
+        previous_query=query_with(request, page=page.previous_page_number()) if page.has_previous() else None,
+        next_query=query_with(request, page=page.next_page_number()) if page.has_next() else None,
+        label=f'{page.number} / {paginator.num_pages}',
+    )
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, field):
+    """Returns (key, id) from a cursor or None if it is malformed."""
+    try:
+        key, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return field.to_python(key), int(pk)
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def paginate_keyset(request, queryset, key):
+    """
+    Keyset (cursor) pagination on (key, id), newest first.
+
+    Every page is fetched with WHERE (key, id) < (cursor) ORDER BY key DESC, id DESC LIMIT size,
+    so the cost does not grow with the page number like OFFSET does.
+    The cursors are passed as ?after= and ?before=.
+
+    :param request: Request object
+    :param queryset: QuerySet to paginate, its ordering is replaced
+    :param key: str, name of the field to order by, id is used as the tie breaker
+    :return: Pager object
+    """
+    size = get_page_size(request)
+    field = queryset.model._meta.get_field(key)
+    after = decode_cursor(request.GET.get('after', ''), field) if request.GET.get('after') else None
+    before = decode_cursor(request.GET.get('before', ''), field) if request.GET.get('before') else None
+
+    if before:
+        value, pk = before
+        rows = list(
+            queryset.filter(Q(**{f'{key}__gt': value}) | Q(**{key: value, 'id__gt': pk}))
+            .order_by(key, 'id')[:size + 1]
+        )
+        has_more_before = len(rows) > size
+        rows = rows[:size][::-1]
+        has_more_after = True
+    else:
+        if after:
+            value, pk = after
+            queryset = queryset.filter(Q(**{f'{key}__lt': value}) | Q(**{key: value, 'id__lt': pk}))
+        rows = list(queryset.order_by(f'-{key}', '-id')[:size + 1])
+        has_more_after = len(rows) > size
+        rows = rows[:size]
+        has_more_before = after is not None
+
+    def cursor(row):
+        return encode_cursor([field.value_to_string(row), row.id])
+
+    return Pager(
+        rows,
+        previous_query=query_with(request, before=cursor(rows[0]), after=None) if rows and has_more_before else None,
+        next_query=query_with(request, after=cursor(rows[-1]), before=None) if rows and has_more_after else None,
+    )
+
+
+class CreatedCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the REST API, newest first.
+
+    No COUNT query is issued and the page size comes from REST_FRAMEWORK['PAGE_SIZE'],
+    clients may ask for up to max_page_size rows with ?size=.
+    """
+    ordering = ('-created_at', '-id')
+    # Model fields the cursor is built from, they must stay loaded when the queryset uses .only()
+    ordering_fields = ('created_at', 'id')
+    page_size_query_param = 'size'
+    max_page_size = 500
+
+
+class LessonCursorPagination(CreatedCursorPagination):
+    """Lessons have no created_at, they are paged by date."""
+    ordering = ('-date', '-id')
+    ordering_fields = ('date', 'id')
+
+
+class IdCursorPagination(CreatedCursorPagination):
+    ordering = '-id'
+    ordering_fields = ('id',)
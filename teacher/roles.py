@@ -0,0 +1,104 @@
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group as GroupType
+from django.utils.functional import SimpleLazyObject
+
+from teacher.caching import cached
+
+
+TEACHER = 'Teacher'
+
+
+class Roles:
+    """The role (auth group) names and the permission set of one user."""
+
+    def __init__(self, names=(), permissions=(), is_superuser=False):
+        self.names = frozenset(names)
+        self.permissions = frozenset(permissions)
+        self.is_superuser = is_superuser
+
+    def __contains__(self, name):
+        return name in self.names
+
+    @property
+    def is_teacher(self):
+        return TEACHER in self.names
+
+    def has_perm(self, perm):
+        return self.is_superuser or perm in self.permissions
+
+
+def load_roles(user):
+    """Reads the roles and permissions of the user from the database, two queries."""
+    return Roles(
+        names=user.groups.values_list('name', flat=True),
+        # A plain ModelBackend, the cached one below would come back here
+        permissions=ModelBackend().get_all_permissions(user),
+        is_superuser=user.is_superuser,
+    )
+
+
+def get_roles(user):
+    """
+    Returns the Roles of the user, loaded once and kept in the cache.
+
+    The cache key carries the permissions version, which teacher/signals.py bumps
+    whenever a user's groups, a user's or group's permissions or a user change,
+    so the next request after such a change loads the roles again. That holds for every process
+    only because they share the cache, see CACHES and the teacher.W001 check.
+
+    :param user: Teacher or AnonymousUser object
+    :return: Roles object
+    """
+    if not user.is_authenticated or not user.is_active:
+        return Roles()
+    # Kept on the user object for the rest of the request, like ModelBackend's _perm_cache
+    if not hasattr(user, '_roles_cache'):
+        user._roles_cache = cached('roles', ('permissions',), lambda: load_roles(user), user.pk)
+    return user._roles_cache
+
+
+def role_id(name):
+    """
+    Returns the id of the auth group of a role, kept in the cache.
+
+    :param name: str, role name like TEACHER
+    :return: int
+    :raises GroupType.DoesNotExist: if the role does not exist
+    """
+    return cached('role_id', ('permissions',), lambda: GroupType.objects.values_list('id', flat=True).get(name=name), name)
+
+
+class RolesMiddleware:
+    """Sets request.roles, it is only loaded when a view or template uses it."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.roles = SimpleLazyObject(lambda: get_roles(request.user))
+        return self.get_response(request)
+
+
+class CachedPermissionBackend(ModelBackend):
+    """
+    ModelBackend that takes the permission set from the cached Roles.
+
+    PermissionRequiredMixin and {{ perms }} then cost no queries once the roles are cached.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if user_obj.is_active and not user_obj.is_anonymous and obj is None and not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = set(get_roles(user_obj).permissions)
+        return super().get_all_permissions(user_obj, obj)
+
+
+class RolesMixin:
+    """Gives class based views the roles of the logged in user as self.roles and self.is_teacher."""
+
+    @property
+    def roles(self):
+        return self.request.roles
+
+    @property
+    def is_teacher(self):
+        return self.request.roles.is_teacher
@@ -1,12 +1,18 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from teacher.api_view import ProfessorAPIView, ProfessorViewset, ProfessorsAPIView
+from teacher.api_view import GroupViewset, LessonFilesViewset, LessonViewset, ProfessorAPIView, ProfessorViewset, ProfessorsAPIView, ScoreAttendanceViewset, SearchAPIView, StudentViewset
 router = DefaultRouter()
 
 router.register("viewset", ProfessorViewset, "viewset")
+router.register("students", StudentViewset, "students")
+router.register("groups", GroupViewset, "groups")
+router.register("lessons", LessonViewset, "lessons")
+router.register("lesson-files", LessonFilesViewset, "lesson-files")
+router.register("attendance", ScoreAttendanceViewset, "attendance")
 
 urlpatterns = router.urls + [
     path("professors/", ProfessorsAPIView.as_view(), name="professors"),
     path("professors/professor/<int:pk>", ProfessorAPIView.as_view(), name="professor"),
+    path("search/", SearchAPIView.as_view(), name="api_search"),
 ]
\ No newline at end of file
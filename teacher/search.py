@@ -0,0 +1,239 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+
+from teacher.models import Group, Lesson, Student, Teacher, is_scoped_to_own_groups
+
+
+TABLE = 'teacher_search'
+
+# Kind -> (rowid offset, model), the rowid of a document is object id * STRIDE + offset,
+# so a document is replaced or removed by rowid without scanning the index
+KINDS = {
+    'student': (0, Student),
+    'professor': (1, Teacher),
+    'course': (2, Group),
+    'lesson': (3, Lesson),
+}
+STRIDE = len(KINDS)
+
+# Phones are indexed once more with the digits only, "+998 90 123-45-67" is found as "99890"
+DIGITS = "replace(replace(replace(replace(replace(coalesce({0}, ''), ' ', ''), '-', ''), '+', ''), '(', ''), ')', '')"
+
+# Kind -> (table alias, title, body, FROM clause) of its documents
+DOCUMENTS = {
+    'student': (
+        's',
+        "s.first_name || ' ' || s.last_name || ' ' || coalesce(s.surname, '')",
+        f"s.email || ' ' || s.phone || ' ' || {DIGITS.format('s.phone')}",
+        'teacher_student s',
+    ),
+    'professor': (
+        't',
+        "t.first_name || ' ' || t.last_name",
+        f"t.email || ' ' || coalesce(t.phone, '') || ' ' || {DIGITS.format('t.phone')} || ' ' || coalesce(t.education, '')",
+        'teacher_teacher t',
+    ),
+    'course': (
+        'g',
+        "coalesce(gs.name, '') || ' ' || coalesce(g.course_code, '')",
+        'g.description',
+        'teacher_group g LEFT JOIN teacher_groupspec gs ON gs.id = g.name_id',
+    ),
+    'lesson': (
+        'l',
+        'l.theme',
+        "l.description || ' ' || coalesce(gs.name, '') || ' ' || coalesce(g.course_code, '')",
+        'teacher_lesson l LEFT JOIN teacher_group g ON g.id = l.group_id LEFT JOIN teacher_groupspec gs ON gs.id = g.name_id',
+    ),
+}
+
+
+def documents(kind, where=''):
+    """SELECT of (rowid, kind, object_id, title, body) of the documents of one kind."""
+    alias, title, body, tables = DOCUMENTS[kind]
+    select = (
+        f"SELECT {alias}.id * {STRIDE} + {KINDS[kind][0]} AS doc_id, '{kind}' AS kind, {alias}.id AS object_id, "
+        f"{title} AS title, {body} AS body FROM {tables}"
+    )
+    return f'{select} WHERE {where}' if where else select
+
+
+def doc_id(kind, pk):
+    return pk * STRIDE + KINDS[kind][0]
+
+
+# Kind -> URL name of the result links, they take the object id
+URLS = {
+    'student': 'student_profile',
+    'professor': 'professor_profile',
+    'course': 'about_course',
+    'lesson': 'edit_lesson',
+}
+
+TOKEN = re.compile(r'\w+')
+
+# Queries with only shorter words are not ranked
+MIN_RANKED_LENGTH = 3
+
+
+def is_available():
+    """The index is an SQLite FTS5 table, on other databases the API keeps its LIKE search."""
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """
+    Turns user input into an FTS5 query: every word must appear, as a prefix.
+
+    Only word characters are kept, so quotes and FTS5 operators typed by the user cannot
+    break the query.
+
+    :param query: str
+    :return: str or None if the query has no words
+    """
+    words = TOKEN.findall(query or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index(kind, where='', params=()):
+    """
+    Writes the documents of one kind again, all of them or those matched by where.
+
+    :param kind: str, key of KINDS
+    :param where: str, SQL condition on the aliases of DOCUMENTS, e.g. 'g.name_id = %s'
+    :param params: list of the where parameters
+    """
+    if not is_available():
+        return
+    select = documents(kind, where)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN (SELECT doc_id FROM ({select}))', params)
+        cursor.execute(f'INSERT INTO {TABLE} (rowid, kind, object_id, title, body) {select}', params)
+
+
+def index_ids(kind, ids):
+    """
+    Re-indexes the given objects, ids that no longer exist are removed from the index.
+
+    The lessons of re-indexed courses are written again too, they are found by the course name and code.
+    """
+    ids = list(ids)
+    if not ids or not is_available():
+        return
+    alias = DOCUMENTS[kind][0]
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        placeholders = ', '.join(['%s'] * len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})', [doc_id(kind, pk) for pk in batch])
+            cursor.execute(f'INSERT INTO {TABLE} (rowid, kind, object_id, title, body) {documents(kind, f"{alias}.id IN ({placeholders})")}', batch)
+        if kind == 'course':
+            index('lesson', f'l.group_id IN ({placeholders})', batch)
+
+
+def remove(kind, pk):
+    if is_available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [doc_id(kind, pk)])
+
+
+def index_model(model, ids=None):
+    """
+    Re-indexes the objects of a model after writes that send no signals, like bulk_create.
+
+    :param model: model class
+    :param ids: iterable of ids, every object if None
+    """
+    for kind, (_, kind_model) in KINDS.items():
+        if kind_model is model:
+            if ids is None:
+                rebuild(kind)
+            else:
+                index_ids(kind, ids)
+
+
+def index_course_name(spec_id):
+    """A course was renamed, its groups and their lessons carry the name."""
+    index('course', 'g.name_id = %s', [spec_id])
+    index('lesson', 'g.name_id = %s', [spec_id])
+
+
+def rebuild(*kinds):
+    """
+    Builds the index from scratch, every kind if none is given.
+
+    :return: int, number of documents
+    """
+    if not is_available():
+        return 0
+    kinds = kinds or tuple(KINDS)
+    with connection.cursor() as cursor:
+        for kind in kinds:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE kind = %s', [kind])
+            cursor.execute(f'INSERT INTO {TABLE} (rowid, kind, object_id, title, body) {documents(kind)}')
+        placeholders = ', '.join(['%s'] * len(kinds))
+        cursor.execute(f'SELECT count(*) FROM {TABLE} WHERE kind IN ({placeholders})', list(kinds))
+        return cursor.fetchone()[0]
+
+
+def matching(kind, query):
+    """
+    Subquery of the ids of one kind matching the query, for queryset.filter(id__in=...).
+
+    :return: RawSQL or None if the query has no words or there is no index
+    """
+    expression = match_expression(query)
+    if expression is None or not is_available():
+        return None
+    return RawSQL(f'SELECT object_id FROM {TABLE} WHERE {TABLE} MATCH %s AND kind = %s', [expression, kind])
+
+
+def search(user, query, kinds=None, limit=20):
+    """
+    Searches students, professors, courses and lessons at once.
+
+    Words match as prefixes, names and codes weigh more than descriptions (see the rank
+    configured in the migration). Teachers only find the students, courses and lessons of
+    their own groups, like everywhere else.
+
+    :param user: Teacher object
+    :param query: str, what the user typed
+    :param kinds: iterable of keys of KINDS, every kind if None
+    :param limit: int, most results
+    :return: list of dicts with kind, id, title and url
+    """
+    expression = match_expression(query)
+    if expression is None or not is_available():
+        return []
+    kinds = list(kinds or KINDS)
+    scoped = is_scoped_to_own_groups(user)
+    placeholders = ', '.join(['%s'] * len(kinds))
+    # Ranking reads every match, "na" matches most names and its ranking would mean little anyway
+    order = 'ORDER BY rank' if any(len(word) >= MIN_RANKED_LENGTH for word in TOKEN.findall(query)) else ''
+    with connection.cursor() as cursor:
+        cursor.execute(
+            # The unary + keeps the kind filter out of FTS5's ORDER BY rank plan, SQLite 3.40
+            # returns no rows when an IN on an UNINDEXED column is handed to it
+            f'SELECT kind, object_id, title FROM {TABLE} WHERE {TABLE} MATCH %s AND +kind IN ({placeholders}) {order} LIMIT %s',
+            # Teachers lose the rows of other groups below, look a bit further for them
+            [expression, *kinds, limit * 5 if scoped else limit],
+        )
+        rows = cursor.fetchall()
+
+    if scoped:
+        visible = {}
+        for kind, (_, model) in KINDS.items():
+            ids = [object_id for row_kind, object_id, _ in rows if row_kind == kind]
+            if ids and kind != 'professor':
+                visible[kind] = set(model.objects.visible_to(user).filter(id__in=ids).values_list('id', flat=True))
+        rows = [row for row in rows if row[0] == 'professor' or row[1] in visible.get(row[0], ())][:limit]
+
+    return [
+        {'kind': kind, 'id': object_id, 'title': ' '.join(title.split()), 'url': reverse(URLS[kind], args=[object_id])}
+        for kind, object_id, title in rows
+    ]
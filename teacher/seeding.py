@@ -0,0 +1,195 @@
+import datetime
+import random
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group as GroupType
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from teacher import search
+from teacher.caching import invalidate_model
+from teacher.gradebook import rebuild_gradebook
+from teacher.models import Group, GroupSpec, Lesson, Score_Attendance, Student, Teacher
+from teacher.roles import TEACHER
+
+
+SUBJECTS = [
+    'Python', 'JavaScript', 'Mathematics', 'Physics', 'Chemistry', 'Biology', 'English', 'Russian',
+    'History', 'Geography', 'Economics', 'Design', 'Data Science', 'Robotics', 'Accounting', 'Marketing',
+]
+
+# Faker is only asked for this many values of each kind, the rows pick from these pools,
+# which keeps the generation fast and the same for the same seed
+POOL_SIZE = 500
+
+MARKS = [Decimal(half) / 2 for half in range(8, 21)]
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def phone_number(number):
+    """A phone number unique for every number below 10 ** 8, in the format of PHONE_CHECK."""
+    return f'+998 9{number // 10 ** 7 % 10} {number // 10 ** 4 % 1000:03}-{number // 100 % 100:02}-{number % 100:02}'
+
+
+class SchoolSeeder:
+    """
+    Fills the database with a synthetic school for load and regression testing.
+
+    Every table is written in chunks of batch_size rows, with bulk_create and, for the attendance
+    rows, with executemany. The attendance rows are generated lazily, so memory stays bounded by
+    the chunk size and the enrollment lists.
+    The same seed gives the same school, the teachers share one password hashed once.
+    bulk_create sends no signals, so the gradebook statistics, the search index and the page
+    caches are refreshed once at the end.
+    """
+
+    def __init__(self, students=1000, groups=20, lessons_per_group=40, teachers=None, departments=len(SUBJECTS),
+                 seed=0, batch_size=5000, password='password', log=lambda message: None):
+        self.students = students
+        self.groups = groups
+        self.lessons_per_group = lessons_per_group
+        self.teachers = teachers or max(1, groups // 4)
+        self.departments = max(1, departments)
+        self.batch_size = batch_size
+        self.password = password
+        self.log = log
+        self.random = random.Random(seed)
+        self.seed = seed
+        self.created = {}
+
+    def make_pools(self):
+        # Only seeding needs Faker, see teacher/demo.py
+        from faker import Faker
+
+        fake = Faker()
+        fake.seed_instance(self.seed)
+        self.first_names = [fake.first_name() for _ in range(POOL_SIZE)]
+        self.last_names = [fake.last_name() for _ in range(POOL_SIZE)]
+        self.addresses = [fake.address() for _ in range(POOL_SIZE)]
+        self.jobs = [fake.job() for _ in range(POOL_SIZE)]
+        self.sentences = [fake.sentence() for _ in range(POOL_SIZE)]
+
+    def bulk_create(self, model, objects, **kwargs):
+        """Inserts the objects chunk by chunk, returns the created objects."""
+        created = []
+        with transaction.atomic():
+            for chunk in chunks(objects, self.batch_size):
+                created.extend(model.objects.bulk_create(chunk, **kwargs))
+        self.created[model._meta.verbose_name_plural] = self.created.get(model._meta.verbose_name_plural, 0) + len(created)
+        self.log(f'{len(created)} {model._meta.verbose_name_plural}')
+        return created
+
+    def run(self):
+        self.make_pools()
+        # Numbers go on from the last seeded run, so the unique emails and phones of the teachers never clash
+        start = (Teacher.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        pick = self.random.choice
+
+        specs = self.bulk_create(GroupSpec, (
+            GroupSpec(name=SUBJECTS[i % len(SUBJECTS)] + (f' {i // len(SUBJECTS) + 1}' if i >= len(SUBJECTS) else ''), description=pick(self.sentences))
+            for i in range(self.departments)
+        ))
+
+        password = make_password(self.password)
+        teachers = self.bulk_create(Teacher, (
+            Teacher(
+                first_name=pick(self.first_names), last_name=pick(self.last_names), email=f'teacher{number}@seed.example.com',
+                phone=phone_number(number), address=pick(self.addresses), gender=pick('12'), department=pick(specs),
+                education=pick(self.jobs), password=password,
+            )
+            for number in range(start, start + self.teachers)
+        ))
+        role, _ = GroupType.objects.get_or_create(name=TEACHER)
+        Teacher.groups.through.objects.bulk_create(
+            (Teacher.groups.through(teacher_id=teacher.id, group_id=role.id) for teacher in teachers), batch_size=self.batch_size,
+        )
+
+        first_day = datetime.date(2024, 9, 1)
+        groups = self.bulk_create(Group, (
+            Group(
+                name=pick(specs), course_code=f'SEED-{start}-{i + 1}', description=pick(self.sentences),
+                start_from=first_day + datetime.timedelta(days=self.random.randrange(365)), duration=pick([3, 6, 9]),
+                price=Decimal(self.random.randrange(500, 3000) * 1000), teacher=pick(teachers),
+                max_student=self.students // self.groups + 10, contact_number=phone_number(i), lang=pick('123'),
+            )
+            for i in range(self.groups)
+        ))
+
+        # Every student is in one group, one in ten in a second one
+        members = {group.id: [] for group in groups}
+        enrollments = []
+        for chunk in chunks(range(self.students), self.batch_size):
+            students = self.bulk_create(Student, (
+                Student(
+                    first_name=pick(self.first_names), last_name=pick(self.last_names),
+                    email=f'student{start}.{number}@seed.example.com', phone=phone_number(number),
+                    address=pick(self.addresses), education=pick(self.jobs), gender=pick('12'),
+                    birthday=datetime.date(2000, 1, 1) + datetime.timedelta(days=self.random.randrange(3650)),
+                )
+                for number in chunk
+            ))
+            for number, student in zip(chunk, students):
+                group_ids = {groups[number % len(groups)].id}
+                if self.random.random() < 0.1:
+                    group_ids.add(pick(groups).id)
+                for group_id in group_ids:
+                    members[group_id].append(student.id)
+                    enrollments.append(Student.group.through(student_id=student.id, group_id=group_id))
+        self.bulk_create(Student.group.through, enrollments)
+
+        lessons = self.bulk_create(Lesson, (
+            Lesson(
+                theme=f'{group.name.name} {number + 1}', description=pick(self.sentences), group=group,
+                date=group.start_from + datetime.timedelta(days=2 * number),
+            )
+            for group in groups for number in range(self.lessons_per_group)
+        ))
+
+        self.insert_attendance((lesson.id, student_id) for lesson in lessons for student_id in members[lesson.group_id])
+
+        self.log('Refreshing the gradebook statistics')
+        rebuild_gradebook([group.id for group in groups])
+        self.log('Rebuilding the search index')
+        search.rebuild()
+        for model in (GroupSpec, Teacher, Group, Student, Lesson):
+            invalidate_model(model)
+        return self
+
+    def insert_attendance(self, pairs):
+        """
+        Writes an attendance row for every (lesson id, student id) pair with executemany, chunk by chunk.
+
+        They are most of the rows of the school, bulk_create spends about 90 µs per row on
+        building and preparing the model instances, the plain INSERT a few.
+        """
+        ops = connection.ops
+        columns = ['lesson_id', 'student_id', 'mark', 'is_present', 'created_at', 'updated_at']
+        sql = (
+            f'INSERT INTO {ops.quote_name(Score_Attendance._meta.db_table)} ({", ".join(map(ops.quote_name, columns))}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))})'
+        )
+        marks = [ops.adapt_decimalfield_value(mark, 3, 1) for mark in MARKS]
+        now = timezone.now()
+        created_at, updated_at = ops.adapt_datefield_value(now.date()), ops.adapt_datetimefield_value(now)
+        rng = self.random.random
+        count = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            for chunk in chunks(pairs, self.batch_size):
+                rows = []
+                for lesson_id, student_id in chunk:
+                    is_present = rng() < 0.9
+                    mark = marks[int(rng() * len(marks))] if is_present and rng() < 0.8 else None
+                    rows.append((lesson_id, student_id, mark, is_present, created_at, updated_at))
+                cursor.executemany(sql, rows)
+                count += len(rows)
+        name = Score_Attendance._meta.verbose_name_plural
+        self.created[name] = count
+        self.log(f'{count} {name}')
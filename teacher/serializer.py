@@ -1,31 +1,133 @@
 import re
+from decimal import Decimal
 from rest_framework import serializers
 from rest_framework.validators import ValidationError
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import Group as GroupType
 
-from teacher.models import Student, Teacher
+from teacher.models import Group, Lesson, LessonFiles, Score_Attendance, Student, Teacher, is_scoped_to_own_groups
+from teacher.roles import TEACHER, role_id
+from teacher.services import hidden_groups
+from teacher.thumbnails import FORMATS, thumbnail_url
 
-class ProfessorSer(serializers.ModelSerializer):
+
+class SparseFieldsMixin:
+    """
+    Lets GET requests pick the returned fields with ?fields=id,first_name.
+
+    Unknown names are ignored, if nothing known is asked for every field is returned.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.requested_fields(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+    @classmethod
+    def requested_fields(cls, request):
+        if request is None or request.method != 'GET':
+            return None
+        fields = request.query_params.get('fields')
+        if not fields:
+            return None
+        return {name.strip() for name in fields.split(',')} & set(cls.Meta.fields) or None
+
+    @classmethod
+    def only_fields(cls, request, *extra):
+        """Model fields to pass to QuerySet.only() for the requested fields, None means all of them."""
+        requested = cls.requested_fields(request)
+        if requested is None:
+            return None
+        return sorted(requested | {'id', *extra})
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that only accepts the objects the requesting user sees, teachers can only
+    point to the rows of their own groups, see VisibleToQuerySet.
+
+    It takes the related object from context['related'] when the view loaded it beforehand,
+    {model: {pk: object}}, instead of one query per value. The bulk endpoints validate every row
+    with its own serializer, see BulkMixin.preload_related.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is not None and hasattr(queryset, 'visible_to'):
+            queryset = queryset.visible_to(request.user)
+        return queryset
+
+    def to_internal_value(self, data):
+        related = self.context.get('related', {}).get(self.queryset.model)
+        if related is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return related[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class RelatedFieldsMixin:
+    """ModelSerializer whose foreign keys and many-to-many fields are PreloadedPrimaryKeyRelatedFields."""
+    serializer_related_field = PreloadedPrimaryKeyRelatedField
+
+
+class ThumbnailField(serializers.Field):
+    """
+    Read only image field: the URL of the original and of every format of the given thumbnail sizes.
+
+    {"original": ".../a.jpg", "small": {"webp": ".../a.1f2e.webp", "jpeg": ".../a.1f2e.jpg"}}
+    """
+
+    def __init__(self, sizes, **kwargs):
+        self.sizes = sizes
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+
+        def absolute(url):
+            return request.build_absolute_uri(url) if request else url
+
+        return {
+            'original': absolute(value.url),
+            **{size: {fmt: absolute(thumbnail_url(value, size, fmt)) for fmt in FORMATS} for size in self.sizes},
+        }
+
+
+class ProfessorSer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Teacher
-        fields = ('id', "first_name", "last_name", "email", "phone", "gender")
+        fields = ('id', "first_name", "last_name", "email", "phone", "gender", "profile_photo")
+
+    profile_photo = ThumbnailField(sizes=('small', 'medium'))
     
     def save(self, **kwargs):
         print(kwargs)
         print('First name')
         print(self.validated_data)
         data = self.validated_data
-        group = Group.objects.get(name='Teacher')
         teacher = super().save(**kwargs)
-        teacher.groups.add(group)
+        teacher.groups.add(role_id(TEACHER))
         print('First name')
         return teacher
 
 
-class StudentsSer(serializers.ModelSerializer):
+class StudentsSer(RelatedFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Student
-        fields = ('id', "first_name", "last_name", "email", "phone", "gender")
+        fields = ('id', "first_name", "last_name", "surname", "email", "phone", "address", "group", "education", "gender", "birthday", "profile_photo", "created_at")
+
+    profile_photo = ThumbnailField(sizes=('small', 'medium'))
 
     def validate_phone(self, phone):
         phone_regex = r"^\+998\s?[0-9]{2}\s?[0-9]{3}[\s?-]?[0-9]{2}[\s?-]?[0-9]{2}$"
@@ -33,4 +135,46 @@ class StudentsSer(serializers.ModelSerializer):
         if not phone_check.fullmatch(phone):
             raise ValidationError('Invalid phone number')
         return phone
-    
\ No newline at end of file
+
+    def update(self, instance, validated_data):
+        request = self.context.get('request')
+        if 'group' in validated_data and request is not None:
+            validated_data['group'] = [*validated_data['group'], *hidden_groups(instance, request.user)]
+        return super().update(instance, validated_data)
+
+
+class GroupSer(RelatedFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Group
+        fields = ('id', 'name', 'course_code', 'description', 'start_from', 'duration', 'price', 'teacher',
+                  'max_student', 'contact_number', 'lang', 'group_photo', 'like_count', 'created_at')
+
+    group_photo = ThumbnailField(sizes=('large',))
+
+    def validate_teacher(self, teacher):
+        request = self.context.get('request')
+        if request is not None and is_scoped_to_own_groups(request.user) and teacher != request.user:
+            raise ValidationError('Teachers can only give groups to themselves')
+        return teacher
+
+
+class LessonSer(RelatedFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ('id', 'theme', 'date', 'description', 'group')
+
+
+class LessonFilesSer(RelatedFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = LessonFiles
+        fields = ('id', 'file', 'name', 'lesson')
+        read_only_fields = ('name',)
+
+
+class ScoreAttendanceSer(RelatedFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Score_Attendance
+        fields = ('id', 'student', 'lesson', 'mark', 'is_present', 'created_at', 'updated_at')
+        extra_kwargs = {
+            'mark': {'min_value': Decimal('0'), 'max_value': Decimal('10')},
+        }
@@ -0,0 +1,175 @@
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from teacher.gradebook import refresh_lessons
+from teacher.models import Group, GroupLikes, Score_Attendance, Student, is_scoped_to_own_groups
+
+
+def hidden_groups(student, user):
+    """
+    Groups of the student the user does not see.
+
+    A teacher only adds and removes memberships of their own groups, whatever groups they
+    save for a student, the memberships in the groups of other teachers stay.
+
+    :param student: Student object, unsaved for a new student
+    :param user: Teacher object
+    :return: list of Group objects
+    """
+    if student.pk is None or not is_scoped_to_own_groups(user):
+        return []
+    return list(student.group.exclude(pk__in=Group.objects.visible_to(user).values('pk')))
+
+
+def prepare_attendance_sheet(lesson):
+    """
+    Makes sure every student of the lesson's group has a Score_Attendance row and returns the sheet.
+
+    Existing rows are loaded once as a set of student ids, only the missing rows are created
+    with a single bulk_create, so the number of queries does not depend on the group size.
+    The gradebook statistics of the lesson are refreshed when rows were missing.
+    The unique (lesson, student) constraint lets concurrent requests insert the same rows safely.
+
+    :param lesson: Lesson object
+    :return: QuerySet of Score_Attendance with the student already joined
+    """
+    if lesson.group_id is None:
+        return Score_Attendance.objects.none()
+
+    student_ids = list(Student.objects.filter(group=lesson.group_id).values_list('id', flat=True))
+    existing = set(Score_Attendance.objects.filter(lesson=lesson).values_list('student_id', flat=True))
+    missing = [student_id for student_id in student_ids if student_id not in existing]
+    if missing:
+        with transaction.atomic():
+            Score_Attendance.objects.bulk_create((
+                Score_Attendance(lesson=lesson, student_id=student_id) for student_id in missing
+            ), ignore_conflicts=True)
+            # The new rows count as present and unmarked in the attendance rates
+            refresh_lessons([lesson.id])
+    return attendance_sheet_queryset(lesson)
+
+
+def attendance_sheet_queryset(lesson):
+    """
+    Returns the Score_Attendance rows of the lesson for the students of its group.
+
+    :param lesson: Lesson object
+    :return: QuerySet of Score_Attendance ordered by id
+    """
+    return (
+        Score_Attendance.objects
+        .filter(lesson=lesson, student__group=lesson.group_id)
+        .select_related('student')
+        .order_by('id')
+    )
+
+
+def update_attendance_rows(rows):
+    """
+    Writes the mark and is_present values of the given Score_Attendance rows with one bulk_update.
+
+    bulk_update skips auto_now, so updated_at is stamped here.
+    The gradebook statistics of the touched lessons are refreshed afterwards.
+
+    :param rows: list of Score_Attendance objects
+    :return: int, number of updated rows
+    """
+    if not rows:
+        return 0
+    now = timezone.now()
+    for row in rows:
+        row.updated_at = now
+    with transaction.atomic():
+        updated = Score_Attendance.objects.bulk_update(rows, ['mark', 'is_present', 'updated_at'])
+        refresh_lessons({row.lesson_id for row in rows})
+    return updated
+
+
+def save_attendance_marks(lesson, marks):
+    """
+    Saves a whole attendance sheet in one transaction.
+
+    Only the rows whose mark or is_present actually changed are written.
+
+    :param lesson: Lesson object
+    :param marks: dict of student id -> {'mark': Decimal or None, 'is_present': bool}
+    :return: int, number of updated rows
+    :raises ValidationError: if a student id does not belong to the lesson's group
+    """
+    with transaction.atomic():
+        sheet = {row.student_id: row for row in prepare_attendance_sheet(lesson)}
+        unknown = sorted(set(marks) - set(sheet))
+        if unknown:
+            raise ValidationError(f'Students {unknown} are not in the group of this lesson')
+
+        changed = []
+        for student_id, values in marks.items():
+            row = sheet[student_id]
+            if row.mark != values['mark'] or row.is_present != values['is_present']:
+                row.mark = values['mark']
+                row.is_present = values['is_present']
+                changed.append(row)
+        return update_attendance_rows(changed)
+
+
+def toggle_group_like(group, user):
+    """
+    Likes the group for the user or removes the like if it already exists.
+
+    Group.like_count is moved with an F() expression in the same transaction,
+    so concurrent clicks never lose an update.
+
+    :param group: Group object, only id is needed
+    :param user: Teacher object
+    :return: tuple of (liked, like_count)
+    """
+    with transaction.atomic():
+        deleted, _ = GroupLikes.objects.filter(group=group, user_id=user.id).delete()
+        if deleted:
+            delta = -deleted
+        else:
+            try:
+                with transaction.atomic():
+                    GroupLikes.objects.create(group=group, user_id_id=user.id)
+                delta = 1
+            except IntegrityError:
+                # Another request liked it in the meantime and already counted it
+                delta = 0
+        if delta:
+            Group.objects.filter(id=group.id).update(like_count=F('like_count') + delta)
+    group.refresh_from_db(fields=['like_count'])
+    return not deleted, group.like_count
+
+
+def group_likes_summary(group_ids, user):
+    """
+    Returns likes and the liked flag of many groups with two queries.
+
+    :param group_ids: iterable of group ids
+    :param user: Teacher object
+    :return: dict of group id -> {'likes': int, 'liked': bool}
+    """
+    counts = dict(Group.objects.filter(id__in=group_ids).values_list('id', 'like_count'))
+    liked = set(
+        GroupLikes.objects.filter(group__in=counts, user_id=user.id).values_list('group_id', flat=True)
+    )
+    return {group_id: {'likes': likes, 'liked': group_id in liked} for group_id, likes in counts.items()}
+
+
+def recount_group_likes(group_ids):
+    """
+    Recomputes Group.like_count from the GroupLikes rows, used when likes are edited outside toggle_group_like.
+
+    :param group_ids: iterable of group ids
+    """
+    likes = (
+        GroupLikes.objects
+        .filter(group=OuterRef('pk'))
+        .values('group')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Group.objects.filter(id__in=group_ids).update(like_count=Coalesce(Subquery(likes), 0))
@@ -0,0 +1,191 @@
+from django.contrib.auth.models import Group as GroupType
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from teacher import search, tasks
+from teacher.caching import bump, invalidate_model
+from teacher.gradebook import rebuild_gradebook
+from teacher.models import Group, GroupLikes, GroupSpec, Lesson, LessonFiles, Skill, Student, Teacher
+
+
+# Photo field and the thumbnail sizes the templates use for it
+PHOTOS = {
+    Teacher: ('profile_photo', ('small', 'medium')),
+    Student: ('profile_photo', ('small', 'medium')),
+    Group: ('group_photo', ('large',)),
+}
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=GroupSpec)
+@receiver(post_save, sender=Skill)
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Teacher)
+@receiver(post_save, sender=GroupLikes)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=GroupSpec)
+@receiver(post_delete, sender=Skill)
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_delete, sender=GroupLikes)
+def invalidate_cached_pages(sender, update_fields=None, **kwargs):
+    # Logging in saves last_login only, that does not change any cached page
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_model(sender)
+
+
+# Model -> kind of its search documents, see teacher/search.py
+SEARCH_KINDS = {
+    Student: 'student',
+    Teacher: 'professor',
+    Group: 'course',
+    Lesson: 'lesson',
+}
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Teacher)
+@receiver(post_save, sender=Group)
+@receiver(post_save, sender=Lesson)
+def index_for_search(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    search.index_ids(SEARCH_KINDS[sender], [instance.pk])
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Lesson)
+def remove_from_search(sender, instance, **kwargs):
+    search.remove(SEARCH_KINDS[sender], instance.pk)
+    if sender is Group:
+        # The lessons kept with no group lost their course name
+        search.index('lesson', 'l.group_id IS NULL')
+
+
+@receiver(post_save, sender=GroupSpec)
+def index_course_name(sender, instance, **kwargs):
+    search.index_course_name(instance.pk)
+
+
+@receiver(post_delete, sender=GroupSpec)
+def remove_course_name(sender, instance, **kwargs):
+    search.index('course', 'g.name_id IS NULL')
+    search.index('lesson', 'g.name_id IS NULL AND l.group_id IS NOT NULL')
+
+
+@receiver(m2m_changed, sender=Student.group.through)
+def invalidate_student_groups(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump('students', 'groups')
+
+
+# The gradebook counts the rows of the enrolled students for the lessons of a group, these
+# writes change that without going through refresh_lessons, so their groups are recomputed
+@receiver(m2m_changed, sender=Student.group.through)
+def refresh_enrollment_stats(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_group_ids = list(instance.group.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if reverse:
+            group_ids = [instance.pk]
+        elif action == 'post_clear':
+            group_ids = instance.__dict__.pop('_cleared_group_ids', [])
+        else:
+            group_ids = pk_set
+        if group_ids:
+            rebuild_gradebook(group_ids)
+
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_group(sender, instance, **kwargs):
+    if instance.pk is not None:
+        instance._previous_group_id = Lesson.objects.filter(pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Lesson)
+def refresh_moved_lesson_stats(sender, instance, created, **kwargs):
+    previous = instance.__dict__.pop('_previous_group_id', None)
+    if not created and previous != instance.group_id:
+        rebuild_gradebook({previous, instance.group_id} - {None})
+
+
+@receiver(post_delete, sender=Lesson)
+def refresh_deleted_lesson_stats(sender, instance, **kwargs):
+    # Its rows were kept without a lesson
+    if instance.group_id is not None:
+        rebuild_gradebook([instance.group_id])
+
+
+@receiver(pre_delete, sender=Student)
+def remember_student_groups(sender, instance, **kwargs):
+    instance._deleted_group_ids = list(instance.group.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Student)
+def refresh_deleted_student_stats(sender, instance, **kwargs):
+    group_ids = instance.__dict__.pop('_deleted_group_ids', [])
+    if group_ids:
+        rebuild_gradebook(group_ids)
+
+
+@receiver(post_save, sender=GroupType)
+@receiver(post_delete, sender=GroupType)
+def invalidate_roles(sender, **kwargs):
+    bump('permissions')
+
+
+@receiver(m2m_changed, sender=Teacher.groups.through)
+@receiver(m2m_changed, sender=Teacher.user_permissions.through)
+@receiver(m2m_changed, sender=GroupType.permissions.through)
+def invalidate_permissions(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump('permissions')
+
+
+@receiver(pre_save, sender=Teacher)
+@receiver(pre_save, sender=Student)
+@receiver(pre_save, sender=Group)
+def remember_photo(sender, instance, update_fields=None, **kwargs):
+    field = PHOTOS[sender][0]
+    if instance.pk is not None and (update_fields is None or field in update_fields):
+        instance._previous_photo = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Group)
+def make_photo_thumbnails(sender, instance, update_fields=None, **kwargs):
+    field, sizes = PHOTOS[sender]
+    photo = getattr(instance, field)
+    previous = instance.__dict__.pop('_previous_photo', None)
+    if previous and previous != photo.name:
+        # The photo was replaced or cleared, the thumbnails of the old one are never shown again
+        tasks.delete_photo_thumbnails.enqueue(
+            key=f'delete_thumbnails:{previous}', label=sender._meta.label, field=field, name=previous,
+        )
+    if not photo or (update_fields is not None and field not in update_fields):
+        return
+    tasks.make_photo_thumbnails.enqueue(
+        key=f'thumbnails:{photo.name}', label=sender._meta.label, field=field, name=photo.name, sizes=sizes,
+    )
+
+
+# The files go through the task queue, the row is part of the transaction, so a rolled back
+# delete keeps its files and the request does not wait for the disk
+@receiver(post_delete, sender=Teacher)
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Group)
+def delete_photo_files(sender, instance, **kwargs):
+    field = PHOTOS[sender][0]
+    photo = getattr(instance, field)
+    if photo:
+        tasks.delete_photo.enqueue(key=f'delete:{photo.name}', label=sender._meta.label, field=field, name=photo.name)
+
+
+@receiver(post_delete, sender=LessonFiles)
+def release_lesson_file(sender, instance, **kwargs):
+    if instance.file:
+        tasks.release_lesson_file.enqueue(key=f'release:{instance.file.name}', name=instance.file.name)
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+
+BLOB_DIR = 'lessons/blobs'
+
+# A blob saved or reused this recently may belong to a LessonFiles row that is not committed yet
+GRACE_PERIOD = timedelta(hours=1)
+
+
+def blob_name(sha256, name):
+    """
+    Storage name of the blob with the given content: lessons/blobs/<first two hex digits>/<sha256><extension>.
+
+    The extension is kept so the media view still sends the right Content-Type.
+
+    :param sha256: str, hex digest of the content
+    :param name: str, any name of the file, only its extension is used
+    :return: str
+    """
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256}{os.path.splitext(name)[1].lower()}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f'{BLOB_DIR}/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file once under the SHA-256 of its content.
+
+    The upload is hashed while it is copied to a temporary file next to the blobs, then the
+    temporary file becomes the blob, or is dropped if a blob with the same content exists.
+    The name returned by save() is the blob name, so all LessonFiles rows with the same content
+    share one file and the rows themselves are the references, see teacher/signals.py.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The name is only decided by _save, equal content must end up under the same name
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(BLOB_DIR)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as temporary:
+            try:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temporary.write(chunk)
+            except BaseException:
+                temporary.close()
+                os.remove(temporary.name)
+                raise
+
+        return self.adopt(digest.hexdigest(), name, temporary.name)
+
+    def reuse(self, name):
+        """
+        Returns whether the blob exists, so a new reference can point to it without storing the content again.
+
+        :param name: str, blob name from blob_name()
+        """
+        try:
+            # Starts the grace period again, see release_blob
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def adopt(self, sha256, name, path):
+        """
+        Moves a local file whose SHA-256 was already checked into its blob, without hashing it again.
+
+        :param sha256: str, hex digest of the file
+        :param name: str, any name of the file, only its extension is used
+        :param path: str, the file, it is moved or deleted
+        :return: str, blob name
+        """
+        name = blob_name(sha256, name)
+        if self.reuse(name):
+            os.remove(path)
+            return name
+        target = self.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # A rename when the upload directory is on the same file system, a copy otherwise
+        shutil.move(path, target)
+        if self.file_permissions_mode is not None:
+            os.chmod(target, self.file_permissions_mode)
+        return name
+
+
+lesson_files_storage = ContentAddressedStorage()
+
+
+def get_lesson_files_storage():
+    return lesson_files_storage
+
+
+def in_grace_period(name):
+    return is_blob(name) and lesson_files_storage.get_modified_time(name) > timezone.now() - GRACE_PERIOD
+
+
+def referenced(name):
+    # teacher.models imports this module for the storage of LessonFiles.file
+    from teacher.models import LessonFiles
+    return LessonFiles.objects.filter(file=name).exists()
+
+
+def release_blob(name):
+    """
+    Deletes a blob once no LessonFiles row refers to it any more.
+
+    Called after the commit that deleted a reference. A blob inside its grace period may just
+    have been reused by an upload whose row is not committed yet, collect_garbage removes it later.
+    Files from before the content addressed storage have a single owner and are deleted right away.
+
+    :param name: str, storage name
+    :return: bool, whether the file was deleted
+    """
+    if referenced(name) or not lesson_files_storage.exists(name) or in_grace_period(name):
+        return False
+    lesson_files_storage.delete(name)
+    return True
+
+
+def collect_garbage():
+    """
+    Deletes the blobs no LessonFiles row refers to.
+
+    They are left behind by replaced files, by release_blob during the grace period and, as
+    temporary files, by uploads that crashed. Run it regularly, see the gc_lesson_files command.
+
+    :return: int, number of deleted files
+    """
+    storage = lesson_files_storage
+    if not storage.exists(BLOB_DIR):
+        return 0
+    prefixes, temporary = storage.listdir(BLOB_DIR)
+    names = [f'{BLOB_DIR}/{file_name}' for file_name in temporary]
+    for prefix in prefixes:
+        names.extend(f'{BLOB_DIR}/{prefix}/{file_name}' for file_name in storage.listdir(f'{BLOB_DIR}/{prefix}')[1])
+    count = 0
+    for name in names:
+        if not in_grace_period(name) and not referenced(name):
+            storage.delete(name)
+            count += 1
+    return count
+
+
+def convert_to_blob(lesson_file):
+    """
+    Moves a file stored before the content addressed storage into its blob.
+
+    :param lesson_file: LessonFiles object
+    :return: bool, whether the file was converted
+    """
+    old_name = lesson_file.file.name
+    if not old_name or is_blob(old_name) or not lesson_files_storage.exists(old_name):
+        return False
+    with lesson_files_storage.open(old_name, 'rb') as file:
+        new_name = lesson_files_storage.save(old_name, file)
+    lesson_file.name = lesson_file.name or os.path.basename(old_name)
+    lesson_file.file.name = new_name
+    lesson_file.save(update_fields=['file', 'name'])
+    release_blob(old_name)
+    return True
@@ -0,0 +1,209 @@
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+
+from teacher.models import LessonUpload, Task
+from teacher.storage import release_blob
+from teacher.thumbnails import UNREADABLE, delete_thumbnails, make_thumbnails
+
+
+logger = logging.getLogger(__name__)
+
+# Task name -> (function, max attempts, seconds before the first retry)
+TASKS = {}
+
+# How long a worker may run one task before another worker takes it over
+LEASE = timedelta(minutes=10)
+
+
+def task(name, max_attempts=3, retry_delay=60):
+    """
+    Registers a function as a background task.
+
+    The function is called by the worker with the keyword arguments given to enqueue,
+    they must be JSON serializable. A task can run more than once, after a worker died
+    or when a retry follows a partial failure, so it must be safe to repeat.
+
+    :param name: str, unique task name stored in the database
+    :param max_attempts: int, runs before the task is marked as failed
+    :param retry_delay: int, seconds before the first retry, doubled for every further one
+    """
+    def register(function):
+        TASKS[name] = (function, max_attempts, retry_delay)
+        function.enqueue = lambda key=None, run_at=None, **kwargs: enqueue(name, kwargs, key=key, run_at=run_at)
+        return function
+    return register
+
+
+def enqueue(name, kwargs=None, key=None, run_at=None):
+    """
+    Adds a task to the queue.
+
+    The row is written in the current transaction, so a rolled back request never runs
+    its tasks and the worker only sees them after the commit.
+    With TASKS_EAGER a task that is due now runs in the process right after the commit instead,
+    for development without a worker.
+
+    :param name: str, registered task name
+    :param kwargs: dict of keyword arguments
+    :param key: str, idempotency key, if a pending task has it no new task is added
+    :param run_at: datetime, not before, now if None
+    :return: Task object, the existing one for a duplicate key, None when eager
+    """
+    function, max_attempts, _ = TASKS[name]
+    kwargs = kwargs or {}
+    if getattr(settings, 'TASKS_EAGER', False) and (run_at is None or run_at <= timezone.now()):
+        transaction.on_commit(lambda: function(**kwargs))
+        return None
+    try:
+        with transaction.atomic():
+            return Task.objects.create(name=name, kwargs=kwargs, key=key, run_at=run_at or timezone.now(), max_attempts=max_attempts)
+    except IntegrityError:
+        if key is None:
+            raise
+        return Task.objects.get(key=key, status=Task.PENDING)
+
+
+def claim(limit):
+    """
+    Takes up to limit due tasks, oldest first.
+
+    Every task is taken with a conditional UPDATE, so workers running side by side never run
+    the same task twice, on SQLite as well as on PostgreSQL.
+    A task whose lease ran out on its last attempt is marked as failed instead, a task that
+    kills its worker would otherwise be taken again forever.
+
+    :return: list of Task objects, marked as running
+    """
+    now = timezone.now()
+    Task.objects.filter(status=Task.RUNNING, locked_until__lt=now, attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, locked_until=None, updated_at=now,
+        last_error=Concat(F('last_error'), Value('The worker stopped during the last attempt.\n')),
+    )
+    due = (
+        Task.objects
+        .filter(Q(status=Task.PENDING, run_at__lte=now) | Q(status=Task.RUNNING, locked_until__lt=now))
+        .order_by('run_at', 'id')[:limit]
+    )
+    claimed = []
+    for current in due:
+        taken = Task.objects.filter(pk=current.pk, status=current.status, attempts=current.attempts).update(
+            status=Task.RUNNING, attempts=F('attempts') + 1, locked_until=now + LEASE, updated_at=now,
+        )
+        if taken:
+            current.status = Task.RUNNING
+            current.attempts += 1
+            claimed.append(current)
+    return claimed
+
+
+def execute(current):
+    """
+    Runs one claimed task. A finished task is deleted, a failed one is retried later with
+    exponential backoff until max_attempts, then kept as failed with its traceback.
+
+    :param current: Task object
+    :return: bool, whether the task succeeded
+    """
+    try:
+        TASKS[current.name][0](**current.kwargs)
+    except Exception:
+        logger.exception('Task %s (%s) failed', current.name, current.pk)
+        current.last_error = traceback.format_exc()
+        if current.attempts < current.max_attempts and current.name in TASKS:
+            current.status = Task.PENDING
+            current.run_at = timezone.now() + timedelta(seconds=TASKS[current.name][2] * 2 ** (current.attempts - 1))
+        else:
+            current.status = Task.FAILED
+        current.locked_until = None
+        try:
+            with transaction.atomic():
+                current.save(update_fields=['status', 'run_at', 'locked_until', 'last_error', 'updated_at'])
+        except IntegrityError:
+            # The same work was enqueued again meanwhile, that pending task retries it
+            current.delete()
+        return False
+    current.delete()
+    return True
+
+
+def run_pending(limit=100):
+    """
+    Runs the tasks that are due now.
+
+    :param limit: int, most tasks to run
+    :return: (succeeded, failed) counts
+    """
+    succeeded = failed = 0
+    for current in claim(limit):
+        if execute(current):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def work(sleep=1.0, batch=100, stop=lambda: False):
+    """Runs due tasks until stop() is true, sleeping whenever the queue is empty."""
+    while not stop():
+        succeeded, failed = run_pending(batch)
+        if not succeeded and not failed:
+            time.sleep(sleep)
+
+
+def field_file(label, field, name):
+    """A FieldFile for a storage name, the tasks get names instead of model instances that may be gone."""
+    model_field = apps.get_model(label)._meta.get_field(field)
+    return FieldFile(None, model_field, name)
+
+
+@task('thumbnails.make')
+def make_photo_thumbnails(label, field, name, sizes):
+    try:
+        make_thumbnails(field_file(label, field, name), sizes)
+    except UNREADABLE:
+        # Deleted before the worker got to it or not an image Pillow can read,
+        # the templates fall back to the original
+        pass
+
+
+@task('thumbnails.delete')
+def delete_photo_thumbnails(label, field, name):
+    delete_thumbnails(field_file(label, field, name))
+
+
+@task('files.delete')
+def delete_photo(label, field, name):
+    photo = field_file(label, field, name)
+    delete_thumbnails(photo)
+    photo.storage.delete(name)
+
+
+@task('lesson_files.release')
+def release_lesson_file(name):
+    release_blob(name)
+
+
+@task('uploads.expire')
+def expire_upload(upload_id):
+    # teacher.uploads enqueues this task when an upload starts
+    from teacher.uploads import EXPIRY, abort_upload
+
+    upload = LessonUpload.objects.filter(pk=upload_id).first()
+    if upload is None:
+        return
+    deadline = upload.updated_at + EXPIRY
+    if deadline <= timezone.now():
+        abort_upload(upload)
+    else:
+        # Chunks arrived meanwhile, look again once it could have expired
+        expire_upload.enqueue(key=f'expire:{upload_id}', run_at=deadline, upload_id=upload_id)
@@ -0,0 +1,30 @@
+from django import template
+
+from teacher.thumbnails import thumbnail_url
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail(field_file, size, fmt='jpeg'):
+    """
+    URL of a resized copy of an image field.
+
+    {% thumbnail student.profile_photo 'small' %} or {% thumbnail course.group_photo 'large' 'webp' %}
+    """
+    return thumbnail_url(field_file, size, fmt) or ''
+
+
+@register.inclusion_tag('include/picture.html')
+def picture(field_file, size, **attrs):
+    """
+    <picture> with a WebP source and a JPEG fallback of an image field.
+
+    {% picture student.profile_photo 'small' width=35 class='rounded-circle' %}
+    """
+    return {
+        'webp': thumbnail_url(field_file, size, 'webp'),
+        'jpeg': thumbnail_url(field_file, size, 'jpeg'),
+        'attrs': attrs,
+    }
@@ -1,13 +1,883 @@
-# import re
-from django.test import TestCase
+import datetime
+import hashlib
+import os
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# # Create your tests here.
+from django.contrib.auth.models import Group as GroupType, Permission
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
 
+from teacher import benchmark
+from teacher.caching import get_versions
+from teacher.checks import check_shared_cache
+from teacher.importing import StudentImporter, read_rows
+from teacher.media import can_read
+from teacher.models import (
+    Group, GroupSpec, GroupStats, Lesson, LessonFiles, LessonUpload, Score_Attendance, Student, StudentStats, Task, Teacher,
+)
+from teacher.search import search
+from teacher.services import save_attendance_marks
+from teacher.tasks import claim, enqueue, execute, expire_upload, run_pending, task
+from teacher.thumbnails import make_thumbnail, thumbnail_name, thumbnail_url
+from teacher.uploads import EXPIRY, attach_existing, finalize_upload, part_path, start_upload, write_chunk
 
-# def phone_validate(phone):
-#     phone_regex = r"^(\+998\s?)?[0-9]{2}\s?[0-9]{3}[\s?-]?[0-9]{2}[\s?-]?[0-9]{2}"
-#     # phone_regex = r"^\+998\s?[0-9]{2}\s?[0-9]{3}[\s?-]?[0-9]{2}[\s?-]?[0-9]{2}$"
-#     phone_check = re.compile(phone_regex)
-#     print(phone_check.fullmatch(phone).group())
 
-# phone_validate('971030315')
+# Tasks of TaskQueueTest
+done = []
+
+
+@task('tests.succeed')
+def succeed(value):
+    done.append(value)
+
+
+@task('tests.fail', retry_delay=10)
+def fail():
+    raise RuntimeError('Task failed')
+
+
+
+# Measures what building the pages costs, not what the page cache saves
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class ListPagesQueryCountTest(TestCase):
+    """The list pages must cost the same number of queries for 10 and for 1000 rows."""
+
+    pages = ['home', 'all_students', 'all_courses', 'all_lessons', 'all_professors']
+
+    def setUp(self):
+        self.teacher_role = GroupType.objects.create(name='Teacher')
+        self.manager = Teacher.objects.create_user(
+            first_name='Admin', last_name='Admin', email='admin@example.com', phone='0', password='password',
+        )
+        self.manager.is_admin = True
+        self.manager.is_superuser = True
+        self.manager.save()
+        self.client.force_login(self.manager)
+        self.created = 0
+
+    def seed(self, rows):
+        """Adds rows teachers, groups, lessons and students, every student enrolled in one group."""
+        start, self.created = self.created, self.created + rows
+        spec = GroupSpec.objects.create(name=f'Spec {start}', description='')
+        teachers = Teacher.objects.bulk_create(
+            Teacher(first_name=f'T{i}', last_name='L', email=f't{i}@example.com', phone=str(i + 1), department=spec)
+            for i in range(start, self.created)
+        )
+        self.teacher_role.user_set.add(*teachers)
+        groups = Group.objects.bulk_create(
+            Group(name=spec, teacher=teacher, description='', course_code=f'C{i}')
+            for i, teacher in enumerate(teachers, start)
+        )
+        Lesson.objects.bulk_create(
+            Lesson(theme=f'Lesson {i}', date=datetime.date(2025, 1, 1), description='', group=group)
+            for i, group in enumerate(groups, start)
+        )
+        students = Student.objects.bulk_create(
+            Student(first_name=f'S{i}', last_name='L', email=f's{i}@example.com', phone='1', address='')
+            for i in range(start, self.created)
+        )
+        Student.group.through.objects.bulk_create(
+            Student.group.through(student_id=student.id, group_id=group.id)
+            for student, group in zip(students, groups)
+        )
+
+    def count_queries(self, name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.seed(10)
+        small = {name: self.count_queries(name) for name in self.pages}
+        self.seed(990)
+        large = {name: self.count_queries(name) for name in self.pages}
+        self.assertEqual(small, large)
+
+
+class CachedPagesTest(TestCase):
+    """Cached pages are served without queries and are refreshed as soon as the models they show change."""
+
+    def setUp(self):
+        cache.clear()
+        self.manager = Teacher.objects.create_user(
+            first_name='Admin', last_name='Admin', email='admin@example.com', phone='0', password='password',
+        )
+        self.manager.is_admin = True
+        self.manager.is_superuser = True
+        self.manager.save()
+        self.client.force_login(self.manager)
+
+    def test_department_list_is_cached_until_a_department_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            department = GroupSpec.objects.create(name='Physics', description='')
+        self.assertContains(self.client.get(reverse('department')), 'Physics')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('department'))
+        self.assertFalse([query for query in queries if 'teacher_groupspec' in query['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            department.name = 'Chemistry'
+            department.save()
+        response = self.client.get(reverse('department'))
+        self.assertContains(response, 'Chemistry')
+        self.assertNotContains(response, 'Physics')
+
+
+class VisibleToTest(TestCase):
+    """Teachers see the students and lessons of their own groups, matched by id and without duplicates."""
+
+    def setUp(self):
+        # Roles are cached per user id and ids come back after every test's rollback
+        cache.clear()
+        role = GroupType.objects.create(name='Teacher')
+        spec = GroupSpec.objects.create(name='Spec', description='')
+        # Same first name on purpose
+        self.first, self.second = [
+            Teacher.objects.create_user(first_name='Anna', last_name=name, email=f'{name}@example.com', phone=name)
+            for name in ('A', 'B')
+        ]
+        role.user_set.add(self.first, self.second)
+        self.manager = Teacher.objects.create_user(first_name='Admin', last_name='Admin', email='admin@example.com', phone='0')
+        morning, evening, other = [
+            Group.objects.create(name=spec, teacher=teacher, description='')
+            for teacher in (self.first, self.first, self.second)
+        ]
+        self.both = Student.objects.create(first_name='S', last_name='1', email='s1@example.com', phone='1', address='')
+        self.both.group.add(morning, evening)
+        Student.objects.create(first_name='S', last_name='2', email='s2@example.com', phone='2', address='').group.add(other)
+        Lesson.objects.create(theme='Morning', date=datetime.date(2025, 1, 1), description='', group=morning)
+        Lesson.objects.create(theme='Other', date=datetime.date(2025, 1, 1), description='', group=other)
+
+    def test_teacher_sees_only_own_groups(self):
+        self.assertEqual(list(Student.objects.visible_to(self.first)), [self.both])
+        self.assertEqual(list(Lesson.objects.visible_to(self.first).values_list('theme', flat=True)), ['Morning'])
+        self.assertEqual(Student.objects.visible_to(self.second).count(), 1)
+
+    def test_manager_sees_everything(self):
+        self.assertEqual(Student.objects.visible_to(self.manager).count(), 2)
+        self.assertEqual(Lesson.objects.visible_to(self.manager).count(), 2)
+
+
+
+class RolesCacheTest(TestCase):
+    """Cached roles follow permission changes and a process-local cache is reported."""
+
+    def setUp(self):
+        cache.clear()
+        self.role = GroupType.objects.create(name='Teacher')
+        self.permission = Permission.objects.get(codename='view_lesson')
+        self.role.permissions.add(self.permission)
+        self.teacher = Teacher.objects.create_user(first_name='T', last_name='A', email='a@example.com', phone='1')
+        self.role.user_set.add(self.teacher)
+        self.client.force_login(self.teacher)
+
+    def test_revoked_permission_is_denied_on_the_next_request(self):
+        self.assertEqual(self.client.get(reverse('all_lessons')).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.role.permissions.remove(self.permission)
+        self.assertEqual(self.client.get(reverse('all_lessons')).status_code, 403)
+
+    def test_process_local_cache_is_reported(self):
+        self.assertEqual(check_shared_cache(None), [])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([message.id for message in check_shared_cache(None)], ['teacher.W001'])
+
+
+class ScopedViewsTest(TestCase):
+    """Teachers cannot read or write the lessons, students and courses of other teachers' groups."""
+
+    def setUp(self):
+        cache.clear()
+        role = GroupType.objects.create(name='Teacher')
+        role.permissions.add(*Permission.objects.filter(content_type__app_label='teacher'))
+        spec = GroupSpec.objects.create(name='Spec', description='')
+        self.teacher, self.other = [
+            Teacher.objects.create_user(first_name='T', last_name=name, email=f'{name}@example.com', phone=name)
+            for name in ('A', 'B')
+        ]
+        role.user_set.add(self.teacher, self.other)
+        (self.group, self.lesson, self.student), (self.foreign_group, self.foreign_lesson, self.foreign_student) = [
+            self.school(spec, teacher) for teacher in (self.teacher, self.other)
+        ]
+        self.client.force_login(self.teacher)
+        self.headers = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=self.teacher).key}'}
+
+    def school(self, spec, teacher):
+        group = Group.objects.create(name=spec, teacher=teacher, description='', course_code=teacher.last_name, price=1000)
+        lesson = Lesson.objects.create(theme='Lesson', date=datetime.date(2025, 1, 1), description='', group=group)
+        student = Student.objects.create(first_name='S', last_name=teacher.last_name, email=f's{teacher.id}@example.com', phone='1', address='')
+        student.group.add(group)
+        return group, lesson, student
+
+    def test_html_views(self):
+        pages = [
+            ('attendance', self.lesson, self.foreign_lesson),
+            ('edit_lesson', self.lesson, self.foreign_lesson),
+            ('student_profile', self.student, self.foreign_student),
+            ('edit_student', self.student, self.foreign_student),
+            ('about_course', self.group, self.foreign_group),
+            ('view_course', self.group, self.foreign_group),
+        ]
+        for name, own, foreign in pages:
+            self.assertEqual(self.client.get(reverse(name, args=[own.id])).status_code, 200, name)
+            self.assertEqual(self.client.get(reverse(name, args=[foreign.id])).status_code, 404, name)
+        response = self.client.post(reverse('edit_lesson', args=[self.lesson.id]), {
+            'theme': 'Moved', 'date': '2025-01-02', 'description': '', 'group': self.foreign_group.id,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.lesson.refresh_from_db()
+        self.assertEqual(self.lesson.group, self.group)
+        export = self.client.get(reverse('export_gradebook'), {'group': self.foreign_group.id})
+        self.assertEqual(b''.join(export.streaming_content), b'')
+
+    def test_rest_writes(self):
+        def post(name, data):
+            return self.client.post(reverse(name), data, content_type='application/json', **self.headers)
+
+        self.assertEqual(post('attendance-list', {'lesson': self.lesson.id, 'student': self.student.id}).status_code, 201)
+        self.assertEqual(post('attendance-list', {'lesson': self.foreign_lesson.id, 'student': self.student.id}).status_code, 400)
+        self.assertEqual(post('attendance-bulk', [{'lesson': self.lesson.id, 'student': self.foreign_student.id}]).status_code, 400)
+        self.assertEqual(post('lessons-list', {'theme': 'New', 'date': '2025-01-02', 'description': '', 'group': self.foreign_group.id}).status_code, 400)
+        response = self.client.patch(
+            reverse('lessons-detail', args=[self.lesson.id]), {'group': self.foreign_group.id}, content_type='application/json', **self.headers,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Score_Attendance.objects.filter(lesson=self.foreign_lesson).exists())
+
+    def test_memberships_of_other_teachers_stay(self):
+        second = Group.objects.create(name=self.group.name, teacher=self.teacher, description='', course_code='A2', price=1000)
+        self.student.group.add(self.foreign_group)
+
+        def groups():
+            return set(self.student.group.values_list('id', flat=True))
+
+        def patch(name, data, *args):
+            return self.client.patch(reverse(name, args=args), data, content_type='application/json', **self.headers)
+
+        self.assertEqual(patch('students-detail', {'group': [second.id]}, self.student.id).status_code, 200)
+        self.assertEqual(groups(), {second.id, self.foreign_group.id})
+        self.assertEqual(patch('students-bulk', [{'id': self.student.id, 'group': [self.group.id]}]).status_code, 200)
+        self.assertEqual(groups(), {self.group.id, self.foreign_group.id})
+
+        form = {'first_name': 'S', 'last_name': 'A', 'email': 's@example.com', 'phone': '90 123 45 67', 'address': 'Street', 'gender': '1'}
+        response = self.client.post(reverse('edit_student', args=[self.student.id]), {**form, 'group': [self.foreign_group.id]})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('edit_student', args=[self.student.id]), {**form, 'group': [second.id]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(groups(), {second.id, self.foreign_group.id})
+
+    def test_group_teacher(self):
+        data = {'name': self.group.name_id, 'course_code': 'New', 'description': 'New', 'price': 1000}
+        response = self.client.post(reverse('groups-list'), {**data, 'teacher': self.other.id}, content_type='application/json', **self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('groups-list'), {**data, 'teacher': self.teacher.id}, content_type='application/json', **self.headers)
+        self.assertEqual(response.status_code, 201)
+        response = self.client.patch(
+            reverse('groups-detail', args=[self.group.id]), {'teacher': self.other.id}, content_type='application/json', **self.headers,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.teacher, self.teacher)
+
+
+class SearchTest(TestCase):
+    """The full-text index follows every save and finds names by prefix and phones by their digits."""
+
+    def setUp(self):
+        cache.clear()
+        self.manager = Teacher.objects.create_user(first_name='Admin', last_name='Admin', email='admin@example.com', phone='0')
+        self.student = Student.objects.create(
+            first_name='Alisher', last_name='Navoiy', email='alisher@example.com', phone='+998 90 123-45-67', address='',
+        )
+
+    def titles(self, query):
+        return [result['title'] for result in search(self.manager, query)]
+
+    def test_prefix_and_phone_digits(self):
+        self.assertEqual(self.titles('ali nav'), ['Alisher Navoiy'])
+        self.assertEqual(self.titles('99890123'), ['Alisher Navoiy'])
+        self.assertEqual(self.titles('") OR *'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.student.last_name = 'Temur'
+        self.student.save()
+        self.assertEqual(self.titles('temur'), ['Alisher Temur'])
+        self.assertEqual(self.titles('navoiy'), [])
+        self.student.delete()
+        self.assertEqual(self.titles('alisher'), [])
+
+
+class AttendanceGridTest(TestCase):
+    """The attendance grid pins the students of the sheet and lists no other students or lessons."""
+
+    def setUp(self):
+        cache.clear()
+        self.manager = Teacher.objects.create_user(first_name='Admin', last_name='Admin', email='admin@example.com', phone='0')
+        self.client.force_login(self.manager)
+        spec = GroupSpec.objects.create(name='Spec', description='')
+        group, other = [Group.objects.create(name=spec, teacher=self.manager, description='') for _ in range(2)]
+        self.lesson = Lesson.objects.create(theme='Lesson', date=datetime.date(2025, 1, 1), description='', group=group)
+        self.student = Student.objects.create(first_name='S', last_name='1', email='s1@example.com', phone='1', address='')
+        self.student.group.add(group)
+        self.stranger = Student.objects.create(first_name='S', last_name='2', email='s2@example.com', phone='2', address='')
+        self.stranger.group.add(other)
+
+    def post(self, student_id, mark):
+        return self.client.post(reverse('attendance', args=[self.lesson.id]), {
+            'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '1',
+            'form-0-student': str(student_id), 'form-0-mark': mark, 'form-0-is_present': 'on',
+        })
+
+    def test_grid_saves_only_students_of_the_sheet(self):
+        response = self.client.get(reverse('attendance', args=[self.lesson.id]))
+        self.assertNotContains(response, '<select')
+        self.assertEqual(self.post(self.stranger.id, '9').status_code, 200)
+        self.assertFalse(Score_Attendance.objects.filter(student=self.stranger).exists())
+        self.assertEqual(self.post(self.student.id, '8.5').status_code, 302)
+        row = Score_Attendance.objects.get(lesson=self.lesson, student=self.student)
+        self.assertEqual((row.mark, row.is_present), (8.5, True))
+
+
+
+class AttendanceBulkTest(TestCase):
+    """The JSON attendance endpoint needs the change permission and only takes the teacher's own lessons."""
+
+    def setUp(self):
+        cache.clear()
+        role = GroupType.objects.create(name='Teacher')
+        spec = GroupSpec.objects.create(name='Spec', description='')
+        self.teacher, other = [
+            Teacher.objects.create_user(first_name='T', last_name=name, email=f'{name}@example.com', phone=name)
+            for name in ('A', 'B')
+        ]
+        role.user_set.add(self.teacher, other)
+        self.own, self.foreign = [
+            Lesson.objects.create(theme='Lesson', date=datetime.date(2025, 1, 1), description='',
+                                  group=Group.objects.create(name=spec, teacher=teacher, description=''))
+            for teacher in (self.teacher, other)
+        ]
+        self.client.force_login(self.teacher)
+
+    def post(self, lesson):
+        return self.client.post(reverse('attendance_bulk', args=[lesson.id]), {'rows': []}, content_type='application/json')
+
+    def test_permission_and_scope(self):
+        self.assertEqual(self.post(self.own).status_code, 403)
+        with self.captureOnCommitCallbacks(execute=True):
+            GroupType.objects.get(name='Teacher').permissions.add(Permission.objects.get(codename='change_score_attendance'))
+        self.assertEqual(self.post(self.foreign).status_code, 404)
+        self.assertEqual(self.post(self.own).json(), {'updated': 0})
+
+
+class BulkAttendanceAPITest(TestCase):
+    """PATCH attendance/bulk/ costs the same queries for any number of rows and stamps updated_at."""
+
+    def setUp(self):
+        cache.clear()
+        self.manager = Teacher.objects.create_user(first_name='Admin', last_name='Admin', email='admin@example.com', phone='0')
+        self.manager.is_superuser = True
+        self.manager.save()
+        self.headers = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=self.manager).key}'}
+        spec = GroupSpec.objects.create(name='Spec', description='')
+        self.lesson = Lesson.objects.create(theme='Lesson', date=datetime.date(2025, 1, 1), description='',
+                                            group=Group.objects.create(name=spec, teacher=self.manager, description=''))
+        students = Student.objects.bulk_create(
+            Student(first_name='S', last_name=str(i), email=f's{i}@example.com', phone=str(i), address='') for i in range(10)
+        )
+        self.rows = Score_Attendance.objects.bulk_create(Score_Attendance(lesson=self.lesson, student=student) for student in students)
+
+    def patch(self, items):
+        return self.client.patch(reverse('attendance-bulk'), items, content_type='application/json', **self.headers)
+
+    def count_queries(self, rows):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch([{'id': row.id, 'mark': '7.5', 'lesson': self.lesson.id, 'student': row.student_id} for row in rows])
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_patch(self):
+        # The first request caches the roles
+        self.count_queries(self.rows[:1])
+        self.assertEqual(self.count_queries(self.rows[:2]), self.count_queries(self.rows))
+        before = self.rows[0].updated_at
+        self.patch([{'id': self.rows[0].id, 'mark': '9'}])
+        self.rows[0].refresh_from_db()
+        self.assertGreater(self.rows[0].updated_at, before)
+        self.assertEqual(self.patch([{'id': self.rows[0].id, 'mark': '1'}, {'id': self.rows[0].id, 'mark': '2'}]).status_code, 400)
+
+
+class StudentImportTest(TestCase):
+    """The import inserts the valid rows chunk by chunk with their groups and reports the others by row."""
+
+    CSV = (
+        'first_name,last_name,email,phone,address,education,gender,birthday,group\n'
+        'Ali,Valiyev,ali@example.com,+998 90 123-45-67,Tashkent,School,male,2001-02-03,py1\n'
+        'Bad,Phone,bad@example.com,12,Tashkent,School,male,2001-02-03,PY1\n'
+        'No,Group,nogroup@example.com,+998 90 123-45-68,Tashkent,School,female,2001-02-03,JS9\n'
+        'Ali,Again,ALI@example.com,+998 90 123-45-69,Tashkent,School,male,2001-02-03,PY1\n'
+        'Old,Student,old@example.com,+998 90 123-45-70,Tashkent,School,female,2001-02-03,\n'
+        'Vali,Aliyev,vali@example.com,+998 90 123-45-71,Tashkent,School,f,2001-02-03,PY1; Python\n'
+    )
+
+    def test_import(self):
+        spec = GroupSpec.objects.create(name='Python', description='')
+        group = Group.objects.create(name=spec, description='', course_code='PY1')
+        Student.objects.create(first_name='Old', last_name='Student', email='Old@example.com', phone='1', address='')
+
+        importer = StudentImporter(chunk_size=1).run(read_rows(BytesIO(self.CSV.encode()), 'students.csv'))
+
+        self.assertEqual(importer.created, 2)
+        self.assertEqual([number for number, _ in importer.errors], [3, 4, 5, 6])
+        imported = Student.objects.filter(email__in=['ali@example.com', 'vali@example.com']).order_by('id')
+        self.assertEqual([(student.first_name, student.gender) for student in imported], [('Ali', '1'), ('Vali', '2')])
+        self.assertEqual(
+            list(Student.group.through.objects.filter(student__in=imported).values_list('group_id', flat=True)), [group.id, group.id],
+        )
+
+
+class GradebookTest(TestCase):
+    """The stored statistics match an aggregate of the rows after marks, new sheets, enrollment changes and deletes."""
+
+    def setUp(self):
+        spec = GroupSpec.objects.create(name='Spec', description='')
+        self.group = Group.objects.create(name=spec, description='')
+        self.a, self.b, self.c = Student.objects.bulk_create(
+            Student(first_name='S', last_name=name, email=f'{name}@example.com', phone=name, address='') for name in 'abc'
+        )
+        self.group.student_set.add(self.a, self.b, self.c)
+        self.first, self.second, self.third = [
+            Lesson.objects.create(theme=str(day), date=datetime.date(2025, 1, day), description='', group=self.group)
+            for day in (1, 2, 3)
+        ]
+
+    def mark(self, lesson, marks):
+        save_attendance_marks(lesson, {
+            student.id: {'mark': None if mark is None else Decimal(mark), 'is_present': mark is not None}
+            for student, mark in marks.items()
+        })
+
+    def expected(self):
+        """Student and group numbers computed in Python from the rows that count."""
+        enrolled = set(self.group.student_set.values_list('id', flat=True))
+        rows = [row for row in Score_Attendance.objects.filter(lesson__group=self.group) if row.student_id in enrolled]
+
+        def numbers(rows):
+            marks = [row.mark for row in rows if row.mark is not None]
+            present = sum(row.is_present for row in rows)
+            mark_avg = sum(marks) / len(marks) if marks else None
+            return len(rows), present, marks, mark_avg, (Decimal(present) * 100 / len(rows)).quantize(Decimal('0.01'))
+
+        def rounded(value):
+            return None if value is None else value.quantize(Decimal('0.01'))
+
+        students = {student_id: numbers([row for row in rows if row.student_id == student_id]) for student_id in {row.student_id for row in rows}}
+        averages = [mark_avg for *_, mark_avg, _ in students.values() if mark_avg is not None]
+        expected_students = {
+            student_id: (total, present, len(marks), rounded(mark_avg), attendance_rate,
+                         None if mark_avg is None else 1 + sum(other > mark_avg for other in averages))
+            for student_id, (total, present, marks, mark_avg, attendance_rate) in students.items()
+        }
+        *_, mark_avg, attendance_rate = numbers(rows)
+        expected_group = (len(students), len({row.lesson_id for row in rows}), rounded(mark_avg), attendance_rate)
+        return expected_students, expected_group
+
+    def stored(self):
+        students = {
+            stat.student_id: (stat.lessons, stat.present, stat.marked, stat.mark_avg, stat.attendance_rate, stat.rank)
+            for stat in StudentStats.objects.filter(group=self.group)
+        }
+        stat = GroupStats.objects.get(group=self.group)
+        return students, (stat.students, stat.lessons, stat.mark_avg, stat.attendance_rate)
+
+    def test_stats_follow_writes(self):
+        self.mark(self.first, {self.a: '9', self.b: '7', self.c: None})
+        self.mark(self.second, {self.a: '8', self.b: '9', self.c: '9.5'})
+        self.assertEqual(self.stored(), self.expected())
+        self.assertEqual(
+            dict(StudentStats.objects.filter(group=self.group).values_list('student_id', 'rank')),
+            {self.c.id: 1, self.a.id: 2, self.b.id: 3},
+        )
+
+        # Opening a sheet adds present, unmarked rows
+        self.client.force_login(Teacher.objects.create_user(first_name='A', last_name='A', email='admin@example.com', phone='0'))
+        self.client.get(reverse('attendance', args=[self.third.id]))
+        self.assertEqual(self.stored(), self.expected())
+
+        self.group.student_set.remove(self.c)
+        self.assertEqual(self.stored(), self.expected())
+        self.second.delete()
+        self.assertEqual(self.stored(), self.expected())
+        self.a.delete()
+        self.assertEqual(self.stored(), self.expected())
+        self.b.group.clear()
+        self.assertEqual(self.stored(), ({}, (0, 0, None, None)))
+
+    def test_bulk_enrollment(self):
+        self.mark(self.first, {self.a: '9', self.b: '7', self.c: '5'})
+        other = Group.objects.create(name=self.group.name, description='')
+        admin = Teacher.objects.create_superuser(first_name='A', last_name='A', email='admin@example.com', password='password')
+        before = get_versions('students', 'groups')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('students-bulk'), [{'id': self.c.id, 'group': [other.id]}], content_type='application/json',
+                HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=admin).key}',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stored(), self.expected())
+        self.assertNotIn(self.c.id, self.stored()[0])
+        after = get_versions('students', 'groups')
+        self.assertTrue(all(after[namespace] != before[namespace] for namespace in after))
+
+
+class ThumbnailsTest(TestCase):
+    """Thumbnails follow photo replacements and unreadable originals fall back to the original URL."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, TASKS_EAGER=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def photo(self, name):
+        output = BytesIO()
+        Image.new('RGB', (120, 90), 'red').save(output, 'PNG')
+        return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+
+    def test_replaced_photo_and_decompression_bomb(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            student = Student.objects.create(
+                first_name='S', last_name='1', email='s1@example.com', phone='1', address='', profile_photo=self.photo('a.png'),
+            )
+        first = student.profile_photo.name
+        storage = student.profile_photo.storage
+        self.assertTrue(storage.exists(thumbnail_name(first, 'small', 'jpeg')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.profile_photo = self.photo('b.png')
+            student.save()
+        self.assertFalse(storage.exists(thumbnail_name(first, 'small', 'jpeg')))
+        self.assertTrue(storage.exists(thumbnail_name(student.profile_photo.name, 'small', 'jpeg')))
+
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 100):
+            self.assertEqual(thumbnail_url(student.profile_photo, 'large'), student.profile_photo.url)
+
+    def test_concurrent_render_leaves_one_file(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            student = Student.objects.create(
+                first_name='S', last_name='1', email='s1@example.com', phone='1', address='', profile_photo=self.photo('a.png'),
+            )
+        storage = student.profile_photo.storage
+        name = thumbnail_name(student.profile_photo.name, 'small', 'webp')
+        # Both workers saw no thumbnail, the other one saved it first
+        exists, answers = FileSystemStorage.exists, [False, False]
+        with mock.patch.object(FileSystemStorage, 'exists', lambda self, name: answers.pop() if answers else exists(self, name)):
+            self.assertEqual(make_thumbnail(student.profile_photo, 'small', 'webp'), name)
+        directory, file_name = os.path.split(name)
+        self.assertEqual([name for name in storage.listdir(directory)[1] if name.endswith('.webp')], [file_name])
+
+
+class MediaViewTest(TestCase):
+    """The media view answers ranges, revalidation and If-Range like RFC 9110 and hides other teachers' lesson files."""
+
+    CONTENT = bytes(range(256)) * 4
+
+    def setUp(self):
+        cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, MEDIA_SENDFILE=None)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        role = GroupType.objects.create(name='Teacher')
+        spec = GroupSpec.objects.create(name='Spec', description='')
+        self.teacher, other = [
+            Teacher.objects.create_user(first_name='T', last_name=name, email=f'{name}@example.com', phone=name)
+            for name in ('A', 'B')
+        ]
+        role.user_set.add(self.teacher, other)
+        self.own, self.foreign = [
+            LessonFiles.objects.create(file=ContentFile(self.CONTENT + name.encode(), name=f'{name}.bin'), lesson=Lesson.objects.create(
+                theme='Lesson', date=datetime.date(2025, 1, 1), description='',
+                group=Group.objects.create(name=spec, teacher=teacher, description=''),
+            ))
+            for name, teacher in (('own', self.teacher), ('foreign', other))
+        ]
+        self.size = len(self.CONTENT) + 3
+        self.client.force_login(self.teacher)
+
+    def get(self, lesson_file, **headers):
+        response = self.client.get(lesson_file.file.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_ranges(self):
+        full = self.CONTENT + b'own'
+        response, body = self.get(self.own)
+        self.assertEqual((response.status_code, body), (200, full))
+        etag = response['ETag']
+
+        response, body = self.get(self.own, HTTP_RANGE='bytes=-500')
+        self.assertEqual(
+            (response.status_code, body, response['Content-Range']),
+            (206, full[-500:], f'bytes {self.size - 500}-{self.size - 1}/{self.size}'),
+        )
+        response, body = self.get(self.own, HTTP_RANGE='bytes=1000-')
+        self.assertEqual((response.status_code, body), (206, full[1000:]))
+        response, body = self.get(self.own, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, body), (206, full[10:20]))
+
+        response, _ = self.get(self.own, HTTP_RANGE=f'bytes={self.size}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{self.size}'))
+        # Several ranges and stale If-Range get the whole file
+        response, body = self.get(self.own, HTTP_RANGE='bytes=0-1,5-6')
+        self.assertEqual((response.status_code, body), (200, full))
+        response, body = self.get(self.own, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, full))
+
+    def test_revalidation_and_access(self):
+        etag = self.get(self.own)[0]['ETag']
+        self.assertEqual(self.get(self.own, HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+        self.assertEqual(self.client.get(self.foreign.file.url).status_code, 404)
+        # Other spellings of the name must not get past the access check
+        media_url = self.foreign.file.url[:-len(self.foreign.file.name)]
+        for name in (f'./{self.foreign.file.name}', f'photos/../{self.foreign.file.name}', f'lessons//{self.foreign.file.name[8:]}'):
+            self.assertEqual(self.client.get(media_url + name).status_code, 404, name)
+        self.assertEqual(self.client.get(media_url + f'./{self.own.file.name}').status_code, 404)
+        self.assertFalse(can_read(self.teacher, self.foreign.file.name))
+        self.assertTrue(can_read(self.teacher, self.own.file.name))
+
+
+class UploadsTest(TestCase):
+    """Chunks can come in any order and twice, the checksum guards the result and a finished upload stays finished."""
+
+    CONTENT = b'0123456789' * 3 + b'xy'
+
+    def setUp(self):
+        media, parts = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(parts.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name, LESSON_UPLOAD_DIR=parts.name, TASKS_EAGER=False)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        role = GroupType.objects.create(name='Teacher')
+        spec = GroupSpec.objects.create(name='Spec', description='')
+        (self.teacher, self.lesson), (self.other, self.other_lesson) = [
+            (teacher, Lesson.objects.create(
+                theme='Lesson', date=datetime.date(2025, 1, 1), description='',
+                group=Group.objects.create(name=spec, teacher=teacher, description=''),
+            ))
+            for teacher in (
+                Teacher.objects.create_user(first_name='T', last_name=name, email=f'{name}@example.com', phone=name)
+                for name in ('A', 'B')
+            )
+        ]
+        role.user_set.add(self.teacher, self.other)
+
+    def start(self, sha256=None, lesson=None, user=None):
+        sha256 = sha256 or hashlib.sha256(self.CONTENT).hexdigest()
+        return start_upload(lesson or self.lesson, user or self.teacher, 'slides.pdf', len(self.CONTENT), sha256, chunk_size=10)
+
+    def send(self, upload, *numbers):
+        for number in numbers:
+            upload = write_chunk(upload, number, BytesIO(self.CONTENT[number * 10:number * 10 + 10]))
+        return upload
+
+    def test_chunks_in_any_order(self):
+        upload = self.send(self.start(), 3, 1, 1)
+        self.assertEqual(upload.received, [1, 3])
+        with self.assertRaisesMessage(ValidationError, 'Missing chunks: 0, 2.'):
+            finalize_upload(upload)
+        with self.assertRaisesMessage(ValidationError, 'Chunk 3 must be 2 bytes, got 3.'):
+            write_chunk(upload, 3, BytesIO(b'xyz'))
+
+        upload = self.send(upload, 2, 0, 3)
+        lesson_file = finalize_upload(upload)
+        with lesson_file.file.open('rb') as file:
+            self.assertEqual(file.read(), self.CONTENT)
+        self.assertFalse(LessonUpload.objects.exists())
+        # A second finalize of the same upload gets the same file instead of an error or a duplicate
+        self.assertEqual(finalize_upload(upload), lesson_file)
+        self.assertEqual(LessonFiles.objects.count(), 1)
+
+    def test_checksum_mismatch(self):
+        upload = self.send(self.start(sha256='0' * 64), 0, 1, 2, 3)
+        with self.assertRaisesMessage(ValidationError, 'Checksum mismatch'):
+            finalize_upload(upload)
+        self.assertFalse(LessonUpload.objects.exists())
+        self.assertFalse(LessonFiles.objects.exists())
+        with self.assertRaisesMessage(ValidationError, 'cancelled or has expired'):
+            finalize_upload(upload)
+
+    def test_attach_existing(self):
+        sha256 = hashlib.sha256(self.CONTENT).hexdigest()
+        foreign = finalize_upload(self.send(self.start(lesson=self.other_lesson, user=self.other), 0, 1, 2, 3))
+        # The checksum of another teacher's file attaches nothing, the content has to be sent
+        self.assertIsNone(attach_existing(self.lesson, 'slides.pdf', sha256, self.teacher))
+
+        own = finalize_upload(self.send(self.start(), 0, 1, 2, 3))
+        self.assertEqual(own.file.name, foreign.file.name)
+        shared = attach_existing(self.lesson, 'copy.pdf', sha256.upper(), self.teacher)
+        self.assertEqual((shared.name, shared.file.name), ('copy.pdf', own.file.name))
+
+    def test_expiry(self):
+        upload = self.start()
+        self.assertTrue(Task.objects.filter(key=f'expire:{upload.id}', run_at__gt=timezone.now()).exists())
+        # Chunks arrived since, the task only looks again later
+        expire_upload(upload_id=str(upload.id))
+        self.assertTrue(LessonUpload.objects.filter(pk=upload.pk).exists())
+
+        LessonUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now() - EXPIRY)
+        expire_upload(upload_id=str(upload.id))
+        self.assertFalse(LessonUpload.objects.filter(pk=upload.pk).exists())
+        self.assertFalse(os.path.exists(part_path(upload)))
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTest(TestCase):
+    """Workers never run a task twice at once, failed tasks are retried with backoff and a key is pending once."""
+
+    def setUp(self):
+        done.clear()
+
+    def make_due(self, *tasks):
+        Task.objects.filter(pk__in=[current.pk for current in tasks]).update(run_at=timezone.now())
+
+    def test_run_pending(self):
+        succeeding = succeed.enqueue(key='succeed', value=1)
+        self.assertEqual(succeed.enqueue(key='succeed', value=2), succeeding)
+        failing = fail.enqueue()
+
+        with self.assertLogs('teacher.tasks', 'ERROR'):
+            self.assertEqual(run_pending(), (1, 1))
+        self.assertEqual(done, [1])
+        self.assertFalse(Task.objects.filter(pk=succeeding.pk).exists())
+
+        # Retried after retry_delay, then twice that, then kept as failed
+        for attempts, delay in ((1, 10), (2, 20)):
+            failing.refresh_from_db()
+            self.assertEqual((failing.status, failing.attempts, failing.locked_until), (Task.PENDING, attempts, None))
+            self.assertIn('RuntimeError: Task failed', failing.last_error)
+            self.assertAlmostEqual((failing.run_at - failing.updated_at).total_seconds(), delay, delta=1)
+            self.assertEqual(run_pending(), (0, 0))
+            self.make_due(failing)
+            with self.assertLogs('teacher.tasks', 'ERROR'):
+                self.assertEqual(run_pending(), (0, 1))
+        failing.refresh_from_db()
+        self.assertEqual((failing.status, failing.attempts), (Task.FAILED, 3))
+        self.assertEqual(run_pending(), (0, 0))
+
+    def test_claim_and_lease(self):
+        current = succeed.enqueue(value=1)
+        self.assertEqual(claim(10), [current])
+        self.assertEqual(claim(10), [])
+
+        # The worker died, once its lease is over another one takes the task
+        Task.objects.filter(pk=current.pk).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        taken = claim(10)
+        self.assertEqual([(task.pk, task.attempts) for task in taken], [(current.pk, 2)])
+        self.assertTrue(execute(taken[0]))
+        self.assertFalse(Task.objects.exists())
+
+        # A task that kills its worker on every attempt ends up failed
+        current = succeed.enqueue(value=2)
+        for attempts in (1, 2, 3):
+            self.assertEqual([task.attempts for task in claim(10)], [attempts])
+            Task.objects.filter(pk=current.pk).update(locked_until=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(claim(10), [])
+        current.refresh_from_db()
+        self.assertEqual((current.status, current.attempts, current.locked_until), (Task.FAILED, 3, None))
+        self.assertIn('The worker stopped', current.last_error)
+
+    def test_failure_with_pending_duplicate(self):
+        enqueue('tests.fail', key='fail')
+        running = claim(10)[0]
+        # The key is free while the task runs, the same work is enqueued again
+        pending = enqueue('tests.fail', key='fail')
+        self.assertNotEqual(pending.pk, running.pk)
+
+        with self.assertLogs('teacher.tasks', 'ERROR'):
+            self.assertFalse(execute(running))
+        self.assertEqual(list(Task.objects.values_list('pk', 'status', 'attempts')), [(pending.pk, Task.PENDING, 0)])
+
+
+class AutocompleteTest(TestCase):
+    """The autocomplete view matches word prefixes and only shows teachers their own groups."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = Teacher.objects.create_user(first_name='Ali', last_name='Karimov', email='ali@example.com', phone='1')
+        role = GroupType.objects.create(name='Teacher')
+        role.user_set.add(self.teacher)
+        role.permissions.add(Permission.objects.get(codename='add_lesson'))
+        spec = GroupSpec.objects.create(name='Python', description='')
+        Group.objects.create(name=spec, teacher=self.teacher, description='', course_code='PY1')
+        Group.objects.create(name=spec, description='', course_code='PY2')
+
+    def results(self, source, query):
+        response = self.client.get(reverse('autocomplete', args=[source]), {'q': query})
+        return [result['text'] for result in response.json()['results']]
+
+    def test_prefix_match_and_scope(self):
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.results('groups', 'pyt'), ['Python PY1'])
+        # Only the users filling in course forms pick teachers
+        self.assertEqual(self.client.get(reverse('autocomplete', args=['teachers']), {'q': 'a'}).status_code, 403)
+
+        self.client.force_login(Teacher.objects.create_superuser(first_name='A', last_name='A', email='admin@example.com', password='password'))
+        self.assertEqual(self.results('teachers', 'ali kar'), ['Ali Karimov'])
+        self.assertEqual(self.results('teachers', 'kari ali x'), [])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeedSchoolTest(TestCase):
+    """seed_school fills every table and the same seed gives the same school."""
+
+    def seed(self):
+        call_command('seed_school', students=30, groups=3, lessons_per_group=2, seed=7, stdout=StringIO())
+
+    def test_seed_is_complete_and_deterministic(self):
+        self.seed()
+        first = list(Student.objects.order_by('id').values_list('first_name', flat=True))
+        enrollments = Student.group.through.objects.count()
+        self.assertEqual(len(first), 30)
+        self.assertEqual(Lesson.objects.count(), 6)
+        self.assertEqual(Score_Attendance.objects.count(), enrollments * 2)
+        self.assertTrue(self.client.login(email=Teacher.objects.first().email, password='password'))
+        self.seed()
+        self.assertEqual(list(Student.objects.order_by('id').values_list('first_name', flat=True)[30:]), first)
+
+
+class BenchmarkTest(TestCase):
+    """The benchmark covers every named route and compare() reports what got worse."""
+
+    def test_routes_cover_urls(self):
+        self.assertEqual(benchmark.url_names() - {route.url_name for route in benchmark.ROUTES}, set())
+
+    def test_compare(self):
+        old = {'status': 200, 'p50_ms': 10.0, 'queries': 5, 'bytes': 10000}
+        baseline = {'sizes': {'small': {'routes': {'groups': old, 'gone': old}}}}
+        results = {'sizes': {'small': {'routes': {
+            'groups': {**old, 'p50_ms': 11.0, 'queries': 6, 'bytes': 20000},
+            'new': {**old, 'status': 500},
+        }}}}
+        self.assertEqual(benchmark.compare(results, baseline), [
+            'small groups: 5 -> 6 queries',
+            'small groups: 10000 -> 20000 bytes',
+        ])
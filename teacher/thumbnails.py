@@ -0,0 +1,127 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+# name -> (width, height, crop), small and medium are square avatars, large keeps the aspect ratio
+SIZES = {
+    'small': (80, 80, True),
+    'medium': (200, 200, True),
+    'large': (800, 600, False),
+}
+
+# format -> (Pillow format, extension, save options)
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+THUMBNAIL_DIR = 'thumbs'
+
+# What reading an original that is missing, not an image or too large to decode raises,
+# DecompressionBombError is not an OSError
+UNREADABLE = (OSError, ValueError, Image.DecompressionBombError)
+
+
+def thumbnail_name(name, size, fmt):
+    """
+    Storage name of a thumbnail, the hash of the source name and the size keeps it unique per variant.
+
+    :param name: str, storage name of the original image
+    :param size: str, key of SIZES
+    :param fmt: str, key of FORMATS
+    :return: str
+    """
+    width, height, crop = SIZES[size]
+    digest = hashlib.sha1(f'{name}:{width}x{height}:{crop}'.encode()).hexdigest()[:12]
+    return f'{THUMBNAIL_DIR}/{size}/{os.path.splitext(name)[0]}.{digest}.{FORMATS[fmt][1]}'
+
+
+def render(file, size, fmt):
+    """
+    Resizes an image and encodes it again.
+
+    The EXIF orientation is applied to the pixels first, then the image is saved without any
+    metadata, so GPS positions and camera details of phone photos are not published.
+
+    :param file: file object of the original image
+    :param size: str, key of SIZES
+    :param fmt: str, key of FORMATS
+    :return: bytes
+    """
+    width, height, crop = SIZES[size]
+    pil_format, _, options = FORMATS[fmt]
+    with Image.open(file) as original:
+        image = ImageOps.exif_transpose(original)
+        if crop:
+            image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+        else:
+            image = image.copy()
+            image.thumbnail((width, height), Image.LANCZOS)
+
+    if image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA' if 'A' in image.mode or 'transparency' in image.info else 'RGB')
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        # JPEG has no alpha channel, put transparent images on white
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+
+    output = BytesIO()
+    image.save(output, pil_format, **options)
+    return output.getvalue()
+
+
+def make_thumbnail(field_file, size, fmt):
+    """
+    Returns the storage name of the thumbnail, rendering and saving it the first time.
+
+    :param field_file: FieldFile of an ImageField, must not be empty
+    :raises UNREADABLE: if the original is missing, is not an image or has too many pixels
+    """
+    name = thumbnail_name(field_file.name, size, fmt)
+    storage = field_file.storage
+    if not storage.exists(name):
+        with storage.open(field_file.name, 'rb') as file:
+            data = render(file, size, fmt)
+        if not storage.exists(name):
+            saved = storage.save(name, ContentFile(data))
+            if saved != name:
+                # Another worker saved the same thumbnail meanwhile, the storage gave this copy a free name
+                storage.delete(saved)
+    return name
+
+
+def make_thumbnails(field_file, sizes):
+    """Renders every format of the given sizes, used right after an upload."""
+    for size in sizes:
+        for fmt in FORMATS:
+            make_thumbnail(field_file, size, fmt)
+
+
+def delete_thumbnails(field_file):
+    """Removes every variant of an image, missing ones are skipped."""
+    for size in SIZES:
+        for fmt in FORMATS:
+            field_file.storage.delete(thumbnail_name(field_file.name, size, fmt))
+
+
+def thumbnail_url(field_file, size, fmt='jpeg'):
+    """
+    URL of the thumbnail, the thumbnail is rendered on first use if the upload did not create it.
+
+    Falls back to the URL of the original when it cannot be read as an image, a broken upload
+    must not break every page that lists it.
+
+    :param field_file: FieldFile of an ImageField
+    :return: str or None for an empty field
+    """
+    if not field_file:
+        return None
+    try:
+        return field_file.storage.url(make_thumbnail(field_file, size, fmt))
+    except UNREADABLE:
+        return field_file.url
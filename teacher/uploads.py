@@ -0,0 +1,212 @@
+import hashlib
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from teacher.models import LessonFiles, LessonUpload
+from teacher.storage import blob_name, lesson_files_storage
+from teacher.tasks import expire_upload
+
+
+BUFFER_SIZE = 64 * 1024
+
+# An upload that receives no chunk for this long is abandoned
+EXPIRY = timedelta(hours=24)
+
+
+def get_chunk_size():
+    return getattr(settings, 'LESSON_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+
+
+def get_max_size():
+    return getattr(settings, 'LESSON_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024)
+
+
+def part_path(upload):
+    """The file the chunks of an upload are written into, kept outside MEDIA_ROOT."""
+    return os.path.join(settings.LESSON_UPLOAD_DIR, f'{upload.id}.part')
+
+
+def attach_existing(lesson, file_name, sha256, user):
+    """
+    Attaches a file that is already stored to the lesson, nothing has to be uploaded.
+
+    Teachers share the same slides between many lessons, only the first upload transfers them.
+    Only a file the user can already see in one of their lessons is attached, a checksum alone
+    must neither hand out another teacher's file nor tell that it exists. Any other file is
+    uploaded and finalize_upload still stores the content once.
+
+    :param lesson: Lesson object
+    :param file_name: str, name of the file on the client
+    :param sha256: str, hex digest of the file
+    :param user: Teacher object
+    :return: LessonFiles object or None if the user has no file with this content
+    """
+    name = blob_name(sha256.lower(), file_name)
+    if not LessonFiles.objects.visible_to(user).filter(file=name).exists():
+        return None
+    if not lesson_files_storage.reuse(name):
+        return None
+    lesson_file = LessonFiles(lesson=lesson, name=os.path.basename(file_name))
+    lesson_file.file.name = name
+    lesson_file.save()
+    return lesson_file
+
+
+def start_upload(lesson, user, file_name, size, sha256, chunk_size=None):
+    """
+    Registers an upload and creates its part file with the final size.
+
+    The part file is sparse, so every chunk can be written at its own offset in any order
+    and a chunk sent twice simply overwrites itself.
+
+    :param lesson: Lesson object the file is attached to
+    :param user: Teacher object
+    :param file_name: str, name of the file on the client
+    :param size: int, size of the whole file in bytes
+    :param sha256: str, hex digest of the whole file, checked by finalize_upload
+    :param chunk_size: int, bytes per chunk, LESSON_UPLOAD_CHUNK_SIZE if None
+    :return: LessonUpload object
+    """
+    upload = LessonUpload.objects.create(
+        lesson=lesson,
+        user=user,
+        file_name=os.path.basename(file_name),
+        size=size,
+        chunk_size=chunk_size or get_chunk_size(),
+        sha256=sha256.lower(),
+    )
+    os.makedirs(settings.LESSON_UPLOAD_DIR, exist_ok=True)
+    with open(part_path(upload), 'wb') as part:
+        part.truncate(size)
+    expire_upload.enqueue(key=f'expire:{upload.id}', run_at=timezone.now() + EXPIRY, upload_id=str(upload.id))
+    return upload
+
+
+def write_chunk(upload, number, stream):
+    """
+    Writes one chunk of the request body at its offset of the part file.
+
+    The body is copied BUFFER_SIZE bytes at a time, a chunk is never held in memory as a whole.
+
+    :param upload: LessonUpload object
+    :param number: int, chunk number starting at 0
+    :param stream: file-like object with the chunk, usually the request
+    :return: LessonUpload object with the chunk marked as received
+    :raises ValidationError: if the number is out of range or the chunk has the wrong length
+    """
+    if not 0 <= number < upload.chunk_count:
+        raise ValidationError(f'Chunk number must be between 0 and {upload.chunk_count - 1}.')
+    expected = upload.chunk_length(number)
+    written = 0
+    with open(part_path(upload), 'r+b') as part:
+        part.seek(number * upload.chunk_size)
+        while written <= expected:
+            data = stream.read(min(BUFFER_SIZE, expected + 1 - written))
+            if not data:
+                break
+            part.write(data[:expected - written])
+            written += len(data)
+    if written != expected:
+        raise ValidationError(f'Chunk {number} must be {expected} bytes, got {written}.')
+
+    # Chunks of one upload can arrive in parallel, the row lock keeps every number in the list
+    with transaction.atomic():
+        upload = LessonUpload.objects.select_for_update().get(pk=upload.pk)
+        if number not in upload.received:
+            upload.received = sorted([*upload.received, number])
+            upload.save(update_fields=['received', 'updated_at'])
+    return upload
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for data in iter(lambda: file.read(BUFFER_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def finished_file(upload):
+    """
+    The lesson file a concurrent finalize_upload created for the upload.
+
+    :param upload: LessonUpload object, possibly deleted already
+    :return: LessonFiles object
+    :raises ValidationError: if the upload was cancelled or expired instead
+    """
+    lesson_file = (
+        LessonFiles.objects
+        .filter(lesson_id=upload.lesson_id, name=upload.file_name, file=blob_name(upload.sha256, upload.file_name))
+        .order_by('-id').first()
+    )
+    if lesson_file is None:
+        raise ValidationError('The upload was cancelled or has expired.')
+    return lesson_file
+
+
+def finalize_upload(upload):
+    """
+    Checks the whole file against the checksum and attaches it to the lesson.
+
+    A file that does not match is thrown away, the client has to start a new upload.
+    Requests finalizing the same upload at once wait for the row lock, the ones after the first
+    get the lesson file it created. SQLite takes no row locks, there the part file disappearing
+    under a request tells the same.
+
+    :param upload: LessonUpload object
+    :return: LessonFiles object
+    :raises ValidationError: if chunks are missing or the checksum does not match
+    """
+    with transaction.atomic():
+        current = LessonUpload.objects.select_for_update().filter(pk=upload.pk).first()
+        if current is None:
+            return finished_file(upload)
+        missing = current.missing
+        if missing:
+            raise ValidationError(f'Missing chunks: {", ".join(map(str, missing))}.')
+
+        path = part_path(current)
+        try:
+            valid = file_sha256(path) == current.sha256
+            if valid:
+                # The checksum is verified, the part becomes the blob without being hashed again
+                lesson_file = LessonFiles(lesson_id=current.lesson_id, name=current.file_name)
+                lesson_file.file.name = lesson_files_storage.adopt(current.sha256, current.file_name, path)
+                lesson_file.save()
+                current.delete()
+            else:
+                abort_upload(current)
+        except FileNotFoundError:
+            return finished_file(current)
+    # Raised after the commit, the discarded upload stays discarded
+    if not valid:
+        raise ValidationError('Checksum mismatch, the upload was discarded.')
+    return lesson_file
+
+
+def abort_upload(upload):
+    """Deletes the upload and its part file."""
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def purge_uploads(older_than):
+    """
+    Aborts the uploads that received nothing since older_than, the clients gave up on them.
+
+    :param older_than: datetime
+    :return: int, number of aborted uploads
+    """
+    count = 0
+    for upload in LessonUpload.objects.filter(updated_at__lt=older_than):
+        abort_upload(upload)
+        count += 1
+    return count
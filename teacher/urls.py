@@ -24,6 +24,7 @@ urlpatterns = [
     path('edit_lesson/<int:lesson_id>', EditLessonViewset.as_view(), name='edit_lesson'),
     path('delete_lesson_file/<int:lesson_file_id>/', delete_lesson_file, name='delete_lesson_file'),
     path('attendance/<int:lesson_id>', Attendance.as_view(), name='attendance'),
+    path('attendance/<int:lesson_id>/bulk', AttendanceBulkView.as_view(), name='attendance_bulk'),
     path('all_department/', AllDepartmentViewset.as_view(),name='department'),
     path('add_department/',AddDepartmentViewset.as_view(),name="add_department"),
     path('edit_department/<int:department_id>/',EditDepartmentViewset.as_view(),name="edit_department"),
@@ -33,4 +34,10 @@ urlpatterns = [
     path('edit_skill/<int:skill_id>/',EditSkillViewset.as_view(),name="edit_skill"),
     path('delete_skill/<int:skill_id>/',DeleteSkillViewset.as_view(),name="delete_skill"),
     path("add_like/<int:group_id>", AddLikeView.as_view(), name="add_like"),
+    path("likes/", GroupLikesView.as_view(), name="group_likes"),
+    path("export/gradebook/", GradebookExportView.as_view(), name="export_gradebook"),
+    path("lessons/<int:lesson_id>/uploads/", LessonUploadView.as_view(), name="lesson_upload"),
+    path("uploads/<uuid:upload_id>/", UploadStatusView.as_view(), name="upload_status"),
+    path("uploads/<uuid:upload_id>/chunks/<int:number>", UploadChunkView.as_view(), name="upload_chunk"),
+    path("uploads/<uuid:upload_id>/finalize", UploadFinalizeView.as_view(), name="upload_finalize"),
 ]
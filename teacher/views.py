@@ -1,14 +1,30 @@
+import csv
+import json
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.http import HttpResponseRedirect, JsonResponse
+from django.http import HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.template.response import TemplateResponse
 from django.views import View
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse
 from django.contrib.auth.models import Group as GroupType
-
-from teacher.forms import AddCourseForm, AddDepartmentForm, AddLessonForm, AddProfessorForm, AddSkillForm, EditLessonForm, EditProfessorForm, AddStudentForm, EditSkillForm, EditStudentForm, StudentsAttendanceFormSet
-from teacher.models import Group, GroupLikes, GroupSpec, Lesson, LessonFiles, Score_Attendance, Skill, Student, Teacher
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from teacher.autocomplete import LIMIT, SOURCES, can_suggest, suggest
+from teacher import demo
+from teacher.caching import cached
+from teacher.forms import AttendanceMarkForm, GradebookExportForm, AddCourseForm, AddDepartmentForm, AddLessonForm, AddProfessorForm, AddSkillForm, EditLessonForm, EditProfessorForm, AddStudentForm, EditSkillForm, EditStudentForm, LessonUploadForm, AttendanceGridFormSet
+from teacher.exporting import filter_groups, gradebook_rows
+from teacher.media import can_read, media_name, serve
+from teacher.models import Group, GroupLikes, GroupSpec, GroupStats, Lesson, LessonFiles, LessonUpload, Score_Attendance, Skill, Student, Teacher
+from teacher.pagination import paginate_keyset, paginate_offset
+from teacher.roles import TEACHER, RolesMixin, role_id
+from teacher.search import KINDS, search
+from teacher.services import attendance_sheet_queryset, group_likes_summary, prepare_attendance_sheet, save_attendance_marks, toggle_group_like, update_attendance_rows
+from teacher.uploads import abort_upload, attach_existing, finalize_upload, start_upload, write_chunk
 
 # Create your views here.
 
@@ -26,8 +42,8 @@ class AllProfessorsViewset(LoginRequiredMixin, View):
         :param request: Request object
         :return: TemplateResponse object
         """
-        teachers = User.objects.filter(groups=GroupType.objects.get(name='Teacher'))
-        context = {"teachers": teachers}
+        teachers = paginate_offset(request, User.objects.filter(groups=role_id(TEACHER)).for_list().order_by('id'))
+        context = {"teachers": teachers, "page": teachers}
         return TemplateResponse(request, 'all-professors.html', context)
 
 
@@ -39,10 +55,12 @@ class AddProfessorViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
         """
         Renders a page with a form to add a new professor.
 
+        In demo mode (DEMO_PREFILL or ?demo=1) the form is filled in with made up values.
+
         :param request: Request object
         :return: TemplateResponse object
         """
-        form = AddProfessorForm()
+        form = AddProfessorForm(initial=demo.professor_initial() if demo.is_enabled(request) else None)
         context = {
             'form': form,
         }
@@ -160,8 +178,6 @@ class DeleteProfessorViewset(PermissionRequiredMixin, LoginRequiredMixin, View):
 class AllStudentsViewset(LoginRequiredMixin, View):
     login_url = 'login'
     def get(self, request):
-        # print(type(GroupType(request.user.groups.all())), GroupType(request.user.groups.all()), ''.join([group.name for group in request.user.groups.all()]) == GroupType.objects.get(name="Teacher"), GroupType.objects.get(name="Teacher"), type(GroupType.objects.get(name="Teacher")), 'User groups ===============================')
-        # print([group.name for group in request.user.groups.all()])
         """
         Handles the GET request of the all students page.
 
@@ -170,14 +186,11 @@ class AllStudentsViewset(LoginRequiredMixin, View):
         :param request: Request object
         :return: TemplateResponse object
         """
-        if 'Teacher' in [group.name for group in request.user.groups.all()]:
-            students = Student.objects.filter(group__teacher__first_name=request.user.first_name)
-        else:
-            print("Manger ================================")
-            students = Student.objects.all()
+        students = paginate_keyset(request, Student.objects.visible_to(request.user).for_list(), 'created_at')
 
         context = {
             "students": students,
+            "page": students,
         }
         return TemplateResponse(request, 'all-students.html',context)
 
@@ -195,7 +208,7 @@ class AddStudentViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
         :param request: Request object
         :return: TemplateResponse object
         """
-        form = AddStudentForm()
+        form = AddStudentForm(user=request.user)
         context = {
             'form': form,
         }
@@ -211,7 +224,7 @@ class AddStudentViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
         :param request: Request object
         :return: TemplateResponse object
         '''
-        form = AddStudentForm(request.POST, request.FILES)
+        form = AddStudentForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             form.save()
             return redirect("all_students")
@@ -234,8 +247,8 @@ class EditStudentViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
         :param student_id: The id of the student to edit
         :return: TemplateResponse object
         """
-        student = get_object_or_404(Student, id=student_id)
-        form = EditStudentForm(instance=student)
+        student = get_object_or_404(Student.objects.visible_to(request.user), id=student_id)
+        form = EditStudentForm(instance=student, user=request.user)
         context = {
             "form":form,
             "student":student,
@@ -254,8 +267,8 @@ class EditStudentViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
         :param student_id: The id of the student to edit
         :return: TemplateResponse object
         """
-        student = get_object_or_404(Student, id=student_id)
-        form = EditStudentForm(request.POST,request.FILES,instance=student)
+        student = get_object_or_404(Student.objects.visible_to(request.user), id=student_id)
+        form = EditStudentForm(request.POST, request.FILES, instance=student, user=request.user)
         if form.is_valid():
             form.save()
             return redirect('all_students')
@@ -274,7 +287,7 @@ class DeleteStudentViewset(PermissionRequiredMixin, LoginRequiredMixin, View):
     permission_required = ['teacher.delete_student']
 
     def get(self, request, student_id):
-        student = get_object_or_404(Student, id=student_id)
+        student = get_object_or_404(Student.objects.visible_to(request.user), id=student_id)
         student.delete()
         return redirect("all_students")
 
@@ -282,25 +295,36 @@ class DeleteStudentViewset(PermissionRequiredMixin, LoginRequiredMixin, View):
 class StudentProfileViewset(LoginRequiredMixin, View):
     login_url = 'login'
     def get(self, request, student_id):
-        student = Student.objects.get(id=student_id)
+        student = get_object_or_404(Student.objects.visible_to(request.user), id=student_id)
+        stats = student.stats.select_related('group__name', 'group__stats').order_by('group_id')
         context = {
             "student":student,
+            "stats": stats,
         }
         return TemplateResponse(request, 'about-student.html',context)
 
 
-class AllCoursesViewset(LoginRequiredMixin, View):
+class AllCoursesViewset(LoginRequiredMixin, RolesMixin, View):
     login_url = 'login'
     def get(self, request):
-        # print([group.name for group in request.user.groups.all()])
-        if 'Teacher' in [group.name for group in request.user.groups.all()]:
-            courses = Group.objects.filter(teacher__id=request.user.id)
+        if self.is_teacher:
+            courses = Group.objects.visible_to(request.user).for_list()
         elif request.user.is_admin:
-            courses = Group.objects.all()
+            courses = Group.objects.for_list()
         else:
             courses = None
+        if courses is not None:
+            courses = courses.annotate(
+                liked=Exists(GroupLikes.objects.filter(group=OuterRef('pk'), user_id=request.user.id))
+            ).order_by('id')
+            # The page is cached per user because of the liked flags
+            courses = cached(
+                'courses', ('groups', 'departments', 'teachers', 'likes'),
+                lambda: paginate_offset(request, courses), request.user.id, request.GET.urlencode(),
+            )
         context = {
-            "courses": courses
+            "courses": courses,
+            "page": courses,
             }
         return TemplateResponse(request, 'all-courses.html', context)
 
@@ -334,7 +358,7 @@ class EditCoursesViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
     permission_required = 'teacher.edit_course'
 
     def get(self, request, course_id):
-        course = get_object_or_404(Group, id=course_id)
+        course = get_object_or_404(Group.objects.visible_to(request.user), id=course_id)
         form = AddCourseForm(instance=course)
         context = {
             'form': form,
@@ -343,7 +367,7 @@ class EditCoursesViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
         return TemplateResponse(request, 'edit-courses.html', context)
     
     def post(self, request, course_id):
-        course = get_object_or_404(Group, id=course_id)
+        course = get_object_or_404(Group.objects.visible_to(request.user), id=course_id)
         form = AddCourseForm(request.POST, request.FILES, instance=course)
         if form.is_valid():
             form.save()
@@ -362,7 +386,7 @@ class DeleteCoursesViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
     permission_required = 'teacher.delete_course'
 
     def get(self, request, course_id):
-        course = get_object_or_404(Group, id=course_id)
+        course = get_object_or_404(Group.objects.visible_to(request.user), id=course_id)
         course.delete()
         return HttpResponseRedirect(request.META.get("HTTP_REFERER", ""))
 
@@ -371,12 +395,10 @@ class AllLessonsViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
     login_url = 'login'
     permission_required = 'teacher.view_lesson'
     def get(self, request):
-        if 'Teacher' in [group.name for group in request.user.groups.all()]:
-            lessons = Lesson.objects.filter(group__teacher__first_name=request.user.first_name)
-        else:
-            lessons = Lesson.objects.all()
+        lessons = paginate_keyset(request, Lesson.objects.visible_to(request.user).for_list(), 'date')
         context = {
-            'lessons': lessons
+            'lessons': lessons,
+            'page': lessons,
         }
         return TemplateResponse(request, 'all-lessons.html', context)
     
@@ -386,14 +408,14 @@ class AddLessonViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
     permission_required = 'teacher.add_lesson'
 
     def get(self, request):
-        form = AddLessonForm()
+        form = AddLessonForm(user=request.user)
         context = {
             'form': form
         }
         return TemplateResponse(request, 'add-lesson.html', context)
 
     def post(self, request):
-        form = AddLessonForm(request.POST)
+        form = AddLessonForm(request.POST, user=request.user)
         if form.is_valid():
             lesson = form.save()
             files = request.FILES.getlist("files", None)
@@ -413,12 +435,12 @@ class AddLessonViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
 
 class EditLessonViewset(PermissionRequiredMixin, LoginRequiredMixin, View):
     login_url = 'login'
-    permission_required = ''
+    permission_required = 'teacher.change_lesson'
 
     def get(self, request, lesson_id):
-        lesson = Lesson.objects.get(id=lesson_id)
+        lesson = get_object_or_404(Lesson.objects.visible_to(request.user), id=lesson_id)
         files = LessonFiles.objects.filter(lesson=lesson)
-        form = EditLessonForm(instance=lesson)
+        form = EditLessonForm(instance=lesson, user=request.user)
         # print(files)
         context = {
             'form': form,
@@ -428,8 +450,8 @@ class EditLessonViewset(PermissionRequiredMixin, LoginRequiredMixin, View):
         return TemplateResponse(request, 'edit-lesson.html', context)
 
     def post(self, request, lesson_id):
-        lesson = Lesson.objects.get(id=lesson_id)
-        form = EditLessonForm(request.POST, instance=lesson)
+        lesson = get_object_or_404(Lesson.objects.visible_to(request.user), id=lesson_id)
+        form = EditLessonForm(request.POST, instance=lesson, user=request.user)
         print('--------------------------------------------')
         print(form)
         print('--------------------------------------------')
@@ -457,10 +479,9 @@ class EditLessonViewset(PermissionRequiredMixin, LoginRequiredMixin, View):
 
 def delete_lesson_file(request, lesson_file_id):
     print("+++++++++++++++++++++++++++++++++++++++++++")
-    lesson_file = get_object_or_404(LessonFiles, id=lesson_file_id)
+    lesson_file = get_object_or_404(LessonFiles.objects.visible_to(request.user), id=lesson_file_id)
     lesson_id = lesson_file.lesson.id
-    lesson_file.file.delete()
-    # os.pa
+    # The blob may be shared with other lessons, the post_delete signal removes it with its last reference
     lesson_file.delete()
     return redirect("edit_lesson", lesson_id=lesson_id)
 
@@ -468,12 +489,17 @@ def delete_lesson_file(request, lesson_file_id):
 class AboutCoursesViewset(LoginRequiredMixin, View):
     login_url = 'login'
     def get(self, request, course_id):
-        course = get_object_or_404(Group, id=course_id)
-        courses = Group.objects.all().exclude(id=course_id)
-        print(course.duration)
+        course = get_object_or_404(Group.objects.visible_to(request.user), id=course_id)
+        courses = Group.objects.visible_to(request.user).exclude(id=course_id).select_related('name')
+        group_stats = GroupStats.objects.filter(group=course).first()
+        top_students = course.student_stats.filter(rank__isnull=False).select_related('student').order_by('rank', 'student_id')[:5]
         context = {
             'course': course,
-            'courses': courses
+            'courses': courses,
+            'group_stats': group_stats,
+            'top_students': top_students,
+            # The cached course links differ for teachers, who only see their own groups
+            'links_scope': request.user.id if request.roles.is_teacher else 'all',
         }
         return TemplateResponse(request, 'about-courses.html', context)
 
@@ -481,8 +507,8 @@ class AboutCoursesViewset(LoginRequiredMixin, View):
 class ViewCoursesViewset(LoginRequiredMixin, View):
     login_url = 'login'
     def get(self, request, course_id):
-        course = Group.objects.get(id=course_id)
-        lessons = Lesson.objects.filter(group=course)
+        course = get_object_or_404(Group.objects.visible_to(request.user), id=course_id)
+        lessons = Lesson.objects.filter(group=course).for_list().select_related('stats')
         context = {
             'lessons': lessons
         }
@@ -493,27 +519,20 @@ class Attendance(LoginRequiredMixin, View):
     # permission_required = 'teacher.change_score_attendance'
     login_url = "login"
     def get(self, request, lesson_id):
-        print('88888888888888888888888888888888888888888888888888')
-        print(request.user.get_all_permissions())
-        print('88888888888888888888888888888888888888888888888888')
-        lesson = Lesson.objects.get(id=lesson_id)
+        """
+        Renders the attendance sheet of the lesson.
+
+        Missing Score_Attendance rows for the students of the lesson's group are created in one batch
+        before the grid is built, so the page costs the same number of queries for any group size.
+        The grid pins the students in hidden inputs, it renders no list of students or lessons.
+
+        :param request: Request object
+        :param lesson_id: int, the id of the lesson
+        :return: TemplateResponse object
+        """
+        lesson = get_object_or_404(Lesson.objects.visible_to(request.user).select_related('group__name'), id=lesson_id)
         group = lesson.group
-        students = group.student_set.all()
-        print(students)
-        print(lesson.score_attendance_set.filter(lesson=lesson, student__in=students))
-        print('88888888888888888888888888888888888888888888888888')
-        
-        # if not lesson.score_attendance_set.filter(lesson=lesson, student__in=students):
-        Score_Attendance.objects.bulk_create(
-            Score_Attendance(lesson=lesson, student=student) for student in students
-            if not Score_Attendance.objects.filter(lesson=lesson, student=student).exists()
-        )
-        # formset = StudentsAttendanceFormSet(queryset=Score_Attendance.objects.filter(
-        #     created_at__exact=datetime.date.today())
-        # )
-        # for att in Score_Attendance.objects.filter(lesson)
-        formset = StudentsAttendanceFormSet(queryset=Score_Attendance.objects.filter(lesson=lesson, student__in=students))
-        print(lesson.score_attendance_set.filter(lesson=lesson, student__in=students))
+        formset = AttendanceGridFormSet(sheet=prepare_attendance_sheet(lesson))
         context = {
             'formset': formset,
             'lesson': lesson,
@@ -522,44 +541,87 @@ class Attendance(LoginRequiredMixin, View):
         return TemplateResponse(request, "yoqlama.html", context)
 
     def post(self, request, lesson_id):
-        lesson = Lesson.objects.get(id=lesson_id)
-        group = lesson.group
-        students = group.student_set.all()
-        queryset = Score_Attendance.objects.filter(lesson=lesson, student__in=students)
-        formset = StudentsAttendanceFormSet(request.POST, queryset=queryset)
-        if formset.is_valid():
-            # print("//////////////////////////////////////////////")
-            # print(formset)
-            # print("//////////////////////////////////////////////")
-            instances = formset.save(commit=False)
+        """
+        Saves the attendance sheet of the lesson.
 
-            for form, student in zip(instances, students):
-                form.lesson = lesson
-                form.student = student
-                form.save()
+        The whole grid is validated against the students of the sheet first, then every changed
+        mark and is_present value is written with a single bulk_update inside one transaction.
 
+        :param request: Request object
+        :param lesson_id: int, the id of the lesson
+        :return: HttpResponseRedirect or TemplateResponse object
+        """
+        lesson = get_object_or_404(Lesson.objects.visible_to(request.user).select_related('group__name'), id=lesson_id)
+        group = lesson.group
+        formset = AttendanceGridFormSet(request.POST, sheet=attendance_sheet_queryset(lesson))
+        if formset.is_valid():
+            with transaction.atomic():
+                update_attendance_rows(formset.changed_rows())
             return redirect('view_course', group.id)
-        
-        for form, student in zip(formset.forms, students):
-            form.instance.student = student
 
         context = {
             'formset': formset,
             'lesson': lesson,
             'group': group
         }
-        print(queryset)
-        # print(formset)
-        print(formset.errors)
         return TemplateResponse(request, 'yoqlama.html', context)
 
 
+class AttendanceBulkView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    login_url = "login"
+    permission_required = 'teacher.change_score_attendance'
+
+    def post(self, request, lesson_id):
+        """
+        Saves the whole attendance sheet of the lesson from a compact JSON payload.
+
+        The body looks like {"rows": [{"student": 1, "mark": "8.5", "is_present": true}, ...]}.
+        Every row is validated before anything is written, then the changed rows are saved
+        with one bulk_update inside one transaction.
+
+        :param request: Request object
+        :param lesson_id: int, the id of the lesson
+        :return: JsonResponse object with the number of updated rows or the validation errors
+        """
+        lesson = get_object_or_404(Lesson.objects.visible_to(request.user), id=lesson_id)
+        try:
+            rows = json.loads(request.body).get('rows')
+        except (ValueError, AttributeError):
+            rows = None
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return JsonResponse({'errors': 'Expected {"rows": [...]}'}, status=400)
+
+        marks = {}
+        errors = {}
+        for index, row in enumerate(rows):
+            form = AttendanceMarkForm(row)
+            if form.is_valid():
+                marks[form.cleaned_data['student']] = {
+                    'mark': form.cleaned_data['mark'],
+                    'is_present': form.cleaned_data['is_present'],
+                }
+            else:
+                errors[index] = form.errors
+        if errors:
+            return JsonResponse({'errors': errors}, status=400)
+
+        try:
+            updated = save_attendance_marks(lesson, marks)
+        except ValidationError as error:
+            return JsonResponse({'errors': error.messages}, status=400)
+        return JsonResponse({'updated': updated})
+
+
 class AllDepartmentViewset(View):
 
     def get(self, request):
-        departments = GroupSpec.objects.all()
+        departments = cached(
+            'departments', ('departments',),
+            lambda: paginate_offset(request, GroupSpec.objects.order_by('id')), request.GET.urlencode(),
+        )
         context = {
-            "departments": departments
+            "departments": departments,
+            "page": departments,
             }
         return TemplateResponse(request, 'all-departments.html', context)
 
@@ -630,9 +692,13 @@ class AllSkillsViewset(LoginRequiredMixin, PermissionRequiredMixin, View):
     permission_required = 'teacher.all_skill'
 
     def get(self,request):
-        skills = Skill.objects.all()
+        skills = cached(
+            'skills', ('skills',),
+            lambda: paginate_offset(request, Skill.objects.order_by('id')), request.GET.urlencode(),
+        )
         context = {
-            'skills':skills
+            'skills':skills,
+            'page': skills,
         }
         return TemplateResponse(request, "all-skills.html",context)
     
@@ -697,37 +763,268 @@ class AddLikeView(LoginRequiredMixin, View):
     login_url = 'login'
 
     def get(self, request, group_id):
-        group = get_object_or_404(Group, id=group_id)
-        print('Get request------------------------')
-        user = Teacher.objects.get(id=request.user.id)
-        like= GroupLikes.objects.filter(group=group, user_id=user)
-            
-        if like:
-            liked = True
-        
-        if not like:
-            liked = False
+        """
+        Returns the number of likes of the group and whether the current user liked it.
 
-        likes = group.grouplikes_set.count()
-        return JsonResponse({'likes': likes, 'liked': liked})
+        :param request: Request object
+        :param group_id: int, the id of the group
+        :return: JsonResponse object
+        """
+        group = get_object_or_404(Group.objects.only('id', 'like_count'), id=group_id)
+        liked = GroupLikes.objects.filter(group=group, user_id=request.user.id).exists()
+        return JsonResponse({'likes': group.like_count, 'liked': liked})
 
     def post(self, request, group_id):
+        """
+        Toggles the like of the current user on the group.
+
+        :param request: Request object
+        :param group_id: int, the id of the group
+        :return: JsonResponse object
+        """
+        group = get_object_or_404(Group.objects.only('id'), id=group_id)
+        liked, likes = toggle_group_like(group, request.user)
+        return JsonResponse({'liked': liked, 'likes': likes})
+
+
+class GroupLikesView(LoginRequiredMixin, View):
+    login_url = 'login'
+
+    def get(self, request):
+        """
+        Returns likes and the liked flag for many groups in one request.
+
+        The ids are passed as ?ids=1,2,3, the answer looks like {"1": {"likes": 4, "liked": true}, ...}.
+
+        :param request: Request object
+        :return: JsonResponse object
+        """
+        try:
+            group_ids = [int(group_id) for group_id in request.GET.get('ids', '').split(',') if group_id]
+        except ValueError:
+            return JsonResponse({'errors': 'ids must be a comma separated list of integers'}, status=400)
+        return JsonResponse(group_likes_summary(group_ids, request.user))
+
+
+class Echo:
+    """File-like object that hands back what is written, for streaming csv.writer output."""
+    def write(self, value):
+        return value
+
+
+class GradebookExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    login_url = 'login'
+    permission_required = 'teacher.view_score_attendance'
+
+    def get(self, request):
+        """
+        Streams the gradebooks of the selected groups as CSV.
+
+        Filters: ?group=<id>, ?teacher=<id>, ?date_from=YYYY-MM-DD, ?date_to=YYYY-MM-DD.
+        Rows are written while they are read from the database, so the export never sits in memory.
+
+        :param request: Request object
+        :return: StreamingHttpResponse object
+        """
+        form = GradebookExportForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        groups = filter_groups(form.cleaned_data['group'], form.cleaned_data['teacher'], user=request.user)
+        rows = gradebook_rows(groups, form.cleaned_data['date_from'], form.cleaned_data['date_to'])
+        writer = csv.writer(Echo())
+        response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="gradebook.csv"'
+        return response
+
+
+class MediaView(LoginRequiredMixin, View):
+    login_url = 'login'
+
+    def get(self, request, path):
+        """
+        Serves uploaded files: lesson files only to the users who see the lesson, photos to every signed in user.
+
+        Supports ETag / Last-Modified revalidation, byte ranges and handing the transfer to the front proxy,
+        see teacher.media.serve.
+
+        :param request: Request object
+        :param path: str, path under MEDIA_ROOT
+        :return: HttpResponse object
+        """
+        name = media_name(path)
+        if not can_read(request.user, name):
+            raise Http404('Not found')
+        return serve(request, name)
+
+
+def upload_status(upload):
+    return {
+        'id': str(upload.id),
+        'file_name': upload.file_name,
+        'size': upload.size,
+        'chunk_size': upload.chunk_size,
+        'chunk_count': upload.chunk_count,
+        'received': upload.received,
+        'missing': upload.missing,
+    }
+
+
+def lesson_file_status(lesson_file):
+    return {'complete': True, 'id': lesson_file.id, 'name': lesson_file.name, 'url': lesson_file.file.url}
+
+
+class LessonUploadView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    login_url = 'login'
+    permission_required = 'teacher.add_lesson'
+
+    def post(self, request, lesson_id):
+        """
+        Starts a chunked upload of a lesson file.
+
+        Expects JSON {"file_name": ..., "size": ..., "sha256": ..., "chunk_size": ...}, chunk_size is optional.
+        The chunks are then sent with PUT to uploads/<id>/chunks/<number>, in any order and in parallel.
+        If a file with the same SHA-256 is in one of the user's lessons it is attached right away and "complete" is true.
+
+        :param request: Request object
+        :param lesson_id: int
+        :return: JsonResponse object with the upload id and the chunk layout, or the attached file
+        """
+        lesson = get_object_or_404(Lesson.objects.visible_to(request.user), id=lesson_id)
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'errors': 'Expected a JSON object'}, status=400)
+        form = LessonUploadForm(data if isinstance(data, dict) else None)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        lesson_file = attach_existing(lesson, form.cleaned_data['file_name'], form.cleaned_data['sha256'], request.user)
+        if lesson_file is not None:
+            return JsonResponse(lesson_file_status(lesson_file), status=201)
+        upload = start_upload(lesson, request.user, **form.cleaned_data)
+        return JsonResponse(upload_status(upload), status=201)
+
+
+class UploadMixin:
+    """Looks the upload up among the unfinished uploads of the logged in user."""
+
+    def get_upload(self, upload_id):
+        return get_object_or_404(LessonUpload.objects.select_related('lesson__group__name'), id=upload_id, user=self.request.user)
+
+
+class UploadStatusView(LoginRequiredMixin, PermissionRequiredMixin, UploadMixin, View):
+    login_url = 'login'
+    permission_required = 'teacher.add_lesson'
+
+    def get(self, request, upload_id):
+        """
+        Returns the received and missing chunks, a client resuming after a dropped connection sends only the missing ones.
+
+        :param request: Request object
+        :param upload_id: UUID
+        :return: JsonResponse object
+        """
+        return JsonResponse(upload_status(self.get_upload(upload_id)))
+
+    def delete(self, request, upload_id):
+        """
+        Cancels the upload and removes what was received.
+
+        :param request: Request object
+        :param upload_id: UUID
+        :return: HttpResponse object
+        """
+        abort_upload(self.get_upload(upload_id))
+        return HttpResponse(status=204)
+
+
+class UploadChunkView(LoginRequiredMixin, PermissionRequiredMixin, UploadMixin, View):
+    login_url = 'login'
+    permission_required = 'teacher.add_lesson'
+
+    def put(self, request, upload_id, number):
+        """
+        Stores one chunk, the request body is the raw chunk. Sending a chunk again replaces it.
+
+        :param request: Request object
+        :param upload_id: UUID
+        :param number: int, chunk number starting at 0
+        :return: JsonResponse object with the upload status
+        """
+        upload = self.get_upload(upload_id)
+        try:
+            upload = write_chunk(upload, number, request)
+        except ValidationError as error:
+            return JsonResponse({'errors': error.messages}, status=400)
+        return JsonResponse(upload_status(upload))
+
+
+class UploadFinalizeView(LoginRequiredMixin, PermissionRequiredMixin, UploadMixin, View):
+    login_url = 'login'
+    permission_required = 'teacher.add_lesson'
+
+    def post(self, request, upload_id):
+        """
+        Checks the SHA-256 of the assembled file and attaches it to the lesson.
+
+        :param request: Request object
+        :param upload_id: UUID
+        :return: JsonResponse object with the new lesson file, or the errors
+        """
+        upload = self.get_upload(upload_id)
+        try:
+            lesson_file = finalize_upload(upload)
+        except ValidationError as error:
+            return JsonResponse({'errors': error.messages}, status=400)
+        return JsonResponse(lesson_file_status(lesson_file), status=201)
+
+
+class SearchView(LoginRequiredMixin, View):
+    login_url = 'login'
+
+    def get(self, request):
+        """
+        Searches students, professors, courses and lessons, best matches first.
+
+        ?q= is the query, every word matches as a prefix, ?kind= limits it to one kind.
+        ?format=json returns the results as JSON, for the search box suggestions.
+
+        :param request: Request object
+        :return: TemplateResponse or JsonResponse object
+        """
+        query = request.GET.get('q', '').strip()
+        kind = request.GET.get('kind')
+        results = search(request.user, query, kinds=[kind] if kind in KINDS else None, limit=50)
+        if request.GET.get('format') == 'json':
+            return JsonResponse({'results': results})
+        context = {
+            'query': query,
+            'kind': kind,
+            'kinds': KINDS,
+            'results': results,
+        }
+        return TemplateResponse(request, 'search.html', context)
+
+
+class AutocompleteView(LoginRequiredMixin, View):
+    login_url = 'login'
+
+    def get(self, request, source):
+        """
+        Returns the choices of an autocomplete widget, see teacher.autocomplete.
+
+        ?q= is what the user typed, every word matches as a prefix, ?limit= is the most results.
+        Only users who may fill in a form using the source get its choices.
+
+        :param request: Request object
+        :param source: str, groups, teachers or skills
+        :return: JsonResponse object with the results
+        """
+        if source not in SOURCES:
+            raise Http404('Unknown source')
+        if not can_suggest(request.user, source):
+            raise PermissionDenied
         try:
-            group = get_object_or_404(Group, id=group_id)
-            user = Teacher.objects.get(id=request.user.id)
-
-            like, created = GroupLikes.objects.get_or_create(group=group, user_id=user)
-            
-            if created:
-                like.save()
-                liked = True
-            
-            if not created:
-                like.delete()
-                liked = False
-
-            likes = group.grouplikes_set.count()
-            return JsonResponse({'liked': liked, 'likes': likes})
-
-        except:
-            return HttpResponse(status=404)
+            limit = min(max(int(request.GET.get('limit', LIMIT)), 1), 100)
+        except ValueError:
+            return JsonResponse({'errors': 'limit must be a number'}, status=400)
+        return JsonResponse({'results': suggest(request.user, source, request.GET.get('q', ''), limit)})